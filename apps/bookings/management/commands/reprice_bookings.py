@@ -0,0 +1,70 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.bookings.models import Booking
+from apps.bookings.services import PRICE_FIELDS, repricing_queryset, reprice_bookings
+
+
+def decimal_argument(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise CommandError(f"'{value}' is not a valid decimal.")
+
+
+class Command(BaseCommand):
+    help = "Recompute booking totals in the database, optionally applying new prices or discount."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--travel-month', help="Only bookings for this travel month")
+        parser.add_argument('--package-name', help="Only bookings for this package (case-insensitive)")
+        parser.add_argument('--departure-city', help="Only bookings departing from this city (case-insensitive)")
+        parser.add_argument('--status', choices=[choice for choice, _ in Booking.STATUS_CHOICES])
+        parser.add_argument('--booking-id', dest='booking_ids', type=int, action='append',
+                            help="Only this booking, may be repeated")
+        parser.add_argument('--adult-price', type=decimal_argument)
+        parser.add_argument('--child-price', type=decimal_argument)
+        parser.add_argument('--infant-price', type=decimal_argument)
+        parser.add_argument('--discount-percentage', type=decimal_argument)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without saving them")
+        parser.add_argument('--all', action='store_true', help="Allow running without any filter")
+
+    def handle(self, *args, **options):
+        filters = {
+            field: options[field]
+            for field in ('travel_month', 'package_name', 'departure_city', 'status', 'booking_ids')
+        }
+        if not any(filters.values()) and not options['all']:
+            raise CommandError("Pass at least one filter, or --all to reprice every booking.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        prices = {field: options[field] for field in PRICE_FIELDS if options[field] is not None}
+        discount = prices.get('discount_percentage')
+        if discount is not None and not Decimal('0') <= discount <= Decimal('100'):
+            raise CommandError("--discount-percentage must be between 0 and 100.")
+
+        result = reprice_bookings(
+            repricing_queryset(**filters),
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            **prices,
+        )
+
+        if options['dry_run']:
+            for row in result['changes']:
+                changes = ', '.join(
+                    f"{name} {change['old']} -> {change['new']}"
+                    for name, change in row['changes'].items()
+                )
+                self.stdout.write(f"{row['booking_number']}: {changes}")
+            self.stdout.write(self.style.WARNING(
+                f"Dry run: {result['changed']} of {result['matched']} bookings would change, "
+                f"total price delta {result['total_price_delta']}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Repriced {result['updated']} bookings, total price delta {result['total_price_delta']}"
+            ))
@@ -0,0 +1,247 @@
+from collections import defaultdict
+
+ROOM_CAPACITY = {'single': 1, 'double': 2, 'triple': 3, 'quad': 4}
+
+BOOKING_COLUMNS = (
+    'id', 'booking_number', 'first_name', 'last_name', 'mobile_no', 'passport_no',
+    'travel_month', 'travel_period', 'departure_city', 'package_name', 'room_sharing',
+    'total_adults', 'total_children', 'total_infants',
+)
+TRAVELER_COLUMNS = (
+    'travelers__id', 'travelers__name', 'travelers__age', 'travelers__gender',
+    'travelers__traveler_type', 'travelers__passport_number',
+)
+
+CSV_HEADER = [
+    'Travel Month', 'Departure City', 'Room Sharing', 'Room', 'Booking Number',
+    'Name', 'Age', 'Gender', 'Traveler Type', 'Passport Number', 'Package', 'Contact',
+]
+
+
+class Departure:
+    """Travelers of one (travel_month, departure_city) and their room assignment"""
+
+    def __init__(self, travel_month, departure_city):
+        self.travel_month = travel_month
+        self.departure_city = departure_city
+        self.travelers = []
+        self.booking_count = 0
+        self.unnamed_travelers = 0
+        # room_sharing -> list of (booking, bed travelers, infants)
+        self.parties = defaultdict(list)
+        self.rooms = {}
+
+    def add_booking(self, booking, travelers):
+        self.booking_count += 1
+        unnamed = []
+        if not travelers:
+            # No traveler rows were entered, list the lead passenger only
+            travelers = [{
+                'name': f"{booking['first_name']} {booking['last_name']}",
+                'age': None,
+                'gender': '',
+                'traveler_type': 'adult',
+                'passport_number': booking['passport_no'],
+            }]
+            declared = booking['total_adults'] + booking['total_children'] + booking['total_infants']
+            self.unnamed_travelers += max(declared - 1, 0)
+            # The rest of the declared party still needs beds; infants do not take one
+            adults = max(booking['total_adults'] - 1, 0)
+            children = booking['total_children'] - (1 if booking['total_adults'] == 0 else 0)
+            unnamed = [
+                {'name': '', 'age': None, 'gender': '', 'traveler_type': traveler_type, 'passport_number': None}
+                for traveler_type, count in (('adult', adults), ('child', children))
+                for _ in range(max(count, 0))
+            ]
+
+        beds, infants = [], []
+        for traveler in travelers + unnamed:
+            traveler['booking_number'] = booking['booking_number']
+            traveler['package_name'] = booking['package_name']
+            traveler['mobile_no'] = booking['mobile_no']
+            traveler['room_sharing'] = booking['room_sharing']
+            traveler['room'] = None
+            (infants if traveler['traveler_type'] == 'infant' else beds).append(traveler)
+        self.travelers.extend(travelers)
+
+        self.parties[booking['room_sharing']].append((booking['booking_number'], beds, infants))
+
+    def assign_rooms(self):
+        """
+        Pack every party into rooms of its sharing type.
+
+        A booking fills whole rooms on its own first. What is left of each
+        booking is then placed as one unit, largest first, into the fullest
+        open room it fits (best fit), so families are never split across a
+        partly filled room. Infants share the room of their booking's first
+        adult and do not take a bed. Beds of a booking's unnamed travelers
+        are held by occupants with an empty name.
+        """
+        for sharing in ROOM_CAPACITY:
+            if sharing not in self.parties:
+                continue
+            capacity = ROOM_CAPACITY[sharing]
+            prefix = sharing[0].upper()
+            rooms = []
+            # free beds -> rooms with that many free beds, to find a best fit in O(capacity)
+            open_rooms = defaultdict(list)
+
+            def new_room():
+                room = {'room': f"{prefix}-{len(rooms) + 1}", 'occupants': [], 'infants': [], 'booking_numbers': []}
+                rooms.append(room)
+                return room
+
+            def place(room, booking_number, beds, infants):
+                room['occupants'].extend(beds)
+                room['infants'].extend(infants)
+                if booking_number not in room['booking_numbers']:
+                    room['booking_numbers'].append(booking_number)
+                for traveler in beds + infants:
+                    traveler['room'] = room['room']
+
+            remainders = []
+            for booking_number, beds, infants in self.parties[sharing]:
+                if not beds:
+                    remainders.append((booking_number, beds, infants))
+                    continue
+                full = len(beds) - len(beds) % capacity
+                for start in range(0, full, capacity):
+                    place(new_room(), booking_number, beds[start:start + capacity], infants if start == 0 else [])
+                    infants = []
+                if full < len(beds):
+                    remainders.append((booking_number, beds[full:], infants))
+
+            remainders.sort(key=lambda party: len(party[1]), reverse=True)
+            for booking_number, beds, infants in remainders:
+                size = len(beds)
+                room = None
+                for free in range(max(size, 1), capacity + 1):
+                    if open_rooms[free]:
+                        room = open_rooms[free].pop()
+                        break
+                if room is None:
+                    room = new_room()
+                place(room, booking_number, beds, infants)
+                free = capacity - len(room['occupants'])
+                if free:
+                    open_rooms[free].append(room)
+
+            self.rooms[sharing] = rooms
+
+    def summary(self):
+        counts = {'adult': 0, 'child': 0, 'infant': 0}
+        for traveler in self.travelers:
+            counts[traveler['traveler_type']] = counts.get(traveler['traveler_type'], 0) + 1
+        return {
+            'travel_month': self.travel_month,
+            'departure_city': self.departure_city,
+            'booking_count': self.booking_count,
+            'traveler_count': len(self.travelers) + self.unnamed_travelers,
+            'unnamed_travelers': self.unnamed_travelers,
+            'traveler_types': counts,
+            'room_count': {sharing: len(rooms) for sharing, rooms in self.rooms.items()},
+        }
+
+    def as_dict(self):
+        def person(traveler):
+            return {
+                'booking_number': traveler['booking_number'],
+                'name': traveler['name'],
+                'age': traveler['age'],
+                'gender': traveler['gender'],
+                'traveler_type': traveler['traveler_type'],
+            }
+
+        return {
+            **self.summary(),
+            'travelers': [
+                {
+                    'booking_number': traveler['booking_number'],
+                    'name': traveler['name'],
+                    'age': traveler['age'],
+                    'gender': traveler['gender'],
+                    'traveler_type': traveler['traveler_type'],
+                    'passport_number': traveler['passport_number'],
+                    'package_name': traveler['package_name'],
+                    'contact': traveler['mobile_no'],
+                    'room_sharing': traveler['room_sharing'],
+                    'room': traveler['room'],
+                }
+                for traveler in self.travelers
+            ],
+            'rooming_list': {
+                sharing: [
+                    {
+                        'room': room['room'],
+                        'booking_numbers': room['booking_numbers'],
+                        'occupants': [person(traveler) for traveler in room['occupants']],
+                        'infants': [person(traveler) for traveler in room['infants']],
+                    }
+                    for room in rooms
+                ]
+                for sharing, rooms in self.rooms.items()
+            },
+        }
+
+    def csv_rows(self):
+        for traveler in self.travelers:
+            yield [
+                self.travel_month, self.departure_city, traveler['room_sharing'], traveler['room'] or '',
+                traveler['booking_number'], traveler['name'],
+                '' if traveler['age'] is None else traveler['age'],
+                traveler['gender'], traveler['traveler_type'], traveler['passport_number'] or '',
+                traveler['package_name'], traveler['mobile_no'],
+            ]
+
+
+def build_manifest(queryset):
+    """
+    Build manifests for every departure in a Booking queryset.
+
+    Bookings and their travelers are read in a single LEFT JOIN, streamed
+    in booking order, so memory holds only the grouped result. Cancelled
+    bookings are left out. Returns Departure objects ordered by travel
+    month and departure city.
+    """
+    rows = (
+        queryset.exclude(status='cancelled')
+        .order_by('travel_period', 'departure_city', 'id', 'travelers__id')
+        .values_list(*BOOKING_COLUMNS, *TRAVELER_COLUMNS)
+    )
+
+    departures = {}
+    booking_width = len(BOOKING_COLUMNS)
+    current_id, current_booking, current_travelers = None, None, []
+
+    def flush():
+        # Different spellings of the same month belong to one departure
+        travel_period = current_booking['travel_period']
+        travel_month = travel_period.strftime('%Y-%m') if travel_period else current_booking['travel_month']
+        key = (travel_month, current_booking['departure_city'])
+        departure = departures.get(key)
+        if departure is None:
+            departure = departures[key] = Departure(*key)
+        departure.add_booking(current_booking, current_travelers)
+
+    for row in rows.iterator(chunk_size=2000):
+        if row[0] != current_id:
+            if current_booking is not None:
+                flush()
+            current_id = row[0]
+            current_booking = dict(zip(BOOKING_COLUMNS, row[:booking_width]))
+            current_travelers = []
+        traveler_id, name, age, gender, traveler_type, passport_number = row[booking_width:]
+        if traveler_id is not None:
+            current_travelers.append({
+                'name': name,
+                'age': age,
+                'gender': gender,
+                'traveler_type': traveler_type,
+                'passport_number': passport_number,
+            })
+    if current_booking is not None:
+        flush()
+
+    for departure in departures.values():
+        departure.assign_rooms()
+    return list(departures.values())
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_alter_booking_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='travel_period',
+            field=models.DateField(blank=True, db_index=True, editable=False, help_text='First day of travel_month, set on save', null=True),
+        ),
+        migrations.AddField(
+            model_name='quickbooking',
+            name='travel_period',
+            field=models.DateField(blank=True, db_index=True, editable=False, help_text='First day of travel_month, set on save', null=True),
+        ),
+    ]
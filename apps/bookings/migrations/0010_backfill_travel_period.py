@@ -0,0 +1,67 @@
+import calendar
+import datetime
+import re
+
+from django.db import migrations
+
+# Frozen copy of apps.bookings.models.parse_travel_month
+MONTH_NUMBERS = {
+    name.lower()[:3]: number for number, name in enumerate(calendar.month_abbr) if name
+}
+NUMERIC_YEAR_FIRST = re.compile(r'^(\d{4})[-/. ]?(\d{1,2})$')
+NUMERIC_MONTH_FIRST = re.compile(r'^(\d{1,2})[-/. ](\d{4}|\d{2})$')
+NAMED_MONTH_FIRST = re.compile(r"^([a-z]{3,9})\.?[-/,' ]*(\d{4}|\d{2})$")
+NAMED_YEAR_FIRST = re.compile(r'^(\d{4})[-/ ]([a-z]{3,9})$')
+
+
+def parse_travel_month(value):
+    if not value:
+        return None
+    text = str(value).strip().lower()
+
+    match = NUMERIC_YEAR_FIRST.match(text)
+    if match:
+        year, month = match.group(1), match.group(2)
+    else:
+        match = NUMERIC_MONTH_FIRST.match(text)
+        if match:
+            month, year = match.group(1), match.group(2)
+        else:
+            match = NAMED_MONTH_FIRST.match(text) or NAMED_YEAR_FIRST.match(text)
+            if not match:
+                return None
+            name, year = match.group(1), match.group(2)
+            if name.isdigit():
+                name, year = year, name
+            month = MONTH_NUMBERS.get(name[:3])
+            if month is None:
+                return None
+
+    year, month = int(year), int(month)
+    if year < 100:
+        year += 2000
+    if not 1 <= month <= 12:
+        return None
+    return datetime.date(year, month, 1)
+
+
+def backfill_travel_period(apps, schema_editor):
+    # One UPDATE per distinct travel_month spelling, there are only a handful
+    for model_name in ('Booking', 'QuickBooking'):
+        model = apps.get_model('bookings', model_name)
+        months = model.objects.order_by().values_list('travel_month', flat=True).distinct()
+        for travel_month in list(months):
+            travel_period = parse_travel_month(travel_month)
+            if travel_period is not None:
+                model.objects.filter(travel_month=travel_month).update(travel_period=travel_period)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_travel_period'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_travel_period, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,63 @@
+import calendar
+import datetime
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
 from django.db import models
 from apps.common.mixins import TimestampMixin
 
+MONTH_NUMBERS = {
+    name.lower()[:3]: number for number, name in enumerate(calendar.month_abbr) if name
+}
+NUMERIC_YEAR_FIRST = re.compile(r'^(\d{4})[-/. ]?(\d{1,2})$')
+NUMERIC_MONTH_FIRST = re.compile(r'^(\d{1,2})[-/. ](\d{4}|\d{2})$')
+NAMED_MONTH_FIRST = re.compile(r"^([a-z]{3,9})\.?[-/,' ]*(\d{4}|\d{2})$")
+NAMED_YEAR_FIRST = re.compile(r'^(\d{4})[-/ ]([a-z]{3,9})$')
+PAISA = Decimal('0.01')
+
+
+def round_money(value):
+    """Round to whole paise, halves away from zero as SQL ROUND() does"""
+    return value.quantize(PAISA, rounding=ROUND_HALF_UP)
+
+
+def parse_travel_month(value):
+    """
+    Turn a free-text travel month into the first day of that month.
+
+    Accepts "2025-03", "202503", "03-2025", "3/25", "Mar-2025", "March 2025",
+    "mar 25" and "2025-Mar". Returns None when the text cannot be read.
+    """
+    if not value:
+        return None
+    text = str(value).strip().lower()
+
+    match = NUMERIC_YEAR_FIRST.match(text)
+    if match:
+        year, month = match.group(1), match.group(2)
+    else:
+        match = NUMERIC_MONTH_FIRST.match(text)
+        if match:
+            month, year = match.group(1), match.group(2)
+        else:
+            match = NAMED_MONTH_FIRST.match(text) or NAMED_YEAR_FIRST.match(text)
+            if not match:
+                return None
+            name, year = match.group(1), match.group(2)
+            if name.isdigit():
+                name, year = year, name
+            month = MONTH_NUMBERS.get(name[:3])
+            if month is None:
+                return None
+
+    year, month = int(year), int(month)
+    if year < 100:
+        year += 2000
+    if not 1 <= month <= 12:
+        return None
+    return datetime.date(year, month, 1)
+
+
 class Booking(TimestampMixin):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -38,6 +95,8 @@ class Booking(TimestampMixin):
     
     # Travel Information
     travel_month = models.CharField(max_length=8, null=False, blank=False)
+    travel_period = models.DateField(null=True, blank=True, db_index=True, editable=False,
+                                     help_text="First day of travel_month, set on save")
     departure_city = models.CharField(max_length=100)
     package_name = models.CharField(max_length=255)
     package_days = models.PositiveIntegerField()
@@ -87,22 +146,34 @@ class Booking(TimestampMixin):
     def total_travelers(self):
         return self.total_adults + self.total_children + self.total_infants
 
-    def save(self, *args, **kwargs):
-        if not self.booking_number:
-            import uuid
-            self.booking_number = f"BK{str(uuid.uuid4())[:8].upper()}"
-        
-        # Auto-calculate totals
+    @staticmethod
+    def generate_booking_number():
+        import uuid
+        return f"BK{str(uuid.uuid4())[:8].upper()}"
+
+    def calculate_totals(self):
+        """Recompute the derived price fields from prices, headcounts and discount"""
         self.total_adult_price = self.adult_price * self.total_adults
         self.total_child_price = self.child_price * self.total_children
         self.total_infant_price = self.infant_price * self.total_infants
         
         # Calculate total price before discount
         subtotal = self.total_adult_price + self.total_child_price + self.total_infant_price
-        self.discount_amount = (subtotal * self.discount_percentage) / 100
-        self.total_price = subtotal - self.discount_amount
+        discount_amount = (subtotal * self.discount_percentage) / 100
+        total_price = subtotal - discount_amount
+        # Each column is rounded from the exact value, the same way on every database
+        self.discount_amount = round_money(discount_amount)
+        self.total_price = round_money(total_price)
         self.payable_amount = self.total_price
-        self.balance = self.total_price - self.advance_payment
+        self.balance = round_money(total_price - self.advance_payment)
+
+    def save(self, *args, **kwargs):
+        if not self.booking_number:
+            self.booking_number = self.generate_booking_number()
+        
+        # Auto-calculate totals
+        self.calculate_totals()
+        self.travel_period = parse_travel_month(self.travel_month)
         
         super().save(*args, **kwargs)
 
@@ -149,6 +220,8 @@ class QuickBooking(TimestampMixin):
     
     # Travel Details
     travel_month = models.CharField(max_length=8, null=False, blank=False)
+    travel_period = models.DateField(null=True, blank=True, db_index=True, editable=False,
+                                     help_text="First day of travel_month, set on save")
     destination = models.CharField(max_length=255)
     number_of_travelers = models.PositiveIntegerField()
     budget = models.DecimalField(max_digits=10, decimal_places=2)
@@ -194,4 +267,5 @@ class QuickBooking(TimestampMixin):
         if self.budget and self.payment:
             self.dues = max(0, self.budget - self.payment)
         
+        self.travel_period = parse_travel_month(self.travel_month)
         super().save(*args, **kwargs)
\ No newline at end of file
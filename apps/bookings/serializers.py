@@ -18,7 +18,7 @@ class BookingSerializer(serializers.ModelSerializer):
         model = Booking
         fields = [
             'id', 'booking_number', 'first_name', 'last_name', 'email', 'mobile_no',
-            'passport_no', 'place_of_issue', 'address', 'travel_month', 'departure_city',
+            'passport_no', 'place_of_issue', 'address', 'travel_month', 'travel_period', 'departure_city',
              'package_details', 'package_name', 'package_days', 
             'room_sharing', 'flight', 'special_request', 'adult_price', 'total_adults',
             'total_adult_price', 'child_price', 'total_children', 'total_child_price',
@@ -70,7 +70,7 @@ class QuickBookingSerializer(serializers.ModelSerializer):
         model = QuickBooking
         fields = [
             'id', 'booking_number', 'first_name', 'last_name', 'email', 'mobile',
-            'travel_month', 'destination', 'number_of_travelers', 'budget',
+            'travel_month', 'travel_period', 'destination', 'number_of_travelers', 'budget',
             'payment', 'dues', 'total_amount', 'payment_status',
             'preferred_payment', 'created_by', 'created_by_name', 'customer_name',
             'is_converted_to_full_booking', 'converted_booking', 'created_at', 'updated_at'
@@ -128,4 +128,63 @@ class QuickBookingReceiptSerializer(serializers.ModelSerializer):
             'mobile', 'travel_month', 'destination', 'number_of_travelers', 
             'budget', 'payment', 'dues', 'total_amount', 'payment_status',
             'preferred_payment', 'created_by_name', 'created_at'
-        ]
\ No newline at end of file
+        ]
+
+class QuickBookingBatchConvertSerializer(serializers.Serializer):
+    """
+    Payload for converting many quick bookings in one request.
+
+    `defaults` holds booking fields shared by every row, each entry in
+    `items` names a quick booking and may override any of those fields.
+    """
+    MAX_ITEMS = 500
+
+    defaults = serializers.DictField(required=False, default=dict)
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_items(self, value):
+        if len(value) > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"A batch cannot contain more than {self.MAX_ITEMS} items.")
+
+        seen = set()
+        for item in value:
+            quick_booking_id = item.get('quick_booking_id')
+            try:
+                quick_booking_id = int(quick_booking_id)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError("Every item needs an integer quick_booking_id.")
+            if quick_booking_id in seen:
+                raise serializers.ValidationError(f"Quick booking {quick_booking_id} is listed more than once.")
+            seen.add(quick_booking_id)
+            item['quick_booking_id'] = quick_booking_id
+        return value
+
+class BookingRepriceSerializer(serializers.Serializer):
+    """
+    Selects bookings to reprice and the optional new prices.
+
+    At least one filter is required so a request can never reprice the
+    whole table by accident.
+    """
+    FILTER_FIELDS = ('travel_month', 'package_name', 'departure_city', 'status', 'booking_ids')
+
+    travel_month = serializers.CharField(required=False)
+    package_name = serializers.CharField(required=False)
+    departure_city = serializers.CharField(required=False)
+    status = serializers.ChoiceField(choices=Booking.STATUS_CHOICES, required=False)
+    booking_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+
+    adult_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    child_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    infant_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    discount_percentage = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, max_value=100, required=False
+    )
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if not any(field in data for field in self.FILTER_FIELDS):
+            raise serializers.ValidationError(
+                f"Provide at least one of: {', '.join(self.FILTER_FIELDS)}."
+            )
+        return data
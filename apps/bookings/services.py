@@ -0,0 +1,156 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Value
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .models import Booking, parse_travel_month, round_money
+
+PRICE_FIELDS = ('adult_price', 'child_price', 'infant_price', 'discount_percentage')
+
+
+def _decimal(expression):
+    return ExpressionWrapper(expression, output_field=DecimalField(max_digits=20, decimal_places=6))
+
+
+def booking_price_expressions(adult_price=None, child_price=None, infant_price=None,
+                              discount_percentage=None):
+    """
+    Build update expressions that mirror Booking.calculate_totals().
+
+    Each price argument replaces the stored column when given, otherwise the
+    current column value is used. UPDATE evaluates every SET clause against
+    the old row, so derived values are expanded from the inputs rather than
+    referencing each other.
+    """
+    def operand(name, value):
+        if value is None:
+            return F(name)
+        return Value(Decimal(value), output_field=Booking._meta.get_field(name))
+
+    adult = operand('adult_price', adult_price)
+    child = operand('child_price', child_price)
+    infant = operand('infant_price', infant_price)
+    discount_rate = operand('discount_percentage', discount_percentage)
+
+    total_adult_price = _decimal(adult * F('total_adults'))
+    total_child_price = _decimal(child * F('total_children'))
+    total_infant_price = _decimal(infant * F('total_infants'))
+    subtotal = _decimal(total_adult_price + total_child_price + total_infant_price)
+    # (subtotal * rate) / 100 written as a multiplication by 0.01: the values
+    # are identical, but SQLite would truncate an integer division by 100
+    discount_amount = _decimal(subtotal * discount_rate * Value(Decimal('0.01')))
+    total_price = _decimal(subtotal - discount_amount)
+
+    # Rounded explicitly like round_money(): SQLite would otherwise store the
+    # exact value and round halves to even when reading it back
+    expressions = {
+        'total_adult_price': total_adult_price,
+        'total_child_price': total_child_price,
+        'total_infant_price': total_infant_price,
+        'discount_amount': _decimal(Round(discount_amount, 2)),
+        'total_price': _decimal(Round(total_price, 2)),
+        'payable_amount': _decimal(Round(total_price, 2)),
+        'balance': _decimal(Round(total_price - F('advance_payment'), 2)),
+    }
+    for name, value in zip(PRICE_FIELDS, (adult_price, child_price, infant_price, discount_percentage)):
+        if value is not None:
+            expressions[name] = Value(Decimal(value), output_field=Booking._meta.get_field(name))
+    return expressions
+
+
+def repricing_queryset(travel_month=None, package_name=None, departure_city=None,
+                       status=None, booking_ids=None):
+    """Bookings matching the repricing filters, unset filters are ignored"""
+    queryset = Booking.objects.all()
+    if travel_month:
+        travel_period = parse_travel_month(travel_month)
+        if travel_period:
+            queryset = queryset.filter(travel_period=travel_period)
+        else:
+            queryset = queryset.filter(travel_month=travel_month)
+    if package_name:
+        queryset = queryset.filter(package_name__iexact=package_name)
+    if departure_city:
+        queryset = queryset.filter(departure_city__iexact=departure_city)
+    if status:
+        queryset = queryset.filter(status=status)
+    if booking_ids:
+        queryset = queryset.filter(pk__in=booking_ids)
+    return queryset
+
+
+def preview_repricing(queryset, **prices):
+    """Return the bookings whose stored totals would change, with old and new values"""
+    expressions = booking_price_expressions(**prices)
+    annotations = {
+        f'new_{name}': Cast(expression, output_field=Booking._meta.get_field(name))
+        for name, expression in expressions.items()
+    }
+
+    changes = []
+    rows = queryset.order_by('pk').annotate(**annotations).values(
+        'id', 'booking_number', *expressions.keys(), *annotations.keys()
+    )
+    for row in rows.iterator(chunk_size=2000):
+        diff = {}
+        for name in expressions:
+            # Already rounded in SQL, this only drops digits the cast carries along
+            new_value = round_money(row[f'new_{name}'])
+            if new_value != row[name]:
+                diff[name] = {'old': row[name], 'new': new_value, 'delta': new_value - row[name]}
+        if diff:
+            changes.append({'id': row['id'], 'booking_number': row['booking_number'], 'changes': diff})
+    return changes
+
+
+def _total_price(queryset):
+    # Summed in Python over the column values as the model reads them, SQLite
+    # keeps unrounded values and a SUM() would not match the per-row deltas
+    return sum(queryset.values_list('total_price', flat=True), Decimal('0'))
+
+
+def reprice_bookings(queryset, dry_run=False, batch_size=500, **prices):
+    """
+    Recompute booking totals in the database, one UPDATE per batch of ids.
+
+    Optional `adult_price`, `child_price`, `infant_price` and
+    `discount_percentage` overwrite those columns before the totals are
+    derived. With `dry_run` nothing is written and the per-booking deltas
+    are returned instead.
+    """
+    queryset = queryset.order_by()
+    if dry_run:
+        changes = preview_repricing(queryset, **prices)
+        total_price_delta = sum(
+            (row['changes']['total_price']['delta'] for row in changes if 'total_price' in row['changes']),
+            Decimal('0'),
+        )
+        return {
+            'dry_run': True,
+            'matched': queryset.count(),
+            'changed': len(changes),
+            'total_price_delta': total_price_delta,
+            'changes': changes,
+        }
+
+    expressions = booking_price_expressions(**prices)
+    ids = list(queryset.order_by('pk').values_list('pk', flat=True))
+
+    updated = 0
+    total_price_delta = Decimal('0')
+    for start in range(0, len(ids), batch_size):
+        batch = Booking.objects.filter(pk__in=ids[start:start + batch_size])
+        with transaction.atomic():
+            before = _total_price(batch)
+            updated += batch.update(updated_at=timezone.now(), **expressions)
+            after = _total_price(batch)
+        total_price_delta += after - before
+
+    return {
+        'dry_run': False,
+        'matched': len(ids),
+        'updated': updated,
+        'total_price_delta': total_price_delta,
+    }
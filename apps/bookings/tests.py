@@ -1,3 +1,626 @@
-from django.test import TestCase
+import csv
+import datetime
+import hashlib
+import importlib
+import random
+import time
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.common.pagination import CreatedAtCursorPagination
+from apps.users.models import User
+from .models import Booking, BookingTraveler, QuickBooking, parse_travel_month
+from .services import reprice_bookings
+
+DERIVED_FIELDS = (
+    'total_adult_price', 'total_child_price', 'total_infant_price',
+    'discount_amount', 'total_price', 'payable_amount', 'balance',
+)
+
+
+def money(rng, upper):
+    return Decimal(rng.randint(0, upper * 100)) / 100
+
+
+class BookingRepricingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.superadmin = User.objects.create_user(
+            username='root', email='root@example.com', password='pass', role='superadmin'
+        )
+
+        rng = random.Random(2024)
+        for _ in range(200):
+            cls.create_booking(
+                adult_price=money(rng, 250000),
+                total_adults=rng.randint(1, 9),
+                child_price=money(rng, 90000),
+                total_children=rng.randint(0, 4),
+                infant_price=money(rng, 20000),
+                total_infants=rng.randint(0, 2),
+                discount_percentage=money(rng, 40),
+                advance_payment=money(rng, 50000),
+            )
+        # Discounts that land exactly on half a paisa
+        cls.create_booking(adult_price=Decimal('100.50'), total_adults=1, discount_percentage=Decimal('1.00'))
+        cls.create_booking(adult_price=Decimal('10.50'), total_adults=1, discount_percentage=Decimal('9.00'))
+        cls.create_booking(adult_price=Decimal('0.50'), total_adults=3, discount_percentage=Decimal('33.33'))
+        cls.create_booking(travel_month='2025-04', adult_price=Decimal('1000.00'), total_adults=2)
+
+    @classmethod
+    def create_booking(cls, **kwargs):
+        values = {
+            'first_name': 'Test', 'last_name': 'Pilgrim', 'mobile_no': '9999999999',
+            'address': 'Mumbai', 'travel_month': '2025-03', 'departure_city': 'Mumbai',
+            'package_name': 'Economy', 'package_days': 15, 'room_sharing': 'quad',
+            'payment_type': 'cash', 'created_by': cls.admin,
+        }
+        values.update(kwargs)
+        return Booking.objects.create(**values)
+
+    def saved_totals(self, queryset):
+        return {booking.pk: [getattr(booking, name) for name in DERIVED_FIELDS] for booking in queryset}
+
+    def corrupt_totals(self, queryset):
+        queryset.update(**{name: 0 for name in DERIVED_FIELDS})
+
+    def test_reprice_matches_save(self):
+        expected = self.saved_totals(Booking.objects.all())
+        self.corrupt_totals(Booking.objects.all())
+
+        result = reprice_bookings(Booking.objects.all(), batch_size=37)
+
+        self.assertEqual(result['updated'], len(expected))
+        self.assertEqual(self.saved_totals(Booking.objects.all()), expected)
+
+    def test_new_prices_match_save(self):
+        queryset = Booking.objects.filter(travel_month='2025-03')
+        reprice_bookings(
+            queryset,
+            adult_price=Decimal('123456.78'),
+            child_price=Decimal('4321.05'),
+            discount_percentage=Decimal('12.50'),
+        )
+
+        for booking in queryset:
+            self.assertEqual(booking.adult_price, Decimal('123456.78'))
+            self.assertEqual(booking.child_price, Decimal('4321.05'))
+            self.assertEqual(booking.discount_percentage, Decimal('12.50'))
+            total_price = booking.total_price
+            booking.save()
+            booking.refresh_from_db()
+            self.assertEqual(booking.total_price, total_price)
+
+        untouched = Booking.objects.get(travel_month='2025-04')
+        self.assertEqual(untouched.adult_price, Decimal('1000.00'))
+
+    def test_dry_run_reports_deltas_without_saving(self):
+        queryset = Booking.objects.filter(travel_month='2025-03')
+        before = self.saved_totals(queryset)
+
+        preview = reprice_bookings(queryset, dry_run=True, discount_percentage=Decimal('5.00'))
+        self.assertEqual(self.saved_totals(queryset.all()), before)
+
+        result = reprice_bookings(queryset, discount_percentage=Decimal('5.00'))
+        self.assertEqual(preview['total_price_delta'], result['total_price_delta'])
+
+        after = {booking.pk: booking for booking in queryset.all()}
+        for row in preview['changes']:
+            for name, change in row['changes'].items():
+                self.assertEqual(getattr(after[row['id']], name), change['new'])
+
+    def test_halves_round_away_from_zero_on_every_path(self):
+        # Half-even rounding would give 0.94 and 0.96
+        first = self.create_booking(adult_price=Decimal('10.50'), total_adults=1, discount_percentage=Decimal('9.00'))
+        second = self.create_booking(
+            adult_price=Decimal('1.00'), total_adults=1, discount_percentage=Decimal('3.50'),
+            advance_payment=Decimal('2.00'),
+        )
+        expected = {
+            first.pk: {'discount_amount': Decimal('0.95'), 'total_price': Decimal('9.56'),
+                       'balance': Decimal('9.56')},
+            second.pk: {'discount_amount': Decimal('0.04'), 'total_price': Decimal('0.97'),
+                        'balance': Decimal('-1.04')},
+        }
+        queryset = Booking.objects.filter(pk__in=expected)
+
+        def stored():
+            return {
+                booking['id']: {name: booking[name] for name in ('discount_amount', 'total_price', 'balance')}
+                for booking in queryset.values()
+            }
+
+        self.assertEqual(stored(), expected)
+        self.corrupt_totals(queryset)
+        preview = reprice_bookings(queryset, dry_run=True)
+        self.assertEqual(
+            {row['id']: {name: row['changes'][name]['new'] for name in expected[row['id']]}
+             for row in preview['changes']},
+            expected,
+        )
+        reprice_bookings(queryset)
+        self.assertEqual(stored(), expected)
+
+    def test_dry_run_reports_nothing_when_totals_are_current(self):
+        preview = reprice_bookings(Booking.objects.all(), dry_run=True)
+        self.assertEqual(preview['changed'], 0)
+        self.assertEqual(preview['total_price_delta'], Decimal('0'))
+
+    def test_management_command(self):
+        booking = Booking.objects.get(travel_month='2025-04')
+        out = StringIO()
+        call_command('reprice_bookings', travel_month='2025-04', adult_price='1500', stdout=out)
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.total_price, Decimal('3000.00'))
+        self.assertIn('Repriced 1 bookings', out.getvalue())
+
+    def test_endpoint_is_superadmin_only(self):
+        client = APIClient()
+        payload = {'travel_month': '2025-04', 'adult_price': '1500.00', 'dry_run': True}
+
+        client.force_authenticate(self.admin)
+        response = client.post('/api/bookings/bookings/reprice/', payload, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        client.force_authenticate(self.superadmin)
+        response = client.post('/api/bookings/bookings/reprice/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['changed'], 1)
+
+        response = client.post('/api/bookings/bookings/reprice/', {'adult_price': '1500.00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingManifestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.other_admin = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def create_booking(self, travelers=(), **kwargs):
+        """A booking with travelers given as (name, traveler_type) pairs"""
+        values = {
+            'first_name': 'Lead', 'last_name': 'Pilgrim', 'mobile_no': '9999999999', 'address': 'Mumbai',
+            'travel_month': '2025-03', 'departure_city': 'Mumbai', 'package_name': 'Economy', 'package_days': 15,
+            'room_sharing': 'quad', 'payment_type': 'cash', 'adult_price': Decimal('1000.00'),
+            'total_adults': sum(1 for _, traveler_type in travelers if traveler_type == 'adult') or 1,
+            'created_by': self.admin,
+        }
+        values.update(kwargs)
+        booking = Booking.objects.create(**values)
+        BookingTraveler.objects.bulk_create([
+            BookingTraveler(booking=booking, name=name, age=30 if traveler_type == 'adult' else 2, gender='M',
+                            traveler_type=traveler_type)
+            for name, traveler_type in travelers
+        ])
+        return booking
+
+    def manifest(self, **params):
+        response = self.client.get('/api/bookings/bookings/manifest/', {'travel_month': '2025-03', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['departures']
+
+    def rooms(self, departure, sharing):
+        return {
+            room['room']: (room['booking_numbers'], [person['name'] for person in room['occupants']],
+                           [person['name'] for person in room['infants']])
+            for room in departure['rooming_list'][sharing]
+        }
+
+    def test_parties_are_packed_whole_into_the_fullest_room(self):
+        five = self.create_booking([(f'A{number}', 'adult') for number in range(5)] + [('A-baby', 'infant')])
+        three = self.create_booking([('B0', 'adult'), ('B1', 'adult'), ('B2', 'adult')])
+        two = self.create_booking([('C0', 'adult'), ('C1', 'adult'), ('C-baby', 'infant')])
+
+        departure, = self.manifest()
+        self.assertEqual(departure['room_count'], {'quad': 3})
+        self.assertEqual(self.rooms(departure, 'quad'), {
+            # A booking fills whole rooms first; its infant stays with the first of them
+            'Q-1': ([five.booking_number], ['A0', 'A1', 'A2', 'A3'], ['A-baby']),
+            # Then the largest leftover parties, each kept together
+            'Q-2': ([three.booking_number, five.booking_number], ['B0', 'B1', 'B2', 'A4'], []),
+            'Q-3': ([two.booking_number], ['C0', 'C1'], ['C-baby']),
+        })
+        rooms = {traveler['name']: traveler['room'] for traveler in departure['travelers']}
+        self.assertEqual((rooms['A4'], rooms['C-baby']), ('Q-2', 'Q-3'))
+        self.assertEqual(departure['traveler_types'], {'adult': 10, 'child': 0, 'infant': 2})
+
+    def test_sharing_types_are_packed_separately(self):
+        couple = self.create_booking([('D0', 'adult'), ('D1', 'adult'), ('D2', 'adult')], room_sharing='double')
+        single = self.create_booking([('S0', 'adult'), ('S1', 'adult')], room_sharing='single')
+        triple = self.create_booking([('T0', 'adult'), ('T1', 'child')], room_sharing='triple')
+        self.create_booking([('Q0', 'adult')], room_sharing='quad')
+
+        departure, = self.manifest()
+        self.assertEqual(departure['room_count'], {'single': 2, 'double': 2, 'triple': 1, 'quad': 1})
+        self.assertEqual(self.rooms(departure, 'double'), {
+            'D-1': ([couple.booking_number], ['D0', 'D1'], []),
+            'D-2': ([couple.booking_number], ['D2'], []),
+        })
+        self.assertEqual(self.rooms(departure, 'single'), {
+            'S-1': ([single.booking_number], ['S0'], []),
+            'S-2': ([single.booking_number], ['S1'], []),
+        })
+        self.assertEqual(self.rooms(departure, 'triple'), {'T-1': ([triple.booking_number], ['T0', 'T1'], [])})
+
+    def test_unnamed_travelers_hold_beds(self):
+        booking = self.create_booking(total_adults=3, total_children=1, total_infants=1)
+
+        departure, = self.manifest()
+        self.assertEqual([traveler['name'] for traveler in departure['travelers']], ['Lead Pilgrim'])
+        self.assertEqual((departure['traveler_count'], departure['unnamed_travelers']), (5, 4))
+        booking_numbers, occupants, infants = self.rooms(departure, 'quad')['Q-1']
+        self.assertEqual(
+            (booking_numbers, occupants, infants), ([booking.booking_number], ['Lead Pilgrim', '', '', ''], [])
+        )
+        self.assertEqual(
+            [person['traveler_type'] for person in departure['rooming_list']['quad'][0]['occupants']],
+            ['adult', 'adult', 'adult', 'child']
+        )
+
+    def test_departures_in_scope(self):
+        self.create_booking([('Mumbai', 'adult')])
+        self.create_booking([('Delhi', 'adult')], departure_city='Delhi')
+        self.create_booking([('Cancelled', 'adult')], status='cancelled')
+        self.create_booking([('April', 'adult')], travel_month='2025-04')
+        self.create_booking([('Other agency', 'adult')], created_by=self.other_admin)
+
+        departures = self.manifest()
+        self.assertEqual(
+            [(departure['departure_city'], [traveler['name'] for traveler in departure['travelers']])
+             for departure in departures],
+            [('Delhi', ['Delhi']), ('Mumbai', ['Mumbai'])]
+        )
+        departure, = self.manifest(departure_city='delhi')
+        self.assertEqual(departure['departure_city'], 'Delhi')
+
+        response = self.client.get('/api/bookings/bookings/manifest/', {'travel_month': '2025-03', 'export': 'csv'})
+        rows = list(csv.reader(StringIO(response.content.decode())))
+        self.assertEqual(rows[0][:4], ['Travel Month', 'Departure City', 'Room Sharing', 'Room'])
+        self.assertEqual(
+            [(row[1], row[3], row[5]) for row in rows[1:]], [('Delhi', 'Q-1', 'Delhi'), ('Mumbai', 'Q-1', 'Mumbai')]
+        )
+
+        self.assertEqual(self.client.get('/api/bookings/bookings/manifest/').status_code, 400)
+        response = self.client.get('/api/bookings/bookings/manifest/', {'travel_month': '2025-03', 'export': 'xls'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_five_thousand_travelers_in_one_query(self):
+        bookings = []
+        for number in range(1250):
+            booking = Booking(
+                booking_number=f'BK{number:08d}', first_name='Lead', last_name=f'Pilgrim {number}',
+                mobile_no='9999999999', address='Mumbai', travel_month='2025-03', departure_city='Mumbai',
+                package_name='Economy', package_days=15, room_sharing=('double', 'triple', 'quad')[number % 3],
+                payment_type='cash', adult_price=Decimal('1000.00'), total_adults=3, total_children=1,
+                created_by=self.admin,
+            )
+            booking.calculate_totals()
+            booking.travel_period = parse_travel_month(booking.travel_month)
+            bookings.append(booking)
+        Booking.objects.bulk_create(bookings)
+        BookingTraveler.objects.bulk_create([
+            BookingTraveler(booking=booking, name=f'{booking.last_name} {index}', age=30, gender='F',
+                            traveler_type='child' if index == 3 else 'adult')
+            for booking in Booking.objects.all() for index in range(4)
+        ], batch_size=1000)
+
+        started = time.perf_counter()
+        with self.assertNumQueries(1):
+            departure, = self.manifest()
+        self.assertLess(time.perf_counter() - started, 2)
+
+        self.assertEqual(departure['traveler_count'], 5000)
+        placed = sum(len(room['occupants']) for rooms in departure['rooming_list'].values() for room in rooms)
+        self.assertEqual(placed, 5000)
+        self.assertTrue(all(traveler['room'] for traveler in departure['travelers']))
+
+
+class BatchConvertQuickBookingTests(TestCase):
+    defaults = {
+        'address': 'Mumbai', 'departure_city': 'Mumbai', 'package_name': 'Economy', 'package_days': 15,
+        'room_sharing': 'quad', 'adult_price': '1000.00', 'payment_type': 'cash',
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.accountant = User.objects.create_user(
+            username='accounts', email='accounts@example.com', password='pass', role='accountant',
+            created_by=cls.admin
+        )
+        cls.other_admin = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def quick_booking(self, created_by=None, **kwargs):
+        values = {
+            'first_name': 'Quick', 'last_name': 'Pilgrim', 'mobile': '9999999999', 'travel_month': '2025-03',
+            'destination': 'Makkah', 'number_of_travelers': 2, 'budget': Decimal('2000.00'),
+            'preferred_payment': 'pay_later', 'created_by': created_by or self.admin,
+        }
+        values.update(kwargs)
+        return QuickBooking.objects.create(**values)
+
+    def convert(self, items, user=None):
+        if user:
+            self.client.force_authenticate(user)
+        return self.client.post('/api/bookings/quick-bookings/convert/batch/', {
+            'defaults': self.defaults, 'items': items,
+        }, format='json')
+
+    def test_rows_fail_individually(self):
+        own = self.quick_booking(first_name='Own')
+        accountants = self.quick_booking(created_by=self.accountant, first_name='Accountants')
+        others = self.quick_booking(created_by=self.other_admin)
+        invalid = self.quick_booking()
+        converted = self.quick_booking(is_converted_to_full_booking=True)
+
+        response = self.convert([
+            {'quick_booking_id': own.pk, 'travelers': [
+                {'name': 'Own Pilgrim', 'age': 40, 'gender': 'F', 'traveler_type': 'adult'},
+            ]},
+            {'quick_booking_id': accountants.pk, 'room_sharing': 'double', 'first_name': 'Ignored'},
+            {'quick_booking_id': others.pk},
+            {'quick_booking_id': invalid.pk, 'room_sharing': 'penthouse'},
+            {'quick_booking_id': converted.pk},
+            {'quick_booking_id': 999999},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['converted_count'], response.data['failed_count']), (2, 4))
+        results = response.data['results']
+        self.assertEqual(
+            [(result['quick_booking_id'], result['status']) for result in results],
+            [(own.pk, 'converted'), (accountants.pk, 'converted'), (others.pk, 'not_found'),
+             (invalid.pk, 'invalid'), (converted.pk, 'already_converted'), (999999, 'not_found')]
+        )
+        self.assertIn('room_sharing', results[3]['errors'])
+
+        own.refresh_from_db()
+        booking = Booking.objects.get(pk=results[0]['booking_id'])
+        self.assertEqual((own.is_converted_to_full_booking, own.converted_booking), (True, booking))
+        self.assertEqual((booking.first_name, booking.total_adults, booking.created_by), ('Own', 2, self.admin))
+        self.assertEqual(booking.total_price, Decimal('2000.00'))
+        self.assertEqual(booking.booking_number, results[0]['booking_number'])
+        self.assertEqual(list(booking.travelers.values_list('name', flat=True)), ['Own Pilgrim'])
+        # Quick booking fields win over overrides, other overrides apply
+        booking = Booking.objects.get(pk=results[1]['booking_id'])
+        self.assertEqual((booking.first_name, booking.room_sharing), ('Accountants', 'double'))
+
+        for quick_booking in (others, invalid):
+            quick_booking.refresh_from_db()
+            self.assertFalse(quick_booking.is_converted_to_full_booking)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_accountant_reaches_their_admins_quick_bookings(self):
+        admins = self.quick_booking()
+        others = self.quick_booking(created_by=self.other_admin)
+        response = self.convert(
+            [{'quick_booking_id': admins.pk}, {'quick_booking_id': others.pk}], user=self.accountant
+        )
+        self.assertEqual([result['status'] for result in response.data['results']], ['converted', 'not_found'])
+        self.assertEqual(Booking.objects.get().created_by, self.accountant)
+
+        response = self.client.post(f'/api/bookings/quick-bookings/{others.pk}/convert/', self.defaults, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_batch_costs_the_same_queries_at_any_size(self):
+        def queries(count):
+            items = [{'quick_booking_id': self.quick_booking().pk} for _ in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                response = self.convert(items)
+            self.assertEqual(response.data['converted_count'], count)
+            return len(captured)
+
+        # Small enough that SQLite needs no extra insert batches
+        self.assertEqual(queries(3), queries(12))
+        self.assertFalse(QuickBooking.objects.filter(is_converted_to_full_booking=False).exists())
+        self.assertFalse(QuickBooking.objects.filter(converted_booking__isnull=True).exists())
+
+
+class CursorPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.other_admin = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+        for number in range(7):
+            cls.quick_booking(first_name=f'Pilgrim {number}')
+        QuickBooking.objects.create(
+            first_name='Other', last_name='Agency', mobile='9999999999', travel_month='2025-03',
+            destination='Makkah', number_of_travelers=1, budget=Decimal('1000.00'),
+            preferred_payment='pay_later', created_by=cls.other_admin,
+        )
+        # Two pages share a created_at, the id keeps their order stable
+        QuickBooking.objects.filter(first_name__in=['Pilgrim 2', 'Pilgrim 3', 'Pilgrim 4']).update(
+            created_at=QuickBooking.objects.get(first_name='Pilgrim 2').created_at
+        )
+
+    @classmethod
+    def quick_booking(cls, **kwargs):
+        values = {
+            'first_name': 'Quick', 'last_name': 'Pilgrim', 'mobile': '9999999999', 'travel_month': '2025-03',
+            'destination': 'Makkah', 'number_of_travelers': 2, 'budget': Decimal('2000.00'),
+            'preferred_payment': 'pay_later', 'created_by': cls.admin,
+        }
+        values.update(kwargs)
+        return QuickBooking.objects.create(**values)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def expected_order(self):
+        return list(
+            QuickBooking.objects.filter(created_by=self.admin)
+            .order_by('-created_at', '-id').values_list('first_name', flat=True)
+        )
+
+    def test_page_numbers_stay_the_default(self):
+        response = self.client.get('/api/bookings/quick-bookings/', {'page': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 7)
+        self.assertNotIn('count_is_approximate', response.data)
+        self.assertEqual(len(response.data['results']), 7)
+        self.assertEqual(self.client.get('/api/bookings/quick-bookings/', {'page': 2}).status_code, 404)
+
+    def test_cursor_pages_round_trip(self):
+        response = self.client.get('/api/bookings/quick-bookings/', {'pagination': 'cursor', 'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['count'], response.data['count_is_approximate']), (7, True))
+        self.assertIsNone(response.data['previous'])
+
+        pages = [response.data]
+        while pages[-1]['next']:
+            # A cursor alone keeps cursor mode, without ?pagination=cursor
+            link = pages[-1]['next'].replace('&pagination=cursor', '')
+            self.assertIn('cursor=', link)
+            pages.append(self.client.get(link).data)
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        names = [result['first_name'] for page in pages for result in page['results']]
+        self.assertEqual(names, self.expected_order())
+
+        # And back again
+        back = self.client.get(pages[-1]['previous']).data
+        self.assertEqual(back['results'], pages[1]['results'])
+        back = self.client.get(back['previous']).data
+        self.assertEqual(back['results'], pages[0]['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_cursor_order_ignores_ordering_param(self):
+        response = self.client.get(
+            '/api/bookings/quick-bookings/', {'pagination': 'cursor', 'ordering': 'budget', 'page_size': 10}
+        )
+        self.assertEqual([result['first_name'] for result in response.data['results']], self.expected_order())
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/bookings/quick-bookings/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_count_is_cached_per_query(self):
+        params = {'pagination': 'cursor', 'page_size': 3}
+        self.assertEqual(self.client.get('/api/bookings/quick-bookings/', params).data['count'], 7)
+        self.quick_booking(preferred_payment='full_advance')
+        # The cached total lags behind the insert, other filters get their own count
+        self.assertEqual(self.client.get('/api/bookings/quick-bookings/', params).data['count'], 7)
+        filtered = self.client.get('/api/bookings/quick-bookings/', {**params, 'preferred_payment': 'full_advance'})
+        self.assertEqual(filtered.data['count'], 1)
+        cache.clear()
+        self.assertEqual(self.client.get('/api/bookings/quick-bookings/', params).data['count'], 8)
+
+    def test_cached_count_is_keyed_by_the_sql_digest(self):
+        paginator = CreatedAtCursorPagination()
+        queryset = QuickBooking.objects.filter(created_by=self.admin).order_by('-budget')
+        self.assertEqual(paginator.get_cached_count(queryset), 7)
+        digest = hashlib.md5(str(queryset.order_by().query).encode('utf-8')).hexdigest()
+        self.assertEqual(cache.get(f'pagination:count:{digest}'), 7)
+        # Ordering does not split the cache
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.get_cached_count(queryset.order_by('id')), 7)
+            # Nor does a query that cannot match anything reach the database
+            self.assertEqual(paginator.get_cached_count(QuickBooking.objects.filter(pk__in=[])), 0)
+
+
+class ParseTravelMonthTests(SimpleTestCase):
+    readable = {
+        '2025-03': (2025, 3), '2025/3': (2025, 3), '2025.03': (2025, 3), '202503': (2025, 3),
+        '03-2025': (2025, 3), '3/25': (2025, 3), '12 2026': (2026, 12),
+        'Mar-2025': (2025, 3), 'March 2025': (2025, 3), 'mar 25': (2025, 3), "Sept '25": (2025, 9),
+        'Dec. 2025': (2025, 12), 'DECEMBER,2025': (2025, 12), '2025-Mar': (2025, 3), '2025 june': (2025, 6),
+        '  2025-03  ': (2025, 3),
+    }
+    unreadable = ['', None, '2025-13', '00/2025', 'Foo 2025', '2025', 'March', '1/2/2025', 'soon']
+
+    def test_readable_formats(self):
+        for text, (year, month) in self.readable.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_travel_month(text), datetime.date(year, month, 1))
+
+    def test_unreadable_formats(self):
+        for text in self.unreadable:
+            with self.subTest(text=text):
+                self.assertIsNone(parse_travel_month(text))
+
+    def test_backfill_copy_agrees(self):
+        migration = importlib.import_module('apps.bookings.migrations.0010_backfill_travel_period')
+        for text in [*self.readable, *self.unreadable]:
+            with self.subTest(text=text):
+                self.assertEqual(migration.parse_travel_month(text), parse_travel_month(text))
+
+
+class TravelPeriodFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        for travel_month in ['2025-03', 'March 2025', '3/25', '2025-04', 'Jun-2025', 'after Ramadan']:
+            QuickBooking.objects.create(
+                first_name=travel_month, last_name='Pilgrim', mobile='9999999999', travel_month=travel_month,
+                destination='Makkah', number_of_travelers=1, budget=Decimal('1000.00'),
+                preferred_payment='pay_later', created_by=cls.admin,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def travel_months(self, **params):
+        response = self.client.get('/api/bookings/quick-bookings/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(result['travel_month'] for result in response.data['results'])
+
+    def test_save_fills_travel_period(self):
+        self.assertEqual(
+            dict(QuickBooking.objects.values_list('travel_month', 'travel_period')),
+            {'2025-03': datetime.date(2025, 3, 1), 'March 2025': datetime.date(2025, 3, 1),
+             '3/25': datetime.date(2025, 3, 1), '2025-04': datetime.date(2025, 4, 1),
+             'Jun-2025': datetime.date(2025, 6, 1), 'after Ramadan': None},
+        )
+
+    def test_any_spelling_finds_the_month(self):
+        march = ['2025-03', '3/25', 'March 2025']
+        self.assertEqual(self.travel_months(travel_month='Mar 2025'), march)
+        self.assertEqual(self.travel_months(travel_month='202503'), march)
+        # Text that is not a month still matches exactly
+        self.assertEqual(self.travel_months(travel_month='after Ramadan'), ['after Ramadan'])
+
+    def test_month_range_is_inclusive(self):
+        self.assertEqual(
+            self.travel_months(travel_from='2025-04', travel_to='June 2025'), ['2025-04', 'Jun-2025']
+        )
+        self.assertEqual(self.travel_months(travel_from='04/2025'), ['2025-04', 'Jun-2025'])
+        self.assertEqual(len(self.travel_months(travel_to='2025-03')), 3)
@@ -9,6 +9,9 @@ from .views import (
     BookingReceiptView,
     QuickBookingReceiptView,
     ConvertQuickBookingView,
+    BatchConvertQuickBookingView,
+    BookingRepriceView,
+    BookingManifestView,
     AllBookingDetailView,
     AllQuickBookingDetailView,
     UserBookingDetailView,
@@ -26,6 +29,9 @@ urlpatterns = [
     path('bookings/<int:pk>/receipt/', BookingReceiptView.as_view(), name='booking-receipt'),
     path('quick-bookings/<int:pk>/receipt/', QuickBookingReceiptView.as_view(), name='quick-booking-receipt'),
     path('quick-bookings/<int:pk>/convert/', ConvertQuickBookingView.as_view(), name='convert-quick-booking'),
+    path('bookings/manifest/', BookingManifestView.as_view(), name='booking-manifest'),
+    path('bookings/reprice/', BookingRepriceView.as_view(), name='booking-reprice'),
+    path('quick-bookings/convert/batch/', BatchConvertQuickBookingView.as_view(), name='batch-convert-quick-bookings'),
     
     # New URLs for user-specific views
     path('my-bookings/', AllBookingDetailView.as_view(), name='user-all-bookings'),
@@ -5,21 +5,86 @@ from rest_framework.decorators import api_view, permission_classes
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import HttpResponse
 from django.template.loader import render_to_string
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework import status
 from weasyprint import HTML, CSS
 from xhtml2pdf import pisa
 from io import BytesIO
+import csv
 import tempfile
 import os
-from .models import Booking, BookingTraveler, QuickBooking
+from .models import Booking, BookingTraveler, QuickBooking, parse_travel_month
 from .serializers import (
     BookingSerializer, BookingTravelerSerializer, QuickBookingSerializer,
-    BookingReceiptSerializer, QuickBookingReceiptSerializer
+    BookingReceiptSerializer, QuickBookingReceiptSerializer,
+    QuickBookingBatchConvertSerializer, BookingRepriceSerializer
 )
-from apps.common.permissions import IsFranchiseOrAgencyAdmin
+from .manifest import CSV_HEADER, build_manifest
+from .services import PRICE_FIELDS, repricing_queryset, reprice_bookings
+from apps.common.permissions import IsFranchiseOrAgencyAdmin, IsSuperAdmin
+from apps.common.pagination import OptionalCursorPagination
 
 
-class BookingListCreateView(generics.ListCreateAPIView):
+def get_accessible_queryset(user, queryset):
+    """
+    Filter a Booking or QuickBooking queryset by user role.
+    - Superadmin: sees everything
+    - Accountant: sees data created by their parent admin AND their own data
+    - Agency/Franchise admin: sees their own data AND data created by their accountants
+    """
+    if user.role == 'superadmin':
+        return queryset
+    elif user.role == 'accountant':
+        if user.created_by:
+            return queryset.filter(created_by__in=[user.created_by, user])
+        else:
+            return queryset.filter(created_by=user)
+    else:
+        return queryset.filter(
+            Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
+        )
+
+
+def is_accessible(user, instance):
+    """Whether get_accessible_queryset lets user reach this Booking or QuickBooking"""
+    return get_accessible_queryset(user, type(instance).objects.filter(pk=instance.pk)).exists()
+
+
+def filter_by_travel_period(queryset, params):
+    """
+    Apply travel month filters as range queries on travel_period.
+    - travel_month: a single month, in any format parse_travel_month accepts
+    - travel_from / travel_to: inclusive month range
+    Unparseable travel_month values fall back to matching the stored text.
+    """
+    travel_month = params.get('travel_month')
+    if travel_month:
+        travel_period = parse_travel_month(travel_month)
+        if travel_period:
+            queryset = queryset.filter(travel_period=travel_period)
+        else:
+            queryset = queryset.filter(travel_month=travel_month)
+
+    travel_from = parse_travel_month(params.get('travel_from'))
+    if travel_from:
+        queryset = queryset.filter(travel_period__gte=travel_from)
+    travel_to = parse_travel_month(params.get('travel_to'))
+    if travel_to:
+        queryset = queryset.filter(travel_period__lte=travel_to)
+    return queryset
+
+
+class TravelPeriodFilterMixin:
+    """List views: filter by travel_month, travel_from and travel_to"""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return filter_by_travel_period(queryset, self.request.query_params)
+
+
+class BookingListCreateView(TravelPeriodFilterMixin, generics.ListCreateAPIView):
     """
     GET: List all bookings (filtered by user role)
     POST: Create a new booking
@@ -27,30 +92,14 @@ class BookingListCreateView(generics.ListCreateAPIView):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsFranchiseOrAgencyAdmin]
+    pagination_class = OptionalCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['status', 'travel_month', 'payment_type']
+    filterset_fields = ['status', 'payment_type']
     search_fields = ['booking_number', 'first_name', 'last_name', 'email']
-    ordering_fields = ['created_at', 'travel_month', 'total_price']
+    ordering_fields = ['created_at', 'travel_period', 'travel_month', 'total_price']
     
     def get_queryset(self):
-        from django.db.models import Q
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            # Superadmin can see all bookings
-            return queryset
-        elif user.role == 'accountant':
-            # Accountant can see bookings created by their parent admin AND themselves
-            if user.created_by:
-                return queryset.filter(created_by__in=[user.created_by, user])
-            else:
-                return queryset.filter(created_by=user)
-        else:
-            # Agency/Franchise admin can see their own bookings AND bookings created by their accountants
-            return queryset.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, super().get_queryset())
 
 
 class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -64,26 +113,10 @@ class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsFranchiseOrAgencyAdmin]
     
     def get_queryset(self):
-        from django.db.models import Q
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return queryset
-        elif user.role == 'accountant':
-            # Accountant can access bookings created by their parent admin AND themselves
-            if user.created_by:
-                return queryset.filter(created_by__in=[user.created_by, user])
-            else:
-                return queryset.filter(created_by=user)
-        else:
-            # Agency/Franchise admin can see their own bookings AND bookings created by their accountants
-            return queryset.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, super().get_queryset())
 
 
-class QuickBookingListCreateView(generics.ListCreateAPIView):
+class QuickBookingListCreateView(TravelPeriodFilterMixin, generics.ListCreateAPIView):
     """
     GET: List all quick bookings
     POST: Create a new quick booking
@@ -91,29 +124,14 @@ class QuickBookingListCreateView(generics.ListCreateAPIView):
     queryset = QuickBooking.objects.all()
     serializer_class = QuickBookingSerializer
     permission_classes = [IsFranchiseOrAgencyAdmin]
+    pagination_class = OptionalCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['preferred_payment', 'is_converted_to_full_booking']
     search_fields = ['booking_number', 'first_name', 'last_name', 'email', 'destination']
-    ordering_fields = ['created_at', 'travel_month', 'budget']
+    ordering_fields = ['created_at', 'travel_period', 'travel_month', 'budget']
     
     def get_queryset(self):
-        from django.db.models import Q
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return queryset
-        elif user.role == 'accountant':
-            # Accountant can see quick bookings created by their parent admin AND themselves
-            if user.created_by:
-                return queryset.filter(created_by__in=[user.created_by, user])
-            else:
-                return queryset.filter(created_by=user)
-        else:
-            # Agency/Franchise admin can see their own quick bookings AND quick bookings created by their accountants
-            return queryset.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, super().get_queryset())
 
 
 class QuickBookingDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -127,23 +145,7 @@ class QuickBookingDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsFranchiseOrAgencyAdmin]
     
     def get_queryset(self):
-        from django.db.models import Q
-        queryset = super().get_queryset()
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return queryset
-        elif user.role == 'accountant':
-            # Accountant can access quick bookings created by their parent admin AND themselves
-            if user.created_by:
-                return queryset.filter(created_by__in=[user.created_by, user])
-            else:
-                return queryset.filter(created_by=user)
-        else:
-            # Agency/Franchise admin can see their own quick bookings AND quick bookings created by their accountants
-            return queryset.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, super().get_queryset())
     
     def get_object(self):
         """
@@ -190,32 +192,11 @@ class BookingConfirmView(APIView):
             user = request.user
             
             # Check permissions
-            if user.role == 'superadmin':
-                # Superadmin can confirm any booking
-                pass
-            elif user.role == 'accountant':
-                # Accountant can confirm bookings created by their parent admin OR themselves
-                if user.created_by:
-                    if booking.created_by not in [user.created_by, user]:
-                        return Response(
-                            {'detail': 'You do not have permission to confirm this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    if booking.created_by != user:
-                        return Response(
-                            {'detail': 'You do not have permission to confirm this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-            else:
-                # Agency/Franchise admin can confirm their own bookings AND bookings created by their accountants
-                if booking.created_by != user:
-                    # Check if booking was created by one of their accountants
-                    if not (booking.created_by.created_by == user and booking.created_by.role == 'accountant'):
-                        return Response(
-                            {'detail': 'You do not have permission to confirm this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
+            if not is_accessible(user, booking):
+                return Response(
+                    {'detail': 'You do not have permission to confirm this booking.'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
             
             booking.status = 'confirmed'
             booking.save()
@@ -240,32 +221,11 @@ class BookingCancelView(APIView):
             user = request.user
             
             # Check permissions
-            if user.role == 'superadmin':
-                # Superadmin can cancel any booking
-                pass
-            elif user.role == 'accountant':
-                # Accountant can cancel bookings created by their parent admin OR themselves
-                if user.created_by:
-                    if booking.created_by not in [user.created_by, user]:
-                        return Response(
-                            {'detail': 'You do not have permission to cancel this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    if booking.created_by != user:
-                        return Response(
-                            {'detail': 'You do not have permission to cancel this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-            else:
-                # Agency/Franchise admin can cancel their own bookings AND bookings created by their accountants
-                if booking.created_by != user:
-                    # Check if booking was created by one of their accountants
-                    if not (booking.created_by.created_by == user and booking.created_by.role == 'accountant'):
-                        return Response(
-                            {'detail': 'You do not have permission to cancel this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
+            if not is_accessible(user, booking):
+                return Response(
+                    {'detail': 'You do not have permission to cancel this booking.'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
             
             booking.status = 'cancelled'
             booking.save()
@@ -290,32 +250,11 @@ class BookingReceiptView(APIView):
             user = request.user
             
             # Check permissions
-            if user.role == 'superadmin':
-                # Superadmin can view any booking receipt
-                pass
-            elif user.role == 'accountant':
-                # Accountant can view receipts for bookings created by their parent admin OR themselves
-                if user.created_by:
-                    if booking.created_by not in [user.created_by, user]:
-                        return Response(
-                            {'detail': 'You do not have permission to view this booking receipt.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    if booking.created_by != user:
-                        return Response(
-                            {'detail': 'You do not have permission to view this booking receipt.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-            else:
-                # Agency/Franchise admin can view receipts for their own bookings AND bookings created by their accountants
-                if booking.created_by != user:
-                    # Check if booking was created by one of their accountants
-                    if not (booking.created_by.created_by == user and booking.created_by.role == 'accountant'):
-                        return Response(
-                            {'detail': 'You do not have permission to view this booking receipt.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
+            if not is_accessible(user, booking):
+                return Response(
+                    {'detail': 'You do not have permission to view this booking receipt.'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
             
             # Get company details from the user who created the booking
             company_user = booking.created_by
@@ -388,32 +327,11 @@ class QuickBookingReceiptView(APIView):
             user = request.user
             
             # Check permissions
-            if user.role == 'superadmin':
-                # Superadmin can view any quick booking receipt
-                pass
-            elif user.role == 'accountant':
-                # Accountant can view receipts for quick bookings created by their parent admin OR themselves
-                if user.created_by:
-                    if quick_booking.created_by not in [user.created_by, user]:
-                        return Response(
-                            {'detail': 'You do not have permission to view this quick booking receipt.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    if quick_booking.created_by != user:
-                        return Response(
-                            {'detail': 'You do not have permission to view this quick booking receipt.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-            else:
-                # Agency/Franchise admin can view receipts for their own quick bookings AND quick bookings created by their accountants
-                if quick_booking.created_by != user:
-                    # Check if quick booking was created by one of their accountants
-                    if not (quick_booking.created_by.created_by == user and quick_booking.created_by.role == 'accountant'):
-                        return Response(
-                            {'detail': 'You do not have permission to view this quick booking receipt.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
+            if not is_accessible(user, quick_booking):
+                return Response(
+                    {'detail': 'You do not have permission to view this quick booking receipt.'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
             
             # Get company details
             company_user = quick_booking.created_by
@@ -485,32 +403,11 @@ class ConvertQuickBookingView(APIView):
             user = request.user
             
             # Check permissions
-            if user.role == 'superadmin':
-                # Superadmin can convert any quick booking
-                pass
-            elif user.role == 'accountant':
-                # Accountant can convert quick bookings created by their parent admin OR themselves
-                if user.created_by:
-                    if quick_booking.created_by not in [user.created_by, user]:
-                        return Response(
-                            {'detail': 'You do not have permission to convert this quick booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    if quick_booking.created_by != user:
-                        return Response(
-                            {'detail': 'You do not have permission to convert this quick booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-            else:
-                # Agency/Franchise admin can convert their own quick bookings AND quick bookings created by their accountants
-                if quick_booking.created_by != user:
-                    # Check if quick booking was created by one of their accountants
-                    if not (quick_booking.created_by.created_by == user and quick_booking.created_by.role == 'accountant'):
-                        return Response(
-                            {'detail': 'You do not have permission to convert this quick booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN
-                        )
+            if not is_accessible(user, quick_booking):
+                return Response(
+                    {'detail': 'You do not have permission to convert this quick booking.'}, 
+                    status=status.HTTP_403_FORBIDDEN
+                )
             
             if quick_booking.is_converted_to_full_booking:
                 return Response(
@@ -555,72 +452,259 @@ class ConvertQuickBookingView(APIView):
             )
 
 
-class AllBookingDetailView(generics.ListAPIView):
+class BatchConvertQuickBookingView(APIView):
+    """
+    POST: Convert many quick bookings to full bookings in one transaction
+
+    Rows are validated individually; valid rows are inserted with bulk
+    operations and invalid, missing or already converted rows are reported
+    back per quick booking id without blocking the rest of the batch.
+    """
+    permission_classes = [IsFranchiseOrAgencyAdmin]
+    
+    def post(self, request):
+        serializer = QuickBookingBatchConvertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        defaults = serializer.validated_data['defaults']
+        items = serializer.validated_data['items']
+        
+        results = {}
+        with transaction.atomic():
+            quick_bookings = get_accessible_queryset(
+                request.user,
+                QuickBooking.objects.select_for_update().filter(
+                    id__in=[item['quick_booking_id'] for item in items]
+                )
+            ).in_bulk()
+            
+            pending = []
+            for item in items:
+                quick_booking_id = item['quick_booking_id']
+                quick_booking = quick_bookings.get(quick_booking_id)
+                
+                if quick_booking is None:
+                    results[quick_booking_id] = {
+                        'status': 'not_found',
+                        'detail': 'Quick booking not found or you do not have permission to convert it.'
+                    }
+                    continue
+                if quick_booking.is_converted_to_full_booking:
+                    results[quick_booking_id] = {
+                        'status': 'already_converted',
+                        'booking_id': quick_booking.converted_booking_id
+                    }
+                    continue
+                
+                # Same precedence as ConvertQuickBookingView: quick booking fields win
+                booking_data = {**defaults, **item}
+                booking_data.pop('quick_booking_id')
+                booking_data.update({
+                    'first_name': quick_booking.first_name,
+                    'last_name': quick_booking.last_name,
+                    'email': quick_booking.email,
+                    'mobile_no': quick_booking.mobile,
+                    'travel_month': quick_booking.travel_month,
+                    'total_adults': quick_booking.number_of_travelers,
+                    'total_children': 0,
+                    'total_infants': 0,
+                })
+                
+                booking_serializer = BookingSerializer(data=booking_data, context={'request': request})
+                if not booking_serializer.is_valid():
+                    results[quick_booking_id] = {'status': 'invalid', 'errors': booking_serializer.errors}
+                    continue
+                pending.append((quick_booking, booking_serializer.validated_data))
+            
+            if pending:
+                self.convert(request.user, pending, results)
+        
+        converted_count = sum(1 for result in results.values() if result['status'] == 'converted')
+        return Response({
+            'message': f'{converted_count} quick booking(s) converted successfully',
+            'converted_count': converted_count,
+            'failed_count': len(items) - converted_count,
+            'results': [
+                {'quick_booking_id': item['quick_booking_id'], **results[item['quick_booking_id']]}
+                for item in items
+            ]
+        })
+    
+    def convert(self, user, pending, results):
+        """Create bookings and travelers and mark quick bookings with bulk queries"""
+        bookings = []
+        travelers_by_booking = []
+        for quick_booking, validated_data in pending:
+            validated_data = dict(validated_data)
+            travelers_by_booking.append(validated_data.pop('travelers', []))
+            booking = Booking(created_by=user, **validated_data)
+            booking.calculate_totals()
+            booking.travel_period = parse_travel_month(booking.travel_month)
+            bookings.append(booking)
+        
+        self.assign_booking_numbers(bookings)
+        Booking.objects.bulk_create(bookings)
+        
+        BookingTraveler.objects.bulk_create([
+            BookingTraveler(booking=booking, **traveler_data)
+            for booking, travelers in zip(bookings, travelers_by_booking)
+            for traveler_data in travelers
+        ])
+        
+        now = timezone.now()
+        converted = []
+        for (quick_booking, _), booking in zip(pending, bookings):
+            quick_booking.is_converted_to_full_booking = True
+            quick_booking.converted_booking = booking
+            quick_booking.updated_at = now
+            converted.append(quick_booking)
+            results[quick_booking.id] = {
+                'status': 'converted',
+                'booking_id': booking.id,
+                'booking_number': booking.booking_number
+            }
+        QuickBooking.objects.bulk_update(
+            converted, ['is_converted_to_full_booking', 'converted_booking', 'updated_at']
+        )
+    
+    @staticmethod
+    def assign_booking_numbers(bookings):
+        """Give every booking a number unique within the batch and the table"""
+        numbers = set()
+        unassigned = list(bookings)
+        while unassigned:
+            candidates = {}
+            for booking in unassigned:
+                number = Booking.generate_booking_number()
+                if number not in numbers and number not in candidates:
+                    candidates[number] = booking
+            taken = set(
+                Booking.objects.filter(booking_number__in=candidates).values_list('booking_number', flat=True)
+            )
+            for number, booking in candidates.items():
+                if number not in taken:
+                    booking.booking_number = number
+                    numbers.add(number)
+            unassigned = [booking for booking in unassigned if not booking.booking_number]
+
+
+class BookingRepriceView(APIView):
+    """
+    POST: Recompute totals for the selected bookings in the database.
+    Optional prices and discount overwrite the stored ones first.
+    With dry_run the per-booking deltas are returned and nothing is saved.
+    """
+    permission_classes = [IsSuperAdmin]
+
+    def post(self, request):
+        serializer = BookingRepriceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        queryset = repricing_queryset(**{
+            field: data.get(field) for field in BookingRepriceSerializer.FILTER_FIELDS
+        })
+        prices = {field: data[field] for field in PRICE_FIELDS if field in data}
+        result = reprice_bookings(queryset, dry_run=data['dry_run'], **prices)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class BookingManifestView(APIView):
+    """
+    GET: Traveler manifest and rooming list per departure.
+    Query params: travel_month (required), departure_city, export=json|csv|pdf
+    """
+    permission_classes = [IsFranchiseOrAgencyAdmin]
+
+    def get(self, request):
+        travel_month = request.query_params.get('travel_month')
+        if not travel_month:
+            return Response(
+                {'detail': 'travel_month is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        export = request.query_params.get('export', 'json').lower()
+        if export not in ('json', 'csv', 'pdf'):
+            return Response(
+                {'detail': 'export must be one of json, csv or pdf.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = filter_by_travel_period(
+            get_accessible_queryset(request.user, Booking.objects.all()),
+            {'travel_month': travel_month}
+        )
+        departure_city = request.query_params.get('departure_city')
+        if departure_city:
+            queryset = queryset.filter(departure_city__iexact=departure_city)
+
+        departures = build_manifest(queryset)
+        filename = f"manifest_{travel_month}{'_' + departure_city if departure_city else ''}"
+
+        if export == 'csv':
+            response = HttpResponse(content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+            writer = csv.writer(response)
+            writer.writerow(CSV_HEADER)
+            for departure in departures:
+                writer.writerows(departure.csv_rows())
+            return response
+
+        if export == 'pdf':
+            html_string = render_to_string('booking_manifest.html', {
+                'travel_month': travel_month,
+                'departures': [departure.as_dict() for departure in departures],
+                'generated_at': timezone.now(),
+            })
+            pdf_bytes = HTML(string=html_string, base_url=request.build_absolute_uri('/')).write_pdf()
+            response = HttpResponse(pdf_bytes, content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{filename}.pdf"'
+            response['Content-Length'] = len(pdf_bytes)
+            return response
+
+        return Response({
+            'travel_month': travel_month,
+            'departures': [departure.as_dict() for departure in departures],
+        }, status=status.HTTP_200_OK)
+
+
+class AllBookingDetailView(TravelPeriodFilterMixin, generics.ListAPIView):
     """
     GET: List all bookings created by the logged-in user
     """
     serializer_class = BookingSerializer
     permission_classes = [IsFranchiseOrAgencyAdmin]
+    pagination_class = OptionalCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['status', 'travel_month', 'payment_type']
+    filterset_fields = ['status', 'payment_type']
     search_fields = ['booking_number', 'first_name', 'last_name', 'email']
-    ordering_fields = ['created_at', 'travel_month', 'total_price']
+    ordering_fields = ['created_at', 'travel_period', 'travel_month', 'total_price']
     ordering = ['-created_at']
     
     def get_queryset(self):
         """
         Return bookings based on user role
         """
-        from django.db.models import Q
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return Booking.objects.all()
-        elif user.role == 'accountant':
-            # Accountant sees bookings created by their parent admin AND themselves
-            if user.created_by:
-                return Booking.objects.filter(created_by__in=[user.created_by, user])
-            else:
-                return Booking.objects.filter(created_by=user)
-        else:
-            # Agency/Franchise admin sees their own bookings AND bookings created by their accountants
-            return Booking.objects.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, Booking.objects.all())
 
 
-class AllQuickBookingDetailView(generics.ListAPIView):
+class AllQuickBookingDetailView(TravelPeriodFilterMixin, generics.ListAPIView):
     """
     GET: List all quick bookings created by the logged-in user
     """
     serializer_class = QuickBookingSerializer
     permission_classes = [IsFranchiseOrAgencyAdmin]
+    pagination_class = OptionalCursorPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['preferred_payment', 'is_converted_to_full_booking']
     search_fields = ['booking_number', 'first_name', 'last_name', 'email', 'destination']
-    ordering_fields = ['created_at', 'travel_month', 'budget']
+    ordering_fields = ['created_at', 'travel_period', 'travel_month', 'budget']
     ordering = ['-created_at']
     
     def get_queryset(self):
         """
         Return quick bookings based on user role
         """
-        from django.db.models import Q
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return QuickBooking.objects.all()
-        elif user.role == 'accountant':
-            # Accountant sees quick bookings created by their parent admin AND themselves
-            if user.created_by:
-                return QuickBooking.objects.filter(created_by__in=[user.created_by, user])
-            else:
-                return QuickBooking.objects.filter(created_by=user)
-        else:
-            # Agency/Franchise admin sees their own quick bookings AND quick bookings created by their accountants
-            return QuickBooking.objects.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, QuickBooking.objects.all())
 
 
 class UserBookingDetailView(generics.RetrieveAPIView):
@@ -635,22 +719,7 @@ class UserBookingDetailView(generics.RetrieveAPIView):
         """
         Return bookings based on user role
         """
-        from django.db.models import Q
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return Booking.objects.all()
-        elif user.role == 'accountant':
-            # Accountant can view bookings created by their parent admin AND themselves
-            if user.created_by:
-                return Booking.objects.filter(created_by__in=[user.created_by, user])
-            else:
-                return Booking.objects.filter(created_by=user)
-        else:
-            # Agency/Franchise admin can view their own bookings AND bookings created by their accountants
-            return Booking.objects.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, Booking.objects.all())
     
     def get_object(self):
         """
@@ -676,22 +745,7 @@ class UserQuickBookingDetailView(generics.RetrieveAPIView):
         """
         Return quick bookings based on user role
         """
-        from django.db.models import Q
-        user = self.request.user
-        
-        if user.role == 'superadmin':
-            return QuickBooking.objects.all()
-        elif user.role == 'accountant':
-            # Accountant can view quick bookings created by their parent admin AND themselves
-            if user.created_by:
-                return QuickBooking.objects.filter(created_by__in=[user.created_by, user])
-            else:
-                return QuickBooking.objects.filter(created_by=user)
-        else:
-            # Agency/Franchise admin can view their own quick bookings AND quick bookings created by their accountants
-            return QuickBooking.objects.filter(
-                Q(created_by=user) | Q(created_by__created_by=user, created_by__role='accountant')
-            )
+        return get_accessible_queryset(self.request.user, QuickBooking.objects.all())
     
     def get_object(self):
         """
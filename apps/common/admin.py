@@ -1,3 +1,18 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import ChunkedUpload, StoredBlob
+
+
+@admin.register(ChunkedUpload)
+class ChunkedUploadAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'user', 'purpose', 'status', 'received_bytes', 'total_size', 'created_at')
+    list_filter = ('status', 'purpose')
+    search_fields = ('filename', 'user__username')
+    readonly_fields = ('received_bytes', 'sha256', 'completed_at', 'created_at', 'updated_at')
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('digest', 'size', 'refcount', 'created_at')
+    search_fields = ('digest', 'files__name')
+    readonly_fields = ('digest', 'size', 'refcount', 'created_at')
@@ -3,4 +3,10 @@ from django.apps import AppConfig
 
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'common'
+    name = 'apps.common'
+
+    def ready(self):
+        from .images import connect_variant_signals
+        from .storage import connect_reference_signals
+        connect_variant_signals()
+        connect_reference_signals()
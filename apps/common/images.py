@@ -0,0 +1,277 @@
+import hashlib
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Sent with `instance` and `field_name` once an instance's variants are stored
+image_variants_ready = Signal()
+
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+DERIVATIVES_DIR = 'derivatives'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_VARIANT_WORKERS, thread_name_prefix='image-variants'
+            )
+        return _executor
+
+
+def derivative_dir(digest):
+    return f"{DERIVATIVES_DIR}/{digest[:2]}/{digest}"
+
+
+def manifest_name(digest):
+    return f"{derivative_dir(digest)}/variants.json"
+
+
+def file_digest(field_file):
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel, flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        converted = image.convert('RGBA')
+        background.paste(converted, mask=converted.getchannel('A'))
+        image = background
+    image.save(
+        buffer, image_format,
+        quality=settings.IMAGE_VARIANT_QUALITY[image_format.lower()],
+        optimize=image_format == 'JPEG', progressive=image_format == 'JPEG',
+        method=4 if image_format == 'WEBP' else 0,
+    )
+    return buffer.getvalue()
+
+
+def render_variants(field_file, digest, storage=default_storage):
+    """
+    Write every size and format of one source image, return the manifest.
+
+    Sizes are the longest edge in pixels from IMAGE_VARIANT_SIZES; an image
+    is never enlarged, so small sources produce fewer sizes. Each size is
+    resized from the previous one, largest first.
+    """
+    field_file.open('rb')
+    try:
+        image = Image.open(field_file)
+        sizes = sorted(settings.IMAGE_VARIANT_SIZES.items(), key=lambda item: item[1], reverse=True)
+        if image.format == 'JPEG':
+            # Let the decoder downscale by a power of two, no smaller than the largest variant
+            image.draft('RGB', (sizes[0][1], sizes[0][1]))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+        image.load()
+    finally:
+        field_file.close()
+
+    # Sizes at or above the source collapse into the smallest of them, kept at source size
+    longest_edge = max(image.size)
+    covering = [size for size in sizes if size[1] >= longest_edge]
+    sizes = covering[-1:] + [size for size in sizes if size[1] < longest_edge]
+
+    manifest = {'hash': digest, 'sizes': {}}
+    for name, edge in sizes:
+        if edge < max(image.size):
+            scale = edge / max(image.size)
+            image = image.resize(
+                (max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS
+            )
+        entry = {'width': image.width, 'height': image.height}
+        for extension, image_format in VARIANT_FORMATS.items():
+            path = f"{derivative_dir(digest)}/{name}.{extension}"
+            if storage.exists(path):
+                storage.delete(path)
+            entry[extension] = storage.save(path, ContentFile(encode(image, image_format)))
+        manifest['sizes'][name] = entry
+
+    path = manifest_name(digest)
+    if storage.exists(path):
+        storage.delete(path)
+    storage.save(path, ContentFile(json.dumps(manifest).encode('utf-8')))
+    return manifest
+
+
+def load_manifest(digest, storage=default_storage):
+    path = manifest_name(digest)
+    if not storage.exists(path):
+        return None
+    with storage.open(path, 'rb') as manifest_file:
+        return json.loads(manifest_file.read())
+
+
+def build_variants(instance, field_name):
+    """
+    Store variants for instance.<field_name> in its variants field.
+
+    Derivatives live under the source's content hash, so a source that was
+    seen before (the same photo uploaded twice, or a re-save) reuses them.
+    Returns the stored dict, or None when the source changed meanwhile.
+    """
+    model = type(instance)
+    variants_field = model.image_variant_fields[field_name]
+    field_file = getattr(instance, field_name)
+    previous = getattr(instance, variants_field) or {}
+
+    if not field_file:
+        variants = {}
+    else:
+        try:
+            digest = file_digest(field_file)
+            manifest = load_manifest(digest) or render_variants(field_file, digest)
+            variants = {**manifest, 'source': field_file.name}
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            logger.warning("Could not build variants for %s %s.%s", model.__name__, instance.pk, field_name, exc_info=True)
+            # Remember the failure so the same source is not retried on every save
+            variants = {'source': field_file.name, 'sizes': {}}
+
+    # Only if the source is still the one we rendered
+    if field_file.name:
+        unchanged = Q(**{field_name: field_file.name})
+    else:
+        unchanged = Q(**{field_name: ''}) | Q(**{f'{field_name}__isnull': True})
+    # Touch auto_now fields as save() would, caches keyed on updated_at must see the change
+    changes = {
+        field.attname: timezone.now() for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)
+    }
+    changes[variants_field] = variants
+    updated = model._default_manager.filter(unchanged, pk=instance.pk).update(**changes)
+    if not updated:
+        return None
+
+    for name, value in changes.items():
+        setattr(instance, name, value)
+    if previous.get('hash') and previous['hash'] != variants.get('hash'):
+        delete_unused_variants(previous['hash'])
+    image_variants_ready.send(sender=model, instance=instance, field_name=field_name)
+    return variants
+
+
+def rebuild_variants(model_label, pk, field_name):
+    try:
+        instance = apps.get_model(model_label)._default_manager.filter(pk=pk).first()
+        if instance is not None:
+            build_variants(instance, field_name)
+    except Exception:
+        logger.exception("Building variants for %s %s.%s failed", model_label, pk, field_name)
+
+
+def rebuild_variants_in_worker(model_label, pk, field_name):
+    try:
+        rebuild_variants(model_label, pk, field_name)
+    finally:
+        # Worker threads hold their own connection, release it like a request would
+        close_old_connections()
+
+
+def schedule_variants(instance, field_name):
+    """Build variants after the surrounding transaction commits, off the request thread"""
+    model_label = instance._meta.label
+    pk = instance.pk
+
+    def submit():
+        if settings.IMAGE_VARIANTS_ASYNC:
+            get_executor().submit(rebuild_variants_in_worker, model_label, pk, field_name)
+        else:
+            rebuild_variants(model_label, pk, field_name)
+
+    transaction.on_commit(submit)
+
+
+def variant_models():
+    return [model for model in apps.get_models() if getattr(model, 'image_variant_fields', None)]
+
+
+def delete_unused_variants(digest, storage=default_storage):
+    """Remove the derivatives of a content hash no instance refers to anymore"""
+    for model in variant_models():
+        for variants_field in model.image_variant_fields.values():
+            if model._default_manager.filter(**{f'{variants_field}__hash': digest}).exists():
+                return False
+
+    manifest = load_manifest(digest, storage)
+    if manifest:
+        for entry in manifest['sizes'].values():
+            for extension in VARIANT_FORMATS:
+                if entry.get(extension):
+                    storage.delete(entry[extension])
+        storage.delete(manifest_name(digest))
+    return True
+
+
+def queue_variants(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    for field_name, variants_field in sender.image_variant_fields.items():
+        field_file = getattr(instance, field_name)
+        variants = getattr(instance, variants_field) or {}
+        if (field_file.name or None) != variants.get('source'):
+            schedule_variants(instance, field_name)
+
+
+def drop_variants(sender, instance, **kwargs):
+    for variants_field in sender.image_variant_fields.values():
+        digest = (getattr(instance, variants_field) or {}).get('hash')
+        if digest:
+            transaction.on_commit(lambda digest=digest: delete_unused_variants(digest))
+
+
+def connect_variant_signals():
+    """Hook every model declaring `image_variant_fields` = {image field: JSON variants field}"""
+    for model in variant_models():
+        post_save.connect(queue_variants, sender=model, dispatch_uid=f'image-variants-save-{model._meta.label}')
+        post_delete.connect(drop_variants, sender=model, dispatch_uid=f'image-variants-delete-{model._meta.label}')
+
+
+def variant_srcset(variants, source_name, build_url):
+    """
+    srcset strings per format plus per-size URLs, or None until variants exist.
+
+    `build_url` turns a storage URL into the URL to publish (absolute, CDN...).
+    """
+    if not variants or not variants.get('sizes') or variants.get('source') != source_name:
+        return None
+    sizes = sorted(variants['sizes'].items(), key=lambda item: item[1]['width'])
+    result = {'sizes': {}}
+    for extension in VARIANT_FORMATS:
+        result[extension] = ', '.join(
+            f"{build_url(default_storage.url(entry[extension]))} {entry['width']}w" for _, entry in sizes
+        )
+    for name, entry in sizes:
+        result['sizes'][name] = {
+            'width': entry['width'],
+            'height': entry['height'],
+            **{extension: build_url(default_storage.url(entry[extension])) for extension in VARIANT_FORMATS},
+        }
+    return result
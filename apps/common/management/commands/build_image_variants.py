@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.files.storage import default_storage
+
+from apps.common.images import build_variants, file_digest, manifest_name, variant_models
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP/JPEG variants for images that do not have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', dest='models', action='append',
+                            help="Only this model, as app_label.ModelName; may be repeated")
+        parser.add_argument('--force', action='store_true', help="Render variants again even if they exist")
+
+    def handle(self, *args, **options):
+        models = variant_models()
+        if options['models']:
+            labels = {model._meta.label_lower: model for model in models}
+            try:
+                models = [labels[label.lower()] for label in options['models']]
+            except KeyError as error:
+                raise CommandError(f"{error.args[0]} has no image variants. Choose from: {', '.join(sorted(labels))}")
+
+        for model in models:
+            built = 0
+            for field_name, variants_field in model.image_variant_fields.items():
+                with_image = model._default_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                # Materialized, rows are updated as we go
+                for instance in list(with_image):
+                    variants = getattr(instance, variants_field) or {}
+                    if not options['force'] and variants.get('source') == getattr(instance, field_name).name:
+                        continue
+                    if options['force']:
+                        try:
+                            default_storage.delete(manifest_name(file_digest(getattr(instance, field_name))))
+                        except OSError:
+                            pass  # missing source, build_variants records it
+                    if build_variants(instance, field_name) is not None:
+                        built += 1
+            self.stdout.write(f"{model._meta.label}: built variants for {built} image(s)")
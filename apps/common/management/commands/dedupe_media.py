@@ -0,0 +1,134 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from apps.common.images import DERIVATIVES_DIR
+from apps.common.models import StoredBlob, StoredFile
+from apps.common.storage import ContentAddressedStorage, path_digest, referenced_names, release_unreferenced
+
+
+class Command(BaseCommand):
+    help = (
+        "Replace duplicate files under MEDIA_ROOT with links to one stored copy, "
+        "or with --recount check the stored references against the disk and the file fields."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be freed")
+        parser.add_argument('--recount', action='store_true',
+                            help="Drop references to names no longer on disk, delete names no row refers to, "
+                                 "recount and remove unused blobs")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not apps.common.storage.ContentAddressedStorage.")
+        if options['recount']:
+            self.recount(options['dry_run'])
+        else:
+            self.dedupe(options['dry_run'])
+
+    def media_names(self):
+        root = str(settings.MEDIA_ROOT)
+        blob_root = os.path.realpath(settings.MEDIA_BLOB_ROOT)
+        for directory, subdirectories, files in os.walk(root):
+            if os.path.realpath(directory).startswith(blob_root):
+                subdirectories[:] = []
+                continue
+            for filename in files:
+                path = os.path.join(directory, filename)
+                if os.path.isfile(path) and not os.path.islink(path):
+                    yield os.path.relpath(path, root).replace(os.sep, '/')
+
+    def dedupe(self, dry_run):
+        stored = set(StoredFile.objects.values_list('name', flat=True))
+        known = set(StoredBlob.objects.values_list('digest', flat=True))
+        scanned = scanned_bytes = freed = linked = 0
+        for name in self.media_names():
+            if name in stored:
+                continue
+            scanned += 1
+            scanned_bytes += os.path.getsize(default_storage.path(name))
+            if dry_run:
+                digest = path_digest(default_storage.path(name))
+                if digest in known:
+                    freed += os.path.getsize(default_storage.path(name))
+                    linked += 1
+                known.add(digest)
+                continue
+            try:
+                bytes_freed = default_storage.adopt(name)
+            except OSError as error:
+                self.stderr.write(f"Skipped {name}: {error}")
+                continue
+            freed += bytes_freed
+            linked += bool(bytes_freed)
+
+        verb = "would free" if dry_run else "freed"
+        self.stdout.write(
+            f"Scanned {scanned} file(s), {scanned_bytes / 2**20:.1f} MB; {linked} duplicate(s) "
+            f"{verb} {freed / 2**20:.1f} MB"
+        )
+
+    def unreferenced(self, cutoff):
+        """
+        Stored names no file field refers to, saved before cutoff.
+
+        Newer names may still be on their way into a row; image derivatives
+        are tracked by apps.common.images instead.
+        """
+        referenced = referenced_names()
+        stored = (
+            StoredFile.objects.filter(created_at__lt=cutoff)
+            .exclude(name__startswith=f'{DERIVATIVES_DIR}/')
+            .values_list('name', flat=True)
+        )
+        return [name for name in stored.iterator() if name not in referenced]
+
+    def recount(self, dry_run):
+        cutoff = timezone.now() - timedelta(days=1)
+        missing = [
+            stored.pk for stored in StoredFile.objects.only('pk', 'name').iterator()
+            if not default_storage.exists(stored.name)
+        ]
+        unreferenced = self.unreferenced(cutoff)
+        unused = StoredBlob.objects.annotate(references=Count('files')).filter(references=0)
+        if dry_run:
+            self.stdout.write(
+                f"{len(missing)} reference(s) to missing files, {len(unreferenced)} unreferenced name(s), "
+                f"{unused.count()} unused blob(s)"
+            )
+            return
+
+        StoredFile.objects.filter(pk__in=missing).delete()
+        released = sum(release_unreferenced(name) for name in unreferenced)
+        with transaction.atomic():
+            # Locked without the aggregate: PostgreSQL refuses FOR UPDATE with GROUP BY
+            blobs = list(StoredBlob.objects.select_for_update().order_by('pk'))
+            references = dict(
+                StoredFile.objects.order_by().values('blob').annotate(count=Count('pk')).values_list('blob', 'count')
+            )
+            for blob in blobs:
+                count = references.get(blob.pk, 0)
+                if count != blob.refcount:
+                    blob.refcount = count
+                    if count:
+                        blob.save(update_fields=['refcount'])
+                if not blob.refcount:
+                    default_storage.release(blob, count=0)
+
+        # Leftovers of saves that were interrupted
+        incoming = os.path.join(str(settings.MEDIA_BLOB_ROOT), 'incoming')
+        for filename in os.listdir(incoming) if os.path.isdir(incoming) else []:
+            path = os.path.join(incoming, filename)
+            if os.path.getmtime(path) < cutoff.timestamp():
+                os.remove(path)
+        self.stdout.write(
+            f"Dropped {len(missing)} reference(s) to missing files, deleted {released} unreferenced name(s); "
+            f"{StoredBlob.objects.count()} blob(s) with {StoredFile.objects.count()} reference(s) remain"
+        )
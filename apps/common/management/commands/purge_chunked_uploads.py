@@ -0,0 +1,31 @@
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.common.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = "Delete the temporary data of chunked uploads that stalled or were aborted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=None,
+                            help="Idle time before an upload expires (default CHUNKED_UPLOAD_EXPIRY_HOURS)")
+
+    def handle(self, *args, **options):
+        hours = options['hours'] if options['hours'] is not None else settings.CHUNKED_UPLOAD_EXPIRY_HOURS
+        stale = ChunkedUpload.objects.filter(
+            # 'completing' this long means the process completing it died
+            status__in=['uploading', 'completing', 'aborted'], updated_at__lt=timezone.now() - timedelta(hours=hours)
+        )
+        purged = 0
+        for upload in stale.iterator():
+            if os.path.exists(upload.part_path):
+                os.remove(upload.part_path)
+            purged += 1
+        # Completed uploads are kept: their stored file may be in use elsewhere
+        stale.delete()
+        self.stdout.write(f"Purged {purged} chunked upload(s) idle for over {hours} hours")
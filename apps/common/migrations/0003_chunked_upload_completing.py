@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0002_stored_blobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chunkedupload',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('completing', 'Completing'), ('complete', 'Complete'), ('aborted', 'Aborted')], default='uploading', max_length=20),
+        ),
+    ]
@@ -1,3 +1,81 @@
+import os
+import uuid
+
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from .mixins import TimestampMixin
+
+
+class ChunkedUpload(TimestampMixin):
+    """
+    A file sent in Content-Range chunks, resumable from `received_bytes`.
+
+    Chunks are written into a temporary .part file under
+    CHUNKED_UPLOAD_TEMP_DIR; on completion the file is moved into storage
+    under the upload_to of its purpose (CHUNKED_UPLOAD_PURPOSES).
+    """
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('completing', 'Completing'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chunked_uploads')
+    purpose = models.CharField(max_length=50)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    total_size = models.PositiveBigIntegerField()
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    file = models.FileField(max_length=255, blank=True, null=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'updated_at'])]
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def part_path(self):
+        return os.path.join(str(settings.CHUNKED_UPLOAD_TEMP_DIR), f"{self.pk}.part")
+
+    @property
+    def purpose_settings(self):
+        return settings.CHUNKED_UPLOAD_PURPOSES[self.purpose]
+
+
+class StoredBlob(models.Model):
+    """
+    One distinct file content kept by ContentAddressedStorage.
+
+    The bytes live once under MEDIA_BLOB_ROOT; every stored name with this
+    content is a hard link to them. refcount is the number of StoredFile
+    names, the blob is removed when it drops to zero.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.refcount} refs)"
+
+    @property
+    def path(self):
+        return os.path.join(str(settings.MEDIA_BLOB_ROOT), self.digest[:2], self.digest)
+
+
+class StoredFile(models.Model):
+    """A media name, as file fields store it, linked to its StoredBlob"""
+    name = models.CharField(max_length=255, unique=True)
+    blob = models.ForeignKey(StoredBlob, on_delete=models.PROTECT, related_name='files')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
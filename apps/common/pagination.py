@@ -1,6 +1,95 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id).
+
+    Each page is fetched with a `created_at` range predicate instead of an
+    OFFSET scan, so deep pages cost the same as the first one. The total is
+    a cached count that may lag behind inserts by `count_cache_timeout`.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_cache_timeout = 60
+
+    def get_ordering(self, request, queryset, view):
+        # Ignore ?ordering= from OrderingFilter, keyset pages need a fixed order
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # A view that maintains its own total sets `pagination_count`
+        known_count = getattr(view, 'pagination_count', None)
+        self.count = known_count if known_count is not None else self.get_cached_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_cached_count(self, queryset):
+        """Return queryset.count(), cached per distinct SQL statement"""
+        try:
+            sql = str(queryset.order_by().query)
+        except EmptyResultSet:
+            return 0
+
+        cache_key = 'pagination:count:%s' % hashlib.md5(sql.encode('utf-8')).hexdigest()
+        count = cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.count_cache_timeout)
+        return count
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'count_is_approximate': True,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {'type': 'integer', 'example': 123}
+        response_schema['properties']['count_is_approximate'] = {'type': 'boolean'}
+        return response_schema
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page number pagination by default, keyset pagination on request.
+
+    Existing clients keep receiving ?page=N responses. Clients that send
+    ?pagination=cursor (or follow a `next` link carrying ?cursor=) are
+    served by `CreatedAtCursorPagination` instead.
+    """
+    cursor_pagination_class = CreatedAtCursorPagination
+    mode_query_param = 'pagination'
+
+    def use_cursor(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor' or
+            self.cursor_pagination_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.use_cursor(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
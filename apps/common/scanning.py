@@ -0,0 +1,74 @@
+import socket
+import struct
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+SCAN_BLOCK_SIZE = 64 * 1024
+
+# Leading bytes of the file types uploads are checked against
+FILE_SIGNATURES = [
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (8, b'WEBP', 'image/webp'),
+]
+
+
+class ScanRejected(Exception):
+    """Raised by a scan hook to refuse a file; the message is shown to the uploader"""
+
+
+def sniff_content_type(header):
+    """Content type from a file's leading 16 bytes, None if it is none of FILE_SIGNATURES"""
+    for offset, signature, content_type in FILE_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            if content_type == 'image/webp' and not header.startswith(b'RIFF'):
+                continue
+            return content_type
+    return None
+
+
+def scan_file(field_file):
+    """
+    Run every UPLOAD_SCAN_HOOKS callable on a stored file.
+
+    A hook takes the FieldFile and raises ScanRejected to refuse it; any
+    other exception means the scan could not run and should be retried.
+    """
+    for path in settings.UPLOAD_SCAN_HOOKS:
+        import_string(path)(field_file)
+
+
+def clamd_scan(field_file):
+    """Scan hook streaming the file to clamd (INSTREAM) at CLAMD_ADDRESS, 'host:port' or a socket path"""
+    address = settings.CLAMD_ADDRESS
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        connection = socket.create_connection((host, int(port)), timeout=settings.CLAMD_TIMEOUT)
+    else:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(settings.CLAMD_TIMEOUT)
+        connection.connect(address)
+
+    with connection:
+        connection.sendall(b'zINSTREAM\0')
+        field_file.open('rb')
+        try:
+            for block in iter(lambda: field_file.read(SCAN_BLOCK_SIZE), b''):
+                connection.sendall(struct.pack('!L', len(block)) + block)
+        finally:
+            field_file.close()
+        connection.sendall(struct.pack('!L', 0))
+        reply = b''
+        while not reply.endswith(b'\0'):
+            data = connection.recv(4096)
+            if not data:
+                break
+            reply += data
+
+    result = reply.rstrip(b'\0').decode('utf-8', 'replace')
+    if result.endswith('FOUND'):
+        raise ScanRejected(f"Rejected by the virus scanner: {result.split(':', 1)[-1].strip()[:-len('FOUND')].strip()}")
+    if not result.endswith('OK'):
+        raise OSError(f"clamd answered {result!r}")
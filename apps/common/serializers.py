@@ -0,0 +1,83 @@
+import mimetypes
+
+from django.conf import settings
+from rest_framework import serializers
+
+from .images import variant_srcset
+from .models import ChunkedUpload
+from .streaming import stream_path
+
+
+class ImageSrcsetField(serializers.Field):
+    """
+    Read-only srcset map for an image field with background-built variants.
+
+    Renders {'webp': srcset, 'jpeg': srcset, 'sizes': {name: {...}}}, or
+    None while the variants of the current image are not ready yet.
+    """
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        field_file = getattr(instance, self.image_field)
+        variants = getattr(instance, type(instance).image_variant_fields[self.image_field])
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request is not None else (lambda url: url)
+        return variant_srcset(variants, field_file.name or None, build_url)
+
+
+class StreamURLField(serializers.Field):
+    """Read-only absolute URL streaming a file field with Range support, see streaming.stream_path"""
+    def __init__(self, file_field, **kwargs):
+        self.file_field = file_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        path = stream_path(instance, self.file_field)
+        request = self.context.get('request')
+        if path is None or request is None:
+            return path
+        return request.build_absolute_uri(path)
+
+
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    file_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChunkedUpload
+        fields = [
+            'id', 'purpose', 'filename', 'content_type', 'total_size', 'received_bytes',
+            'status', 'sha256', 'file_url', 'created_at', 'completed_at'
+        ]
+        read_only_fields = ['received_bytes', 'status', 'sha256', 'created_at', 'completed_at']
+
+    def get_file_url(self, obj):
+        if not obj.file:
+            return None
+        request = self.context.get('request')
+        return request.build_absolute_uri(obj.file.url) if request else obj.file.url
+
+    def validate_purpose(self, value):
+        if value not in settings.CHUNKED_UPLOAD_PURPOSES:
+            raise serializers.ValidationError(
+                f"Choose one of: {', '.join(sorted(settings.CHUNKED_UPLOAD_PURPOSES))}."
+            )
+        return value
+
+    def validate(self, attrs):
+        purpose = settings.CHUNKED_UPLOAD_PURPOSES[attrs['purpose']]
+        if attrs['total_size'] > purpose['max_size']:
+            raise serializers.ValidationError({'total_size': f"Files may be at most {purpose['max_size']} bytes."})
+        content_type = attrs['content_type'].split(';')[0].strip().lower()
+        if content_type not in purpose['content_types']:
+            raise serializers.ValidationError({'content_type': f"Allowed types: {', '.join(purpose['content_types'])}."})
+        guessed = mimetypes.guess_type(attrs['filename'])[0]
+        if guessed and guessed not in purpose['content_types']:
+            raise serializers.ValidationError({'filename': "The file extension does not match an allowed type."})
+        attrs['content_type'] = content_type
+        return attrs
@@ -0,0 +1,311 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_delete, post_save, pre_save
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODES = set('wax+')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that keeps each distinct content once.
+
+    Saving hashes the content while it is streamed into MEDIA_BLOB_ROOT,
+    then hard-links the blob at the requested name, so names, URLs and
+    everything that reads MEDIA_ROOT behave as before. StoredFile maps each
+    linked name to its StoredBlob; deleting a name drops a reference and the
+    blob goes with the last one. Names are deleted once no file field refers
+    to them anymore (connect_reference_signals). Where hard links are not possible (another
+    filesystem, too many links) the file is copied and stored as usual.
+    """
+
+    def blob_root(self):
+        return str(settings.MEDIA_BLOB_ROOT)
+
+    def _receive(self, content):
+        """Stream content into a temporary file beside the blobs, return (digest, size, path)"""
+        incoming = os.path.join(self.blob_root(), 'incoming')
+        os.makedirs(incoming, exist_ok=True)
+        path = os.path.join(incoming, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'wb') as temporary:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                digest.update(chunk)
+                temporary.write(chunk)
+                size += len(chunk)
+        return digest.hexdigest(), size, path
+
+    def _claim_blob(self, digest, size, incoming):
+        """The locked StoredBlob for digest, its file in place, created from incoming if new"""
+        from .models import StoredBlob
+
+        blob, _ = StoredBlob.objects.select_for_update().get_or_create(digest=digest, defaults={'size': size})
+        if not os.path.exists(blob.path):
+            os.makedirs(os.path.dirname(blob.path), exist_ok=True)
+            os.replace(incoming, blob.path)
+            if self.file_permissions_mode is not None:
+                os.chmod(blob.path, self.file_permissions_mode)
+        return blob
+
+    def _link(self, source, name):
+        """Hard-link source at name, or the next available name; return the name used"""
+        while True:
+            full_path = self.path(name)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            try:
+                os.link(source, full_path)
+                return name
+            except FileExistsError:
+                name = self.get_available_name(name)
+
+    def _save(self, name, content):
+        from .models import StoredBlob, StoredFile
+
+        digest, size, incoming = self._receive(content)
+        try:
+            with transaction.atomic():
+                blob = self._claim_blob(digest, size, incoming)
+                try:
+                    name = self._link(blob.path, name)
+                except OSError as error:
+                    logger.warning("Storing %s without deduplication: %s", name, error)
+                    with open(blob.path, 'rb') as blob_file:
+                        name = super()._save(name, File(blob_file))
+                    if not blob.refcount:
+                        self.release(blob, count=0)
+                    return name
+                try:
+                    StoredFile.objects.create(name=name, blob=blob)
+                    StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+                except Exception:
+                    os.remove(self.path(name))
+                    raise
+        finally:
+            if os.path.exists(incoming):
+                os.remove(incoming)
+        return name
+
+    def delete(self, name):
+        from .models import StoredBlob, StoredFile
+
+        remove = super().delete
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                remove(name)
+                return
+            stored.delete()
+            blob = StoredBlob.objects.select_for_update().get(pk=stored.blob_id)
+            self.release(blob)
+            # A rollback brings the reference back, so the link must still be there
+            transaction.on_commit(lambda: remove(name))
+
+    def release(self, blob, count=1):
+        """Drop count references to a locked blob, removing it with the last one"""
+        blob.refcount = max(blob.refcount - count, 0)
+        if blob.refcount:
+            blob.save(update_fields=['refcount'])
+            return
+        blob.delete()
+        transaction.on_commit(lambda: remove_blob_file(blob.path))
+
+    def _open(self, name, mode='rb'):
+        if WRITE_MODES & set(mode):
+            # Writing through a link would change every name sharing the blob
+            self.detach(name)
+        return super()._open(name, mode)
+
+    def detach(self, name):
+        """Give name its own copy of the bytes and drop its blob reference"""
+        from .models import StoredBlob, StoredFile
+
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                return
+            full_path = self.path(name)
+            copy = f"{full_path}.{uuid.uuid4().hex}"
+            shutil.copy2(full_path, copy)
+            os.replace(copy, full_path)
+            stored.delete()
+            self.release(StoredBlob.objects.select_for_update().get(pk=stored.blob_id))
+
+    def adopt(self, name):
+        """
+        Deduplicate a file already in MEDIA_ROOT, return the bytes it freed.
+
+        A new content becomes a blob by linking the existing file, so nothing
+        is copied; a known one replaces the file with a link to the blob.
+        """
+        from .models import StoredBlob, StoredFile
+
+        full_path = self.path(name)
+        digest = path_digest(full_path)
+        size = os.path.getsize(full_path)
+        with transaction.atomic():
+            blob, _ = StoredBlob.objects.select_for_update().get_or_create(
+                digest=digest, defaults={'size': size}
+            )
+            freed = 0
+            if not os.path.exists(blob.path):
+                os.makedirs(os.path.dirname(blob.path), exist_ok=True)
+                os.link(full_path, blob.path)
+            elif not os.path.samefile(full_path, blob.path):
+                replacement = f"{full_path}.{uuid.uuid4().hex}"
+                os.link(blob.path, replacement)
+                os.replace(replacement, full_path)
+                freed = size
+            StoredFile.objects.create(name=name, blob=blob)
+            StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+        return freed
+
+
+def path_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def remove_blob_file(path):
+    if os.path.exists(path):
+        os.remove(path)
+    try:
+        os.rmdir(os.path.dirname(path))
+    except OSError:
+        # Other blobs share the directory
+        pass
+
+
+@lru_cache(maxsize=None)
+def reference_fields(model):
+    """
+    (file fields, name list fields) of a model that refer to stored names.
+
+    File fields count when they use ContentAddressedStorage; a model lists
+    JSON fields holding lists of storage names in `stored_name_fields`.
+    """
+    file_fields = tuple(
+        field.attname for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+    )
+    return file_fields, tuple(getattr(model, 'stored_name_fields', ()))
+
+
+def referencing_models():
+    return [model for model in apps.get_models() if any(reference_fields(model))]
+
+
+def instance_names(values, file_fields, list_fields):
+    """Stored names in a row's field values (an instance's __dict__), leaving deferred fields out"""
+    names = set()
+    for attname in file_fields:
+        if attname in values:
+            names.add(getattr(values[attname], 'name', values[attname]))
+    for attname in list_fields:
+        names.update(values.get(attname) or ())
+    names.discard(None)
+    names.discard('')
+    return names
+
+
+def referenced_names():
+    """Every stored name some row refers to"""
+    names = set()
+    for model in referencing_models():
+        file_fields, list_fields = reference_fields(model)
+        for row in model._base_manager.values_list(*file_fields, *list_fields).iterator():
+            names.update(row[:len(file_fields)])
+            for value in row[len(file_fields):]:
+                names.update(value or ())
+    names.discard(None)
+    names.discard('')
+    return names
+
+
+def is_referenced(name):
+    for model in referencing_models():
+        file_fields, list_fields = reference_fields(model)
+        query = Q()
+        for attname in file_fields:
+            query |= Q(**{attname: name})
+        for attname in list_fields:
+            query |= Q(**{f'{attname}__icontains': json.dumps(name)})
+        if model._base_manager.filter(query).exists():
+            return True
+    return False
+
+
+def release_unreferenced(name, storage=default_storage):
+    """Delete a stored name no row refers to anymore, return whether it was deleted"""
+    from .models import StoredFile
+
+    if not StoredFile.objects.filter(name=name).exists() or is_referenced(name):
+        return False
+    storage.delete(name)
+    return True
+
+
+def remember_names(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Before an existing row is saved, note the names it holds in the database"""
+    instance.__dict__.pop('_stored_names', None)
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    fields = [
+        attname for attname in sum(reference_fields(sender), ())
+        if update_fields is None or attname in update_fields
+    ]
+    if fields:
+        row = sender._base_manager.filter(pk=instance.pk).values(*fields).first() or {}
+        instance._stored_names = instance_names(row, *reference_fields(sender))
+
+
+def release_replaced_names(sender, instance, raw=False, **kwargs):
+    previous = instance.__dict__.pop('_stored_names', None)
+    if raw or not previous:
+        return
+    for name in previous - instance_names(instance.__dict__, *reference_fields(sender)):
+        transaction.on_commit(lambda name=name: release_unreferenced(name))
+
+
+def release_deleted_names(sender, instance, **kwargs):
+    for name in instance_names(instance.__dict__, *reference_fields(sender)):
+        transaction.on_commit(lambda name=name: release_unreferenced(name))
+
+
+def connect_reference_signals():
+    """
+    Release stored names when the rows referring to them replace or drop them.
+
+    Django leaves a replaced or deleted row's files in storage; with
+    ContentAddressedStorage the name is deleted after commit unless another
+    row still refers to it, e.g. a visa document attached from a chunked
+    upload. Saving an existing row whose saved fields include one of them
+    costs one SELECT by primary key for the names it held before; loading
+    rows costs nothing. Queryset .update() sends no signals;
+    `dedupe_media --recount` releases what it leaves behind.
+    """
+    if not isinstance(default_storage, ContentAddressedStorage):
+        return
+    for model in referencing_models():
+        label = model._meta.label
+        pre_save.connect(remember_names, sender=model, dispatch_uid=f'stored-names-presave-{label}')
+        post_save.connect(release_replaced_names, sender=model, dispatch_uid=f'stored-names-save-{label}')
+        post_delete.connect(release_deleted_names, sender=model, dispatch_uid=f'stored-names-delete-{label}')
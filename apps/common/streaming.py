@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import mimetypes
+import re
+import time
+import zipfile
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import http_date, quote_etag
+
+logger = logging.getLogger(__name__)
+
+STREAM_SALT = 'apps.common.streaming'
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+def stream_path(instance, field_name):
+    """
+    URL path that streams instance.<field_name> with Range support, or None.
+
+    The path carries a signed token naming the instance, field and file, so
+    it needs no credentials (a <video> tag cannot send any) and stops
+    working once the file is replaced. The model must list the field in
+    `streamable_fields`.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return None
+    token = signing.dumps(
+        [instance._meta.label_lower, instance.pk, field_name, field_file.name], salt=STREAM_SALT, compress=True
+    )
+    return reverse('media_stream', args=[token])
+
+
+def resolve_stream_token(token):
+    try:
+        label, pk, field_name, name = signing.loads(token, salt=STREAM_SALT)
+        model = apps.get_model(label)
+    except (signing.BadSignature, ValueError, LookupError):
+        raise Http404("Unknown media")
+    if field_name not in getattr(model, 'streamable_fields', ()):
+        raise Http404("Unknown media")
+    instance = model._default_manager.filter(pk=pk).first()
+    field_file = getattr(instance, field_name, None) if instance is not None else None
+    if not field_file or field_file.name != name:
+        raise Http404("Media was replaced or removed")
+    return field_file
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) for a single 'bytes=' range, None to send everything.
+
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    Raises ValueError for a range that does not overlap the file.
+    """
+    match = BYTE_RANGE.match((header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range outside the file")
+    return start, end
+
+
+def iter_file(field_file, start, end):
+    field_file.open('rb')
+    try:
+        field_file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = field_file.read(min(STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+    finally:
+        field_file.close()
+
+
+def ranged_file_response(request, field_file, content_type=None):
+    """Serve a stored file with ETag, conditional GET and single byte ranges"""
+    size = field_file.size
+    etag = quote_etag(hashlib.md5(f"{field_file.name}:{size}".encode('utf-8')).hexdigest())
+    content_type = content_type or mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+
+    if request.META.get('HTTP_IF_NONE_MATCH') in (etag, f'W/{etag}', '*'):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None or if_range == etag:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(iter_file(field_file, start, end), content_type=content_type)
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1 if size else 0)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    try:
+        response['Last-Modified'] = http_date(field_file.storage.get_modified_time(field_file.name).timestamp())
+    except (NotImplementedError, OSError):
+        pass
+    # The URL names the exact file, so it never changes underneath a client
+    response['Cache-Control'] = f'public, max-age={settings.MEDIA_STREAM_MAX_AGE}'
+    return response
+
+
+class ZipSink:
+    """Write-only file zipfile builds the archive into; iter_zip hands on what it collects"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        chunks, self.chunks = self.chunks, []
+        return chunks
+
+
+def iter_zip(entries):
+    """
+    Yield a ZIP archive of (arcname, field_file) entries while it is built.
+
+    Entries are stored, not compressed: the files are PDFs and images that
+    would not shrink. Memory holds one block of one file at a time, so it
+    does not grow with the archive. Files that cannot be read are left out
+    and listed in a MISSING.txt entry at the end.
+    """
+    sink = ZipSink()
+    missing = []
+    date_time = time.localtime()[:6]
+    # zipfile finds the sink unseekable and writes sizes after each entry
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for arcname, field_file in entries:
+            try:
+                size = field_file.size
+                field_file.open('rb')
+            except OSError as error:
+                logger.warning("Leaving %s out of an archive: %s", field_file.name, error)
+                missing.append(arcname)
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=date_time)
+            info.file_size = size
+            info.external_attr = 0o644 << 16
+            try:
+                with archive.open(info, 'w') as entry:
+                    for block in iter(lambda: field_file.read(STREAM_BLOCK_SIZE), b''):
+                        entry.write(block)
+                        yield from sink.drain()
+            finally:
+                field_file.close()
+            yield from sink.drain()
+        if missing:
+            archive.writestr(zipfile.ZipInfo('MISSING.txt', date_time=date_time), '\n'.join(missing) + '\n')
+    yield from sink.drain()
+
+
+def zip_response(entries, filename):
+    """Stream iter_zip(entries) as a download named filename"""
+    response = StreamingHttpResponse(iter_zip(entries), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
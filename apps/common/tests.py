@@ -1,3 +1,438 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.enquiries.bundle import media_srcset
+from apps.enquiries.models import GalleryImage, HomePage
+from apps.users.models import User
+from .images import derivative_dir, manifest_name
+from .models import ChunkedUpload, StoredBlob, StoredFile
+from .scanning import sniff_content_type
+from .streaming import parse_range, stream_path
+from .uploads import ChunkError, parse_content_range
+
+
+class TemporaryMediaMixin:
+    """Media, blobs and upload parts under a temporary directory for each test"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(directory, 'media'), MEDIA_BLOB_ROOT=os.path.join(directory, 'blobs'),
+            CHUNKED_UPLOAD_TEMP_DIR=os.path.join(directory, 'parts'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+
+class ContentAddressedStorageTests(TemporaryMediaMixin, TestCase):
+
+    def upload(self, name, content):
+        upload = ChunkedUpload.objects.create(
+            user=self.user, purpose='visa_document', filename=name, content_type='application/pdf',
+            total_size=len(content), received_bytes=len(content), status='complete',
+        )
+        upload.file.save(name, ContentFile(content))
+        return upload
+
+    def test_equal_content_is_stored_once(self):
+        first = default_storage.save('docs/a.pdf', ContentFile(b'%PDF-same'))
+        second = default_storage.save('docs/b.pdf', ContentFile(b'%PDF-same'))
+        other = default_storage.save('docs/c.pdf', ContentFile(b'%PDF-other'))
+
+        self.assertTrue(os.path.samefile(default_storage.path(first), default_storage.path(second)))
+        self.assertFalse(os.path.samefile(default_storage.path(first), default_storage.path(other)))
+        blob = StoredFile.objects.get(name=first).blob
+        self.assertEqual(blob.refcount, 2)
+        self.assertEqual(StoredFile.objects.get(name=second).blob, blob)
+        self.assertEqual(StoredBlob.objects.count(), 2)
+        with default_storage.open(second) as stored:
+            self.assertEqual(stored.read(), b'%PDF-same')
+
+    def test_blob_goes_with_the_last_name(self):
+        first = default_storage.save('docs/a.pdf', ContentFile(b'%PDF-same'))
+        second = default_storage.save('docs/b.pdf', ContentFile(b'%PDF-same'))
+        blob = StoredFile.objects.get(name=first).blob
+
+        with self.captureOnCommitCallbacks(execute=True):
+            default_storage.delete(first)
+        blob.refresh_from_db()
+        self.assertEqual(blob.refcount, 1)
+        self.assertFalse(default_storage.exists(first))
+        self.assertTrue(os.path.exists(blob.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            default_storage.delete(second)
+        self.assertFalse(StoredBlob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(os.path.exists(blob.path))
+
+    def test_delete_rolled_back_keeps_the_file(self):
+        name = default_storage.save('docs/a.pdf', ContentFile(b'%PDF-same'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    default_storage.delete(name)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).blob.refcount, 1)
+        with default_storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'%PDF-same')
+
+    def test_writing_a_name_detaches_it_from_the_blob(self):
+        first = default_storage.save('docs/a.pdf', ContentFile(b'%PDF-same'))
+        second = default_storage.save('docs/b.pdf', ContentFile(b'%PDF-same'))
+
+        with default_storage.open(second, 'wb') as stored:
+            stored.write(b'%PDF-changed')
+
+        with default_storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'%PDF-same')
+        self.assertFalse(StoredFile.objects.filter(name=second).exists())
+        self.assertEqual(StoredFile.objects.get(name=first).blob.refcount, 1)
+
+    def test_replaced_and_deleted_field_values_are_released(self):
+        upload = self.upload('a.pdf', b'%PDF-first')
+        first = upload.file.name
+        copy = self.upload('b.pdf', b'%PDF-first')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upload.file.save('c.pdf', ContentFile(b'%PDF-second'))
+        self.assertFalse(default_storage.exists(first))
+        self.assertEqual(StoredFile.objects.get(name=copy.file.name).blob.refcount, 1)
+
+        second = upload.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            ChunkedUpload.objects.get(pk=upload.pk).delete()
+        self.assertFalse(default_storage.exists(second))
+        self.assertFalse(StoredFile.objects.filter(name=second).exists())
+        self.assertTrue(default_storage.exists(copy.file.name))
+
+    def test_saves_read_the_previous_names_only_when_they_can_change(self):
+        upload = self.upload('a.pdf', b'%PDF-first')
+        upload = ChunkedUpload.objects.get(pk=upload.pk)
+        with self.assertNumQueries(1):
+            upload.save(update_fields=['status'])
+        # The names held before, then the UPDATE
+        with self.assertNumQueries(2):
+            upload.save()
+
+    def test_name_shared_by_rows_survives_until_the_last_one(self):
+        upload = self.upload('a.pdf', b'%PDF-shared')
+        other = ChunkedUpload.objects.create(
+            user=self.user, purpose='visa_document', filename='a.pdf', content_type='application/pdf',
+            total_size=11, received_bytes=11, status='complete', file=upload.file.name,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            upload.delete()
+        self.assertTrue(default_storage.exists(other.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(default_storage.exists(other.file.name))
+
+    def test_recount(self):
+        kept = self.upload('a.pdf', b'%PDF-kept').file.name
+        orphan = default_storage.save('docs/orphan.pdf', ContentFile(b'%PDF-kept'))
+        missing = default_storage.save('docs/missing.pdf', ContentFile(b'%PDF-missing'))
+        recent = default_storage.save('docs/recent.pdf', ContentFile(b'%PDF-recent'))
+        os.remove(default_storage.path(missing))
+        StoredFile.objects.exclude(name=recent).update(created_at=timezone.now() - timedelta(days=2))
+        StoredBlob.objects.update(refcount=7)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_media', recount=True, stdout=io.StringIO())
+
+        self.assertEqual(set(StoredFile.objects.values_list('name', flat=True)), {kept, recent})
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertEqual(list(StoredBlob.objects.order_by('pk').values_list('refcount', flat=True)), [1, 1])
+
+
+class ChunkedUploadTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, content, filename='scan.pdf'):
+        response = self.client.post('/api/common/uploads/', {
+            'purpose': 'visa_document', 'filename': filename, 'content_type': 'application/pdf',
+            'total_size': len(content),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def put(self, upload_id, content, start, end, total, sha256=None):
+        headers = {'HTTP_CONTENT_RANGE': f'bytes {start}-{end}/{total}'}
+        if sha256:
+            headers['HTTP_X_CHUNK_SHA256'] = sha256
+        return self.client.generic(
+            'PUT', f'/api/common/uploads/{upload_id}/', content, content_type='application/octet-stream', **headers
+        )
+
+    def test_parse_content_range(self):
+        self.assertEqual(parse_content_range('bytes 0-9/20', 20), (0, 9))
+        self.assertEqual(parse_content_range('bytes 19-19/20', 20), (19, 19))
+        for header, total, status in (
+            (None, 20, 400), ('bytes 0-9', 20, 400), ('bytes=0-9/20', 20, 400), ('bytes 0-9/21', 20, 400),
+            ('bytes 9-0/20', 20, 416), ('bytes 10-20/20', 20, 416),
+        ):
+            with self.assertRaises(ChunkError) as raised:
+                parse_content_range(header, total)
+            self.assertEqual(raised.exception.status, status, header)
+        with override_settings(CHUNKED_UPLOAD_MAX_CHUNK_SIZE=5):
+            with self.assertRaises(ChunkError) as raised:
+                parse_content_range('bytes 0-5/20', 20)
+            self.assertEqual(raised.exception.status, 413)
+
+    def test_resends_are_accepted_and_gaps_refused(self):
+        content = b'%PDF-' + bytes(range(15))
+        upload_id = self.start(content)
+
+        self.assertEqual(self.put(upload_id, content[:8], 0, 7, 20).data['received_bytes'], 8)
+        # A lost response: the same chunk again
+        response = self.put(upload_id, content[:8], 0, 7, 20)
+        self.assertEqual((response.status_code, response.data['received_bytes']), (200, 8))
+        response = self.put(upload_id, content[12:], 12, 19, 20)
+        self.assertEqual((response.status_code, response.data['received_bytes']), (409, 8))
+        # Overlapping what was received is fine
+        response = self.put(upload_id, content[4:], 4, 19, 20)
+        self.assertEqual(response.data, {'received_bytes': 20, 'complete': True})
+
+        response = self.client.post(
+            f'/api/common/uploads/{upload_id}/complete/', {'sha256': hashlib.sha256(content).hexdigest()},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.status, 'complete')
+        with upload.file.open('rb') as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertFalse(os.path.exists(upload.part_path))
+        # Completing again answers with the same upload
+        self.assertEqual(self.client.post(f'/api/common/uploads/{upload_id}/complete/').status_code, 200)
+
+    def test_corrupted_chunk_is_refused(self):
+        content = b'%PDF-' + bytes(range(15))
+        upload_id = self.start(content)
+
+        response = self.put(upload_id, content[:10], 0, 9, 20, sha256=hashlib.sha256(b'other').hexdigest())
+        self.assertEqual((response.status_code, response.data['received_bytes']), (422, 0))
+        response = self.put(upload_id, content[:10], 0, 9, 20, sha256=hashlib.sha256(content[:10]).hexdigest())
+        self.assertEqual((response.status_code, response.data['received_bytes']), (200, 10))
+
+    def test_incomplete_or_mismatched_upload_is_not_stored(self):
+        content = b'%PDF-' + bytes(range(15))
+        upload_id = self.start(content)
+        self.put(upload_id, content[:10], 0, 9, 20)
+        self.assertEqual(self.client.post(f'/api/common/uploads/{upload_id}/complete/').status_code, 409)
+
+        self.put(upload_id, content[10:], 10, 19, 20)
+        response = self.client.post(
+            f'/api/common/uploads/{upload_id}/complete/', {'sha256': '0' * 64}, format='json'
+        )
+        self.assertEqual(response.status_code, 422)
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.status, 'uploading')
+        self.assertFalse(upload.file)
+        self.assertTrue(os.path.exists(upload.part_path))
+
+    def test_upload_being_completed_is_claimed(self):
+        content = b'%PDF-' + bytes(range(15))
+        upload_id = self.start(content)
+        self.put(upload_id, content, 0, 19, 20)
+        ChunkedUpload.objects.filter(pk=upload_id).update(status='completing')
+
+        self.assertEqual(self.client.post(f'/api/common/uploads/{upload_id}/complete/').status_code, 409)
+        self.assertEqual(self.client.delete(f'/api/common/uploads/{upload_id}/').status_code, 409)
+        self.assertTrue(os.path.exists(ChunkedUpload.objects.get(pk=upload_id).part_path))
+
+
+class RangedStreamTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(100))
+        self.home_page = HomePage.objects.create(user=self.user, content='Welcome')
+        self.home_page.background_video.save('intro.mp4', ContentFile(self.content))
+        self.path = stream_path(self.home_page, 'background_video')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-500', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+        for header in (None, '', 'bytes=-', 'bytes=0-1,5-9', 'items=0-9'):
+            self.assertIsNone(parse_range(header, 100), header)
+        for header in ('bytes=-0', 'bytes=100-', 'bytes=9-2'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
+    def test_ranges(self):
+        response = self.client.get(self.path)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        etag = response['ETag']
+
+        response = self.client.get(self.path, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.path, HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, response['Content-Length']), (206, '5'))
+        self.assertEqual(b''.join(response.streaming_content), self.content[95:])
+
+        response = self.client.get(self.path, HTTP_RANGE='bytes=100-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */100'))
+
+        self.assertEqual(self.client.get(self.path, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag).status_code, 206)
+        # A stale If-Range gets the whole, current file
+        self.assertEqual(self.client.get(self.path, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"').status_code, 200)
+        self.assertEqual(self.client.get(self.path, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.head(self.path)['Content-Length'], '100')
+
+    def test_token_stops_working_once_the_file_is_replaced(self):
+        self.home_page.background_video.save('outro.mp4', ContentFile(b'new'))
+        self.assertEqual(self.client.get(self.path).status_code, 404)
+        self.assertEqual(self.client.get(stream_path(self.home_page, 'background_video')).status_code, 200)
+        self.assertEqual(self.client.get(self.path[:-5] + 'x/').status_code, 404)
+
+
+class ScanningTests(SimpleTestCase):
+
+    def test_sniff_content_type(self):
+        self.assertEqual(sniff_content_type(b'%PDF-1.7\n%\xe2\xe3'), 'application/pdf')
+        self.assertEqual(sniff_content_type(b'\xff\xd8\xff\xe0\x00\x10JFIF'), 'image/jpeg')
+        self.assertEqual(sniff_content_type(b'\x89PNG\r\n\x1a\n\x00\x00'), 'image/png')
+        self.assertEqual(sniff_content_type(b'RIFF\x24\x00\x00\x00WEBPVP8 '), 'image/webp')
+        # WEBP at offset 8 but not a RIFF container
+        self.assertIsNone(sniff_content_type(b'ABCD\x24\x00\x00\x00WEBPVP8 '))
+        self.assertIsNone(sniff_content_type(b'MZ\x90\x00'))
+        self.assertIsNone(sniff_content_type(b'<html>%PDF-'))
+        self.assertIsNone(sniff_content_type(b''))
+
+
+def image_bytes(size, image_format='JPEG', mode='RGB', exif=None):
+    image = Image.new(mode, size, (200, 30, 30, 0) if mode == 'RGBA' else 'red')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **({'exif': exif.tobytes()} if exif else {}))
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_VARIANTS_ASYNC=False)
+class ImageVariantTests(TemporaryMediaMixin, TestCase):
+
+    def gallery_image(self, content, name='photo.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = GalleryImage.objects.create(user=self.user, image=ContentFile(content, name=name))
+        image.refresh_from_db()
+        return image
+
+    def variant_sizes(self, image):
+        sizes = {}
+        for name, entry in image.image_variants['sizes'].items():
+            for extension in ('webp', 'jpeg'):
+                with default_storage.open(entry[extension], 'rb') as variant:
+                    decoded = Image.open(variant)
+                    self.assertEqual(decoded.format, extension.upper())
+                    self.assertEqual(decoded.size, (entry['width'], entry['height']))
+            sizes[name] = (entry['width'], entry['height'])
+        return sizes
+
+    def test_sizes_follow_the_longest_edge(self):
+        image = self.gallery_image(image_bytes((2000, 1000)))
+        self.assertEqual(image.image_variants['source'], image.image.name)
+        self.assertEqual(
+            self.variant_sizes(image), {'thumb': (320, 160), 'medium': (800, 400), 'large': (1600, 800)}
+        )
+        self.assertTrue(image.image_variants['sizes']['thumb']['webp'].startswith(
+            derivative_dir(image.image_variants['hash'])
+        ))
+
+    def test_small_sources_are_not_enlarged(self):
+        # The sizes above the source collapse into one at the source size
+        image = self.gallery_image(image_bytes((500, 250)))
+        self.assertEqual(self.variant_sizes(image), {'thumb': (320, 160), 'medium': (500, 250)})
+        image = self.gallery_image(image_bytes((100, 300)))
+        self.assertEqual(self.variant_sizes(image), {'thumb': (100, 300)})
+
+    def test_exif_orientation_and_transparency(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        image = self.gallery_image(image_bytes((400, 200), exif=exif))
+        self.assertEqual(self.variant_sizes(image), {'thumb': (160, 320), 'medium': (200, 400)})
+
+        image = self.gallery_image(image_bytes((64, 64), 'PNG', 'RGBA'), name='logo.png')
+        entry = image.image_variants['sizes']['thumb']
+        with default_storage.open(entry['webp'], 'rb') as variant:
+            self.assertEqual(Image.open(variant).mode, 'RGBA')
+        with default_storage.open(entry['jpeg'], 'rb') as variant:
+            # Flattened onto white
+            self.assertEqual(Image.open(variant).convert('RGB').getpixel((32, 32)), (255, 255, 255))
+
+    def test_srcset(self):
+        image = self.gallery_image(image_bytes((2000, 1000)))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        srcset = client.get(f'/api/enquiries/admin/gallery/{image.pk}/').data['image_srcset']
+
+        sizes = image.image_variants['sizes']
+        self.assertEqual(srcset['webp'], ', '.join(
+            f"http://testserver{default_storage.url(sizes[name]['webp'])} {width}w"
+            for name, width in [('thumb', 320), ('medium', 800), ('large', 1600)]
+        ))
+        self.assertEqual(srcset['jpeg'].count('w, '), 2)
+        self.assertEqual(srcset['sizes']['medium']['height'], 400)
+        self.assertEqual(
+            srcset['sizes']['large']['jpeg'], f"http://testserver{default_storage.url(sizes['large']['jpeg'])}"
+        )
+        with self.settings(PUBLIC_MEDIA_BASE_URL='https://cdn.example.com'):
+            self.assertTrue(media_srcset(image, 'image')['webp'].startswith('https://cdn.example.com/media/'))
+
+        # Variants of a replaced image are not published for the new one
+        image.image.name = 'gallery/other.jpg'
+        self.assertIsNone(media_srcset(image, 'image'))
+
+    def test_same_content_is_rendered_once_and_kept_while_used(self):
+        content = image_bytes((900, 600))
+        first = self.gallery_image(content)
+        with mock.patch('apps.common.images.render_variants') as render:
+            second = self.gallery_image(content, name='copy.jpg')
+        render.assert_not_called()
+        self.assertEqual(second.image_variants['sizes'], first.image_variants['sizes'])
+
+        digest = first.image_variants['hash']
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(default_storage.exists(manifest_name(digest)))
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(manifest_name(digest)))
+        self.assertFalse(default_storage.exists(first.image_variants['sizes']['thumb']['webp']))
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import F
+from django.utils import timezone
+from django.utils.text import get_valid_filename
+
+from .models import ChunkedUpload
+
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+COPY_BUFFER_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """A chunk that cannot be accepted; `status` is the HTTP status to answer with"""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_content_range(header, total_size):
+    """Return (start, end) from 'bytes start-end/total', end inclusive"""
+    match = CONTENT_RANGE.match(header or '')
+    if not match:
+        raise ChunkError("Content-Range must look like 'bytes start-end/total'.")
+    start, end, total = (int(value) for value in match.groups())
+    if total != total_size:
+        raise ChunkError(f"Content-Range total {total} does not match the upload size {total_size}.")
+    if start > end or end >= total:
+        raise ChunkError("Content-Range is outside the upload.", status=416)
+    if end - start + 1 > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise ChunkError(f"Chunks may be at most {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes.", status=413)
+    return start, end
+
+
+def write_chunk(upload, stream, start, end, expected_sha256=None):
+    """
+    Copy bytes start..end from `stream` into the upload's part file.
+
+    A chunk may start anywhere up to `received_bytes`, so a client that
+    lost a response can resend the last chunk. With `expected_sha256` (hex)
+    a corrupted chunk is refused and does not count as received; the next
+    chunk overwrites it. Returns the updated upload.
+    """
+    if upload.status != 'uploading':
+        raise ChunkError(f"The upload is {upload.status}.", status=409)
+    received = upload.received_bytes
+    if start > received:
+        raise ChunkError(f"Expected a chunk starting at byte {received}.", status=409)
+    if end < received:
+        return upload  # a chunk we already have
+
+    os.makedirs(os.path.dirname(upload.part_path), exist_ok=True)
+    digest = hashlib.sha256()
+    fd = os.open(upload.part_path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        os.lseek(fd, start, os.SEEK_SET)
+        remaining = end - start + 1
+        while remaining:
+            block = stream.read(min(COPY_BUFFER_SIZE, remaining))
+            if not block:
+                raise ChunkError("The request body is shorter than its Content-Range.")
+            os.write(fd, block)
+            digest.update(block)
+            remaining -= len(block)
+        if stream.read(1):
+            raise ChunkError("The request body is longer than its Content-Range.")
+    finally:
+        os.close(fd)
+    if expected_sha256 and expected_sha256.strip().lower() != digest.hexdigest():
+        raise ChunkError("The chunk does not match its X-Chunk-SHA256, send it again.", status=422)
+
+    # Advance only from the offset we started at; a concurrent request may have won
+    ChunkedUpload.objects.filter(pk=upload.pk, received_bytes=received).update(
+        received_bytes=end + 1, updated_at=timezone.now()
+    )
+    upload.refresh_from_db()
+    if upload.received_bytes < end + 1:
+        raise ChunkError(f"Expected a chunk starting at byte {upload.received_bytes}.", status=409)
+    return upload
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part_file:
+        for block in iter(lambda: part_file.read(COPY_BUFFER_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(upload, expected_sha256=None):
+    """
+    Move a fully received upload into storage, return it with `file` set.
+
+    The upload is claimed first by switching it to 'completing' with a
+    conditional UPDATE, so two completion requests cannot both store the
+    file and no row lock is held while it is hashed and copied. A failed
+    check hands it back as 'uploading'.
+    """
+    claimed = ChunkedUpload.objects.filter(
+        pk=upload.pk, status='uploading', received_bytes=F('total_size')
+    ).update(status='completing', updated_at=timezone.now())
+    upload.refresh_from_db()
+    if not claimed:
+        if upload.status == 'complete':
+            return upload
+        if upload.status != 'uploading':
+            raise ChunkError(f"The upload is {upload.status}.", status=409)
+        raise ChunkError(
+            f"Received {upload.received_bytes} of {upload.total_size} bytes.", status=409
+        )
+
+    try:
+        sha256 = file_sha256(upload.part_path)
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise ChunkError("The assembled file does not match the given sha256.", status=422)
+
+        name = os.path.join(upload.purpose_settings['upload_to'], get_valid_filename(upload.filename))
+        with open(upload.part_path, 'rb') as part_file:
+            stored_name = default_storage.save(name, File(part_file, name=upload.filename))
+    except BaseException:
+        ChunkedUpload.objects.filter(pk=upload.pk, status='completing').update(
+            status='uploading', updated_at=timezone.now()
+        )
+        upload.status = 'uploading'
+        raise
+    os.remove(upload.part_path)
+
+    upload.file.name = stored_name
+    upload.sha256 = sha256
+    upload.status = 'complete'
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=['file', 'sha256', 'status', 'completed_at', 'updated_at'])
+    return upload
+
+
+def abort_upload(upload):
+    """Drop the received bytes of an upload still being sent; one being completed is left alone"""
+    aborted = ChunkedUpload.objects.filter(pk=upload.pk, status='uploading').update(
+        status='aborted', updated_at=timezone.now()
+    )
+    upload.refresh_from_db()
+    if upload.status == 'completing':
+        raise ChunkError("The upload is being completed.", status=409)
+    if (aborted or upload.status == 'aborted') and os.path.exists(upload.part_path):
+        os.remove(upload.part_path)
+    return upload
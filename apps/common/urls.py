@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('uploads/', views.ChunkedUploadCreateView.as_view(), name='chunked_upload_create'),
+    path('uploads/<uuid:pk>/', views.ChunkedUploadDetailView.as_view(), name='chunked_upload_detail'),
+    path('uploads/<uuid:pk>/complete/', views.ChunkedUploadCompleteView.as_view(), name='chunked_upload_complete'),
+    path('stream/<str:token>/', views.MediaStreamView.as_view(), name='media_stream'),
+]
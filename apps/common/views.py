@@ -1,3 +1,92 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404
+from django.views import View
+from rest_framework import generics, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
-# Create your views here.
+from .models import ChunkedUpload
+from .serializers import ChunkedUploadSerializer
+from .streaming import ranged_file_response, resolve_stream_token
+from .uploads import ChunkError, abort_upload, complete_upload, parse_content_range, write_chunk
+
+
+class ChunkedUploadCreateView(generics.ListCreateAPIView):
+    """
+    Start a chunked upload: {purpose, filename, content_type, total_size}.
+    Then PUT the bytes to uploads/<id>/ with Content-Range headers and POST uploads/<id>/complete/.
+    """
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user, status='uploading')
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class ChunkedUploadDetailView(APIView):
+    """
+    GET: progress, resume from `received_bytes`.
+    PUT: one chunk as the raw body, Content-Range: bytes start-end/total,
+         optionally X-Chunk-SHA256: <hex digest of the chunk>.
+    DELETE: abort and drop the received bytes.
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(ChunkedUpload, pk=pk, user=request.user)
+
+    def get(self, request, pk):
+        return Response(ChunkedUploadSerializer(self.get_upload(request, pk), context={'request': request}).data)
+
+    def put(self, request, pk):
+        upload = self.get_upload(request, pk)
+        try:
+            start, end = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), upload.total_size)
+            upload = write_chunk(upload, request.stream, start, end, request.META.get('HTTP_X_CHUNK_SHA256'))
+        except ChunkError as error:
+            upload.refresh_from_db()
+            return Response(
+                {'detail': str(error), 'received_bytes': upload.received_bytes}, status=error.status
+            )
+        return Response({
+            'received_bytes': upload.received_bytes,
+            'complete': upload.received_bytes == upload.total_size,
+        })
+
+    def delete(self, request, pk):
+        upload = self.get_upload(request, pk)
+        try:
+            abort_upload(upload)
+        except ChunkError as error:
+            return Response({'detail': str(error), 'received_bytes': upload.received_bytes}, status=error.status)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChunkedUploadCompleteView(APIView):
+    """Assemble a fully received upload into storage, optionally checking {sha256}"""
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def post(self, request, pk):
+        upload = get_object_or_404(ChunkedUpload, pk=pk, user=request.user)
+        try:
+            upload = complete_upload(upload, request.data.get('sha256'))
+        except ChunkError as error:
+            return Response({'detail': str(error), 'received_bytes': upload.received_bytes}, status=error.status)
+        return Response(ChunkedUploadSerializer(upload, context={'request': request}).data)
+
+
+class MediaStreamView(View):
+    """Public GET/HEAD with byte ranges for a signed stream URL, see streaming.stream_path"""
+    def get(self, request, token):
+        return ranged_file_response(request, resolve_stream_token(token))
+
+    def head(self, request, token):
+        return self.get(request, token)
@@ -1,5 +1,6 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from apps.common.pagination import OptionalCursorPagination
 from .models import Lead, LeadNote
 from .serializers import LeadSerializer, LeadUpdateStatusSerializer
 
@@ -9,6 +10,7 @@ class LeadListCreateView(generics.ListCreateAPIView):
     """
     serializer_class = LeadSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OptionalCursorPagination
 
     def get_queryset(self):
         queryset = Lead.objects.filter(user=self.request.user)
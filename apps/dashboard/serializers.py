@@ -53,7 +53,9 @@ class APIKeySerializer(serializers.ModelSerializer):
     
     def get_enquiry_count(self, obj):
         """Get count of enquiries received through this API key"""
-        return obj.contactus_set.count()
+        if hasattr(obj, 'enquiry_count'):
+            return obj.enquiry_count
+        return obj.contact_submissions.count()
 
     def create(self, validated_data):
         """Create API key for the current user"""
@@ -8,6 +8,7 @@ urlpatterns = [
     path('stats/', views.dashboard_stats, name='dashboard-stats'),
     path('chart-data/', views.chart_data, name='chart-data'),
     path('booking-revenue/', views.booking_revenue_chart, name='booking-revenue-chart'),
+    path('upcoming-departures/', views.upcoming_departures, name='upcoming-departures'),
     path('enquiry-distribution/', views.enquiry_distribution, name='enquiry-distribution'),
     path('recent-activities/', views.recent_activities, name='recent-activities'),
     path('summary/', views.dashboard_summary, name='dashboard-summary'),
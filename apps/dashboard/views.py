@@ -66,6 +66,12 @@ def get_enquiry_queryset(user):
             return ContactUs.objects.none()
 
 
+def add_months(month_start, months):
+    """Return the first day of the month `months` after `month_start`"""
+    month_index = month_start.month - 1 + months
+    return month_start.replace(year=month_start.year + month_index // 12, month=month_index % 12 + 1, day=1)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def dashboard_stats(request):
@@ -146,6 +152,14 @@ def dashboard_stats(request):
     ).count()
     today_enquiries = enquiry_qs.filter(created_at__date=today).count()
     
+    # Departures by travel_period (first day of the travel month)
+    current_period = today.replace(day=1)
+    departure_qs = booking_qs.exclude(status='cancelled').filter(travel_period__gte=current_period)
+    departures_this_month = departure_qs.filter(travel_period=current_period).count()
+    departures_next_3_months = departure_qs.filter(
+        travel_period__lt=add_months(current_period, 3)
+    ).count()
+    
     # Format amounts for display
     def format_amount(amount):
         if amount >= 10000000:  # 1 crore
@@ -176,6 +190,10 @@ def dashboard_stats(request):
             'monthly': monthly_enquiries,
             'today': today_enquiries
         },
+        'departures': {
+            'this_month': departures_this_month,
+            'next_3_months': departures_next_3_months
+        },
         'user_role': user.role  # Include user role for frontend logic
     })
 
@@ -360,6 +378,48 @@ def booking_revenue_chart(request):
     return Response(data)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def upcoming_departures(request):
+    """
+    Get booking and traveler counts per travel month, from the current month on
+    Query params: months (default 6, max 24)
+    """
+    user = request.user
+    try:
+        months = min(max(int(request.GET.get('months', 6)), 1), 24)
+    except ValueError:
+        months = 6
+    
+    current_period = timezone.now().date().replace(day=1)
+    end_period = add_months(current_period, months)
+    
+    rows = get_user_specific_queryset(user, Booking).exclude(status='cancelled').filter(
+        travel_period__gte=current_period,
+        travel_period__lt=end_period
+    ).values('travel_period').annotate(
+        bookings=Count('id'),
+        adults=Sum('total_adults'),
+        children=Sum('total_children'),
+        infants=Sum('total_infants')
+    ).order_by('travel_period')
+    by_period = {row['travel_period']: row for row in rows}
+    
+    data = []
+    for offset in range(months):
+        period = add_months(current_period, offset)
+        row = by_period.get(period, {})
+        travelers = (row.get('adults') or 0) + (row.get('children') or 0) + (row.get('infants') or 0)
+        data.append({
+            'name': f"{calendar.month_abbr[period.month]} {period.year}",
+            'travel_period': period.isoformat(),
+            'bookings': row.get('bookings', 0),
+            'travelers': travelers
+        })
+    
+    return Response(data)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def enquiry_distribution(request):
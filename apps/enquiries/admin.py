@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import APIKey, Package, HomePage, ContactUs, GalleryImage
+from .models import APIKey, Package, HomePage, ContactUs, Contact, GalleryImage, WebhookSubscription, WebhookDelivery
 
 
 @admin.register(APIKey)
@@ -51,7 +51,7 @@ class ContactUsAdmin(admin.ModelAdmin):
             'fields': ('name', 'email', 'phone', 'package_type', 'message')
         }),
         ('API Key Info', {
-            'fields': ('api_key', 'submitted_by_user'),
+            'fields': ('api_key', 'submitted_by_user', 'contact'),
             'classes': ('collapse',)  # Optional: To collapse this section initially
         }),
         ('Date Information', {
@@ -60,9 +60,33 @@ class ContactUsAdmin(admin.ModelAdmin):
         }),
     )
 
+@admin.register(Contact)
+class ContactAdmin(admin.ModelAdmin):
+    list_display = ('name', 'phone', 'email', 'user', 'submissions_count', 'last_seen_at')
+    list_filter = ('user',)
+    search_fields = ('name', 'phone', 'email')
+    readonly_fields = ('submissions_count', 'first_seen_at', 'last_seen_at')
+
 @admin.register(GalleryImage)
 class GalleryImageAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'title', 'is_active', 'created_at')
     list_filter = ('is_active', 'user', 'created_at')
     search_fields = ('title', 'user__username')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(WebhookSubscription)
+class WebhookSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('api_key', 'url', 'is_active', 'last_success_at', 'last_failure_at', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('url', 'api_key__name', 'api_key__user__username')
+    readonly_fields = ('created_at', 'last_success_at', 'last_failure_at')
+
+
+@admin.register(WebhookDelivery)
+class WebhookDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'subscription', 'event', 'status', 'attempts', 'response_status', 'next_attempt_at', 'created_at')
+    list_filter = ('status', 'event')
+    search_fields = ('subscription__url',)
+    readonly_fields = ('payload', 'attempts', 'response_status', 'last_error', 'created_at', 'delivered_at')
+    raw_id_fields = ('subscription', 'contact')
@@ -1,22 +1,140 @@
+import atexit
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from .caching import cache_is_shared
 from .models import APIKey
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
+
+class APIKeyCache:
+    """
+    Active API keys by key string: an in-process LRU in front of the shared cache.
+
+    Entries hold the APIKey with its user already loaded. Local entries live
+    for API_KEY_LOCAL_CACHE_TIMEOUT seconds so a key revoked in another
+    worker stops working within that window; the worker that saves or
+    deletes the key drops it immediately (see signals.py). Without a shared
+    cache the second tier is skipped: another worker could not drop it.
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(key):
+        return 'apikey:auth:%s' % hashlib.sha256(str(key).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, key_obj = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return key_obj
+                del self._entries[key]
+
+        shared = cache_is_shared()
+        key_obj = cache.get(self.cache_key(key)) if shared else None
+        if key_obj is None:
+            try:
+                key_obj = APIKey.objects.select_related('user').get(key=key, is_active=True)
+            except APIKey.DoesNotExist:
+                return None
+            if shared:
+                cache.set(self.cache_key(key), key_obj, settings.API_KEY_CACHE_TIMEOUT)
+
+        with self._lock:
+            self._entries[key] = (now + settings.API_KEY_LOCAL_CACHE_TIMEOUT, key_obj)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return key_obj
+
+    def invalidate(self, key):
+        key = str(key)
+        with self._lock:
+            self._entries.pop(key, None)
+        cache.delete(self.cache_key(key))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LastUsedBuffer:
+    """
+    Collects APIKey.last_used timestamps and writes them with one bulk UPDATE.
+
+    A flush happens on the first request after API_KEY_LAST_USED_FLUSH_INTERVAL
+    seconds and at interpreter exit, so each key is written at most once per
+    interval by a worker instead of on every request.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def touch(self, key_id, when):
+        now = time.monotonic()
+        with self._lock:
+            self._pending[key_id] = when
+            if now - self._last_flush < settings.API_KEY_LAST_USED_FLUSH_INTERVAL:
+                return
+            pending, self._pending = self._pending, {}
+            self._last_flush = now
+        self._write(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        self._write(pending)
+
+    def _write(self, pending):
+        if not pending:
+            return
+        try:
+            APIKey.objects.bulk_update(
+                [APIKey(pk=key_id, last_used=when) for key_id, when in pending.items()],
+                ['last_used']
+            )
+        except DatabaseError:
+            logger.warning("Could not write last_used for %d API key(s), retrying on next flush", len(pending))
+            with self._lock:
+                for key_id, when in pending.items():
+                    self._pending.setdefault(key_id, when)
+
+
+api_key_cache = APIKeyCache()
+last_used_buffer = LastUsedBuffer()
+atexit.register(last_used_buffer.flush)
+
+
 class APIKeyAuthentication(BaseAuthentication):
     def authenticate(self, request):
         api_key = request.META.get('HTTP_X_API_KEY')
-        
+
         if not api_key:
             return None
-        
-        try:
-            key_obj = APIKey.objects.get(key=api_key, is_active=True)
-            # Update last used timestamp
-            key_obj.last_used = timezone.now()
-            key_obj.save(update_fields=['last_used'])
-            return (key_obj.user, key_obj)
-        except APIKey.DoesNotExist:
-            raise AuthenticationFailed('Invalid API key')
 
+        key_obj = api_key_cache.get(api_key)
+        if key_obj is None:
+            raise AuthenticationFailed('Invalid API key')
 
+        # Update last used timestamp, written in bulk by the buffer
+        last_used_buffer.touch(key_obj.pk, timezone.now())
+        return (key_obj.user, key_obj)
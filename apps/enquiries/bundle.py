@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from apps.common.images import variant_srcset
+from apps.common.streaming import stream_path
+
+from .caching import cache_timeout
+from .models import GalleryImage, HomePage, Package, PublicSiteSnapshot
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+
+def bundle_cache_key(owner_id):
+    return 'public-bundle:%s' % owner_id
+
+
+def media_url(field):
+    if not field:
+        return None
+    return f"{settings.PUBLIC_MEDIA_BASE_URL}{field.url}"
+
+
+def media_srcset(instance, field_name):
+    variants = getattr(instance, type(instance).image_variant_fields[field_name])
+    source_name = getattr(instance, field_name).name or None
+    return variant_srcset(variants, source_name, lambda url: f"{settings.PUBLIC_MEDIA_BASE_URL}{url}")
+
+
+def media_stream_url(instance, field_name):
+    path = stream_path(instance, field_name)
+    return f"{settings.PUBLIC_MEDIA_BASE_URL}{path}" if path else None
+
+
+def build_bundle_payload(owner_id):
+    """Everything a partner website renders, as plain JSON-ready data"""
+    packages = [
+        {
+            'id': package.id,
+            'package_type': package.package_type,
+            'title': package.title,
+            'description': package.description,
+            'price': package.price,
+            'currency': package.currency,
+            'image': media_url(package.image),
+            'image_srcset': media_srcset(package, 'image'),
+            'features_list': package.get_features_list(),
+            'duration_days': package.duration_days,
+            'is_featured': package.is_featured,
+            'updated_at': package.updated_at,
+        }
+        for package in Package.objects.filter(user_id=owner_id, is_active=True).order_by('package_type')
+    ]
+
+    homepage = HomePage.objects.filter(user_id=owner_id, is_active=True).order_by('-created_at').first()
+    if homepage:
+        homepage = {
+            'id': homepage.id,
+            'welcome_title': homepage.welcome_title,
+            'welcome_subtitle': homepage.welcome_subtitle,
+            'content': homepage.content,
+            'background_image': media_url(homepage.background_image),
+            'background_image_srcset': media_srcset(homepage, 'background_image'),
+            'background_video': media_url(homepage.background_video),
+            'background_video_stream_url': media_stream_url(homepage, 'background_video'),
+            'updated_at': homepage.updated_at,
+        }
+
+    gallery = [
+        {
+            'id': image.id, 'title': image.title,
+            'image': media_url(image.image), 'image_srcset': media_srcset(image, 'image'),
+        }
+        for image in GalleryImage.objects.filter(user_id=owner_id, is_active=True).order_by('-created_at')
+    ]
+
+    return {
+        'generated_at': timezone.now(),
+        'packages': packages,
+        'homepage': homepage,
+        'gallery': gallery,
+    }
+
+
+def encode_bundle(payload):
+    """Return the snapshot fields: JSON bytes, their etag and compressed copies"""
+    # generated_at is left out of the etag so an unchanged payload keeps its etag
+    stable = json.dumps({**payload, 'generated_at': None}, cls=DjangoJSONEncoder, sort_keys=True)
+    content = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+    return {
+        'etag': hashlib.sha256(stable.encode('utf-8')).hexdigest()[:32],
+        'content': content,
+        'content_gzip': gzip.compress(content, compresslevel=9),
+        'content_br': brotli.compress(content, quality=11) if brotli else None,
+    }
+
+
+def snapshot_entry(snapshot):
+    return {
+        'etag': snapshot.etag,
+        'content': bytes(snapshot.content),
+        'content_gzip': bytes(snapshot.content_gzip),
+        'content_br': bytes(snapshot.content_br) if snapshot.content_br else None,
+    }
+
+
+def rebuild_bundle_snapshot(owner_id):
+    """Rebuild and store the owner's snapshot, then refresh the cache entry"""
+    fields = encode_bundle(build_bundle_payload(owner_id))
+    snapshot, _ = PublicSiteSnapshot.objects.update_or_create(user_id=owner_id, defaults=fields)
+    entry = snapshot_entry(snapshot)
+    cache.set(bundle_cache_key(owner_id), entry, cache_timeout(settings.PUBLIC_BUNDLE_CACHE_TIMEOUT))
+    return entry
+
+
+def refresh_bundle_snapshot(owner_id):
+    """on_commit hook: rebuild unless the owner itself was deleted"""
+    if get_user_model().objects.filter(pk=owner_id).exists():
+        rebuild_bundle_snapshot(owner_id)
+    else:
+        cache.delete(bundle_cache_key(owner_id))
+
+
+def get_bundle(owner_id):
+    """
+    Serve from the cache, then the stored snapshot, building it on first use.
+
+    A rebuild only refreshes the cache of the process that made it, so a
+    per-process cache keeps entries briefly (see caching.cache_timeout)
+    and the other workers soon read the new snapshot.
+    """
+    entry = cache.get(bundle_cache_key(owner_id))
+    if entry is not None:
+        return entry
+
+    snapshot = PublicSiteSnapshot.objects.filter(user_id=owner_id).first()
+    if snapshot is None:
+        return rebuild_bundle_snapshot(owner_id)
+
+    entry = snapshot_entry(snapshot)
+    cache.set(bundle_cache_key(owner_id), entry, cache_timeout(settings.PUBLIC_BUNDLE_CACHE_TIMEOUT))
+    return entry
+
+
+def choose_encoding(accept_encoding, available):
+    """
+    The content coding of `available` (most preferred first) to answer with, None for the plain body.
+
+    Follows the Accept-Encoding weights: a coding with q=0 is refused,
+    '*' stands for codings not listed, and identity wins if the client
+    weights it above every available coding.
+    """
+    weights = {}
+    for item in (accept_encoding or '').split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    chosen, chosen_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > chosen_weight:
+            chosen, chosen_weight = coding, weight
+    if chosen and weights.get('identity', 0.0) > chosen_weight:
+        return None
+    return chosen
@@ -0,0 +1,161 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Count, Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import APIKey, GalleryImage, HomePage, Package
+
+PUBLIC_CONTENT_MODELS = (Package, HomePage, GalleryImage)
+
+
+def cache_is_shared():
+    """Whether all workers see the same cache; LocMemCache (no REDIS_URL) is per process"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def cache_timeout(timeout):
+    """
+    Timeout for an entry other workers invalidate by deleting it.
+
+    Such deletes never reach a per-process cache, so there the entry only
+    lives for LOCAL_CACHE_TIMEOUT seconds at most.
+    """
+    return timeout if cache_is_shared() else min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+
+
+def content_version_key(owner_id):
+    return 'public-content:version:%s' % owner_id
+
+
+def get_content_version(owner_id):
+    """
+    Return (version, last_modified) for everything a user publishes.
+
+    Both come from the newest updated_at and the row count of each public
+    model, so every worker derives the same version from the database.
+    The pair is cached until one of those models changes, or briefly when
+    the cache is per process (see cache_timeout).
+    """
+    key = content_version_key(owner_id)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    parts, last_modified = [], None
+    for model in PUBLIC_CONTENT_MODELS:
+        stats = model.objects.filter(user_id=owner_id).aggregate(latest=Max('updated_at'), total=Count('id'))
+        latest = stats['latest']
+        parts.append(f"{latest.timestamp() if latest else 0}:{stats['total']}")
+        if latest and (last_modified is None or latest > last_modified):
+            last_modified = latest
+
+    version = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    cached = (version, last_modified)
+    cache.set(key, cached, cache_timeout(settings.PUBLIC_CONTENT_VERSION_TIMEOUT))
+    return cached
+
+
+def bump_content_version(owner_id):
+    """Forget the cached version, the next request recomputes it"""
+    cache.delete(content_version_key(owner_id))
+
+
+def contact_totals_keys(user_id):
+    return 'contact-totals:contacts:%s' % user_id, 'contact-totals:api-keys:%s' % user_id
+
+
+def get_contact_totals(user_id):
+    """
+    Return (contacts, api_keys) for a user's API keys.
+
+    Both totals come from one aggregate and stay cached; signals adjust
+    the contact total as submissions are created or deleted, and drop
+    both when a key is added or removed. Those adjustments are made by
+    whichever process saves the submission, e.g. drain_contact_queue, so
+    a per-process cache only keeps the totals briefly (see cache_timeout).
+    """
+    contacts_key, api_keys_key = contact_totals_keys(user_id)
+    cached = cache.get_many([contacts_key, api_keys_key])
+    if len(cached) == 2:
+        return cached[contacts_key], cached[api_keys_key]
+
+    totals = APIKey.objects.filter(user_id=user_id).aggregate(
+        contacts=Count('contact_submissions'), api_keys=Count('id', distinct=True)
+    )
+    cache.set_many(
+        {contacts_key: totals['contacts'], api_keys_key: totals['api_keys']},
+        cache_timeout(settings.CONTACT_TOTALS_CACHE_TIMEOUT)
+    )
+    return totals['contacts'], totals['api_keys']
+
+
+def adjust_contact_total(user_id, delta):
+    """Add delta to the cached contact total, a missing total is recounted on next read"""
+    contacts_key, _ = contact_totals_keys(user_id)
+    try:
+        cache.incr(contacts_key, delta)
+    except ValueError:
+        pass
+
+
+def forget_contact_totals(user_id):
+    cache.delete_many(contact_totals_keys(user_id))
+
+
+class PublicContentCacheMixin:
+    """
+    Versioned response cache for API-key views serving an owner's public content.
+
+    Responses carry an ETag and Last-Modified built from the owner's
+    content version and are answered with 304 on a matching conditional
+    GET. Serialized bodies are cached per version, host and URL, so a
+    change to any Package, HomePage or GalleryImage of the owner starts
+    a fresh set of entries.
+    """
+    cache_max_age = None
+
+    def get(self, request, *args, **kwargs):
+        version, last_modified = get_content_version(request.user.pk)
+        etag = quote_etag(hashlib.md5(
+            f"{version}:{request.get_host()}:{request.get_full_path()}".encode('utf-8')
+        ).hexdigest())
+
+        if self.is_not_modified(request, etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache_key = 'public-content:response:%s:%s' % (request.user.pk, etag.strip('"'))
+            data = cache.get(cache_key)
+            if data is None:
+                response = super().get(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(cache_key, response.data, settings.PUBLIC_CONTENT_VERSION_TIMEOUT)
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        max_age = self.cache_max_age if self.cache_max_age is not None else settings.PUBLIC_CONTENT_MAX_AGE
+        response['Cache-Control'] = f'public, max-age={max_age}'
+        patch_vary_headers(response, ['X-API-Key'])
+        return response
+
+    @staticmethod
+    def is_not_modified(request, etag, last_modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # If-None-Match wins over If-Modified-Since (RFC 9110 13.2.2)
+            candidates = [value.strip() for value in if_none_match.split(',')]
+            return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+        if if_modified_since and last_modified:
+            return int(last_modified.timestamp()) <= if_modified_since
+        return False
@@ -0,0 +1,167 @@
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Contact, ContactUs, normalize_email, normalize_phone
+
+
+class DisjointSet:
+    """Union-find over submission ids, with path halving"""
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent
+        parent.setdefault(item, item)
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            # The lowest id is the root, so clusters come out the same on every run
+            if second < first:
+                first, second = second, first
+            self.parent[second] = first
+
+
+def update_submissions(columns, rows):
+    """
+    UPDATE ContactUs rows from (value, ..., id) tuples with one executemany.
+
+    bulk_update builds a CASE expression per row and field, which is far
+    slower than the update itself on backfills of many rows.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    assignments = ', '.join(f'{quote(column)} = %s' for column in columns)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(ContactUs._meta.db_table)} SET {assignments} WHERE {quote("id")} = %s', rows
+        )
+
+
+@transaction.atomic
+def backfill_identity_hashes(queryset, rehash=False, batch_size=1000):
+    """Fill phone_hash/email_hash, return the number of rows changed"""
+    if not rehash:
+        queryset = queryset.filter(phone_hash__isnull=True, email_hash__isnull=True)
+    queryset = queryset.only('id', 'phone', 'email', 'phone_hash', 'email_hash').order_by('pk')
+    changed, last_pk = 0, 0
+    # Keyset chunks rather than iterator(): the rows are updated while we walk them
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not chunk:
+            return changed
+        batch = []
+        for submission in chunk:
+            hashes = (submission.phone_hash, submission.email_hash)
+            submission.set_identity_hashes()
+            if (submission.phone_hash, submission.email_hash) != hashes:
+                batch.append((submission.phone_hash, submission.email_hash, submission.pk))
+        update_submissions(['phone_hash', 'email_hash'], batch)
+        changed += len(batch)
+        last_pk = chunk[-1].pk
+
+
+def cluster_submissions(queryset, batch_size=1000):
+    """
+    Group submissions of one owner that share a phone, an email or a contact.
+
+    Each identifier is a single pass over rows sorted by (owner, value),
+    so matching rows are adjacent and only neighbours are compared; the
+    passes are joined with union-find. Returns the DisjointSet.
+    """
+    clusters = DisjointSet()
+    owned = queryset.filter(submitted_by_user__isnull=False)
+    for column in ('phone_hash', 'email_hash', 'contact_id'):
+        previous_key, previous_id = None, None
+        rows = owned.filter(**{f'{column}__isnull': False}).order_by(
+            'submitted_by_user_id', column, 'id'
+        ).values_list('id', 'submitted_by_user_id', column)
+        for submission_id, owner_id, value in rows.iterator(chunk_size=batch_size):
+            clusters.find(submission_id)
+            key = (owner_id, value)
+            if key == previous_key:
+                clusters.union(previous_id, submission_id)
+            previous_key, previous_id = key, submission_id
+    return clusters
+
+
+@transaction.atomic
+def merge_clusters(clusters, batch_size=1000):
+    """
+    Give every cluster a single Contact, return a summary dict.
+
+    A cluster keeps its lowest existing Contact; the others are merged
+    into it and deleted. Clusters without one get a Contact built from
+    their earliest submission.
+    """
+    members, contact_ids = {}, {}
+    submission_ids = list(clusters.parent)
+    for start in range(0, len(submission_ids), batch_size):
+        rows = ContactUs.objects.filter(pk__in=submission_ids[start:start + batch_size]).values_list('id', 'contact_id')
+        for submission_id, contact_id in rows:
+            root = clusters.find(submission_id)
+            members.setdefault(root, []).append((submission_id, contact_id))
+            if contact_id is not None:
+                contact_ids.setdefault(root, set()).add(contact_id)
+
+    # Roots are the lowest id of their cluster, so they are its earliest submission
+    orphan_roots = [root for root in members if root not in contact_ids]
+    first_submissions = {}
+    for start in range(0, len(orphan_roots), batch_size):
+        for submission in ContactUs.objects.filter(pk__in=orphan_roots[start:start + batch_size]):
+            first_submissions[submission.pk] = submission
+    new_contacts = {
+        root: Contact(
+            user_id=submission.submitted_by_user_id, name=submission.name,
+            phone=normalize_phone(submission.phone), email=normalize_email(submission.email),
+            first_seen_at=submission.created_at, last_seen_at=submission.created_at,
+        )
+        for root, submission in first_submissions.items()
+    }
+    Contact.objects.bulk_create(new_contacts.values(), batch_size=batch_size)
+
+    merged_contact_ids, touched_contact_ids, relinked = set(), set(), []
+    for root, rows in members.items():
+        if root in new_contacts:
+            contact_id = new_contacts[root].pk
+        else:
+            contact_id = min(contact_ids[root])
+            merged_contact_ids.update(contact_ids[root] - {contact_id})
+        touched_contact_ids.add(contact_id)
+        relinked.extend(
+            (contact_id, submission_id) for submission_id, current in rows if current != contact_id
+        )
+    for start in range(0, len(relinked), batch_size):
+        update_submissions(['contact_id'], relinked[start:start + batch_size])
+
+    merged = list(merged_contact_ids)
+    for start in range(0, len(merged), batch_size):
+        Contact.objects.filter(pk__in=merged[start:start + batch_size]).delete()
+
+    touched = list(touched_contact_ids)
+    for start in range(0, len(touched), batch_size):
+        refresh_contact_stats(Contact.objects.filter(pk__in=touched[start:start + batch_size]))
+
+    return {
+        'clusters': len(members),
+        'submissions': len(clusters.parent),
+        'contacts_created': len(new_contacts),
+        'contacts_merged': len(merged_contact_ids),
+        'submissions_relinked': len(relinked),
+    }
+
+
+def refresh_contact_stats(queryset):
+    """Recount submissions_count, first_seen_at and last_seen_at from the linked submissions"""
+    stats = ContactUs.objects.filter(contact=OuterRef('pk')).order_by().values('contact')
+    queryset.update(
+        submissions_count=Coalesce(Subquery(stats.annotate(total=Count('id')).values('total')), 0),
+        first_seen_at=Coalesce(Subquery(stats.annotate(first=Min('created_at')).values('first')), 'first_seen_at'),
+        last_seen_at=Coalesce(Subquery(stats.annotate(last=Max('created_at')).values('last')), 'last_seen_at'),
+    )
@@ -0,0 +1,179 @@
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Contact, ContactUs, WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+# Sent after each drained batch with `counts`: {(api_key_id, user_id): number of rows}
+# and `contacts`, the ContactUs rows created (replayed records are left out)
+contacts_ingested = Signal()
+
+SPOOL_NAME = 'contacts.spool'
+DRAINING_SUFFIX = '.draining'
+
+
+class ContactSpool:
+    """
+    Append-only file queue of contact submissions, one JSON object per line.
+
+    Writers append under an exclusive flock, so lines from concurrent
+    workers never interleave. The drainer renames the live file away
+    before reading it; a writer that still holds the old inode notices the
+    rename after taking the lock and reopens the new file, so nothing is
+    appended to a file that is already being drained. A writer that finds
+    the file ending mid-line, after a crash during an append, starts a new
+    line first, so the fragment is skipped on its own.
+    """
+    def __init__(self, directory=None, fsync=None):
+        self.directory = str(directory or settings.CONTACT_SPOOL_DIR)
+        self.path = os.path.join(self.directory, SPOOL_NAME)
+        self.fsync = settings.CONTACT_SPOOL_FSYNC if fsync is None else fsync
+        os.makedirs(self.directory, exist_ok=True)
+
+    def append(self, record):
+        line = json.dumps(record, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8') + b'\n'
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                try:
+                    current = os.stat(self.path)
+                except FileNotFoundError:
+                    current = None
+                opened = os.fstat(fd)
+                if current is None or current.st_ino != opened.st_ino:
+                    continue  # rotated while we waited for the lock
+                if opened.st_size and os.pread(fd, 1, opened.st_size - 1) != b'\n':
+                    os.write(fd, b'\n' + line)
+                else:
+                    os.write(fd, line)
+                if self.fsync:
+                    os.fsync(fd)
+                return
+            finally:
+                os.close(fd)
+
+    def rotate(self):
+        """Move the live spool aside for draining, return the new path or None"""
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size == 0:
+                return None
+            target = f"{self.path}.{time.time_ns()}{DRAINING_SUFFIX}"
+            os.rename(self.path, target)
+            return target
+        finally:
+            os.close(fd)
+
+    def pending_files(self):
+        """Rotated files left by earlier drains come first, oldest first"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SPOOL_NAME + '.') and name.endswith(DRAINING_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+
+def enqueue_contact(validated_data, api_key):
+    """Append a validated submission to the spool, return its submission id"""
+    submission_id = uuid.uuid4()
+    ContactSpool().append({
+        'submission_id': submission_id,
+        'api_key_id': api_key.pk if api_key else None,
+        'user_id': api_key.user_id if api_key else None,
+        'created_at': timezone.now(),
+        'data': validated_data,
+    })
+    return submission_id
+
+
+def read_records(path):
+    with open(path, 'rb') as spool_file:
+        for number, line in enumerate(spool_file, start=1):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # A line torn by a crash mid-append
+                logger.warning("Skipping unreadable line %d in %s", number, path)
+
+
+def build_contact(record):
+    data = record['data']
+    return ContactUs(
+        submission_id=record['submission_id'],
+        api_key_id=record['api_key_id'],
+        submitted_by_user_id=record['user_id'],
+        created_at=parse_datetime(record['created_at']),
+        name=data.get('name'),
+        email=data.get('email'),
+        phone=data.get('phone'),
+        package_type=data.get('package_type'),
+        message=data.get('message'),
+    )
+
+
+def save_batch(records):
+    """bulk_create one batch; submission_id makes replays after a crash harmless"""
+    # Rows already written by a drain that crashed before removing its file
+    stored = {
+        str(submission_id) for submission_id in ContactUs.objects.filter(
+            submission_id__in=[record['submission_id'] for record in records]
+        ).values_list('submission_id', flat=True)
+    }
+    records = [record for record in records if str(record['submission_id']) not in stored]
+    contacts = [build_contact(record) for record in records]
+    for contact in contacts:
+        contact.set_identity_hashes()
+    with transaction.atomic():
+        Contact.link_submissions(contacts)
+        ContactUs.objects.bulk_create(contacts, ignore_conflicts=True)
+        WebhookDelivery.enqueue(contacts)
+
+    counts = {}
+    for record in records:
+        key = (record['api_key_id'], record['user_id'])
+        counts[key] = counts.get(key, 0) + 1
+    contacts_ingested.send(sender=ContactUs, counts=counts, contacts=contacts)
+    return len(stored) + len(contacts)
+
+
+def drain_contact_spool(batch_size=None, spool=None):
+    """Write every queued submission to ContactUs, return the number of records drained"""
+    spool = spool or ContactSpool()
+    batch_size = batch_size or settings.CONTACT_SPOOL_BATCH_SIZE
+
+    lock_fd = os.open(os.path.join(spool.directory, 'drain.lock'), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return 0  # another drainer is running
+
+        spool.rotate()
+        drained = 0
+        for path in spool.pending_files():
+            batch = []
+            for record in read_records(path):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    drained += save_batch(batch)
+                    batch = []
+            if batch:
+                drained += save_batch(batch)
+            os.remove(path)
+        return drained
+    finally:
+        os.close(lock_fd)
@@ -0,0 +1,77 @@
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.enquiries.caching import forget_contact_totals
+from apps.enquiries.ingestion import ContactSpool, drain_contact_spool
+from apps.enquiries.models import APIKey, ContactUs, WebhookDelivery
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sustained queue submissions per second and drain throughput. "
+        "Writes to a temporary spool under a throwaway owner and API key, deleted afterwards with everything they created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--submissions', type=int, default=5000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--no-fsync', action='store_true')
+
+    def handle(self, *args, **options):
+        # Its own owner and key: no partner webhook is subscribed to the submissions,
+        # and no real owner's contacts, daily counters or cached totals change
+        token = uuid.uuid4().hex[:12]
+        owner = User.objects.create_user(
+            username=f'queue-benchmark-{token}', email=f'queue-benchmark-{token}@example.invalid',
+            password=None, role='agencyadmin', is_active=False,
+        )
+        api_key = APIKey.objects.create(user=owner, name='Queue benchmark', is_active=False)
+        owner_id = owner.pk
+        try:
+            enqueue_seconds, drained, drain_seconds = self.run(api_key, options)
+        finally:
+            with transaction.atomic():
+                WebhookDelivery.objects.filter(subscription__api_key=api_key).delete()
+                ContactUs.objects.filter(api_key=api_key).delete()
+                # Takes the key, its daily counters and the linked Contacts with it
+                owner.delete()
+            forget_contact_totals(owner_id)
+
+        total = options['submissions']
+        self.stdout.write(
+            f"Enqueued {total} in {enqueue_seconds:.2f}s: {total / enqueue_seconds:,.0f} submissions/s "
+            f"({options['threads']} threads, fsync {'off' if options['no_fsync'] else 'on'})"
+        )
+        self.stdout.write(
+            f"Drained {drained} in {drain_seconds:.2f}s: {drained / drain_seconds:,.0f} rows/s"
+        )
+
+    def run(self, api_key, options):
+        with tempfile.TemporaryDirectory() as directory:
+            spool = ContactSpool(directory, fsync=not options['no_fsync'])
+
+            def submit(number):
+                spool.append({
+                    'submission_id': str(uuid.uuid4()),
+                    'api_key_id': api_key.pk,
+                    'user_id': api_key.user_id,
+                    'created_at': '2025-01-01T00:00:00+00:00',
+                    'data': {'name': f'Benchmark {number}', 'email': 'bench@example.com',
+                             'phone': '0000000000', 'package_type': 'umrah_classic', 'message': ''},
+                })
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                list(pool.map(submit, range(options['submissions'])))
+            enqueue_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            drained = drain_contact_spool(spool=spool)
+            drain_seconds = time.perf_counter() - started
+        return enqueue_seconds, drained, drain_seconds
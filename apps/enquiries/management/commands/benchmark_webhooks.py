@@ -0,0 +1,74 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from apps.enquiries.models import APIKey, WebhookDelivery, WebhookSubscription
+from apps.enquiries.webhook_receiver import StubReceiver
+from apps.enquiries.webhooks import dispatch_webhooks
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure webhook dispatch throughput against local stub endpoints. "
+        "Uses a throwaway owner, API key and subscriptions, deleted afterwards with their deliveries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=5000)
+        parser.add_argument('--endpoints', type=int, default=4)
+        parser.add_argument('--latency', type=float, default=0.02, help="Seconds each stub reply takes")
+
+    def handle(self, *args, **options):
+        # Its own inactive key: no real submission is queued to the stubs,
+        # and only its subscriptions are dispatched, never partners' deliveries
+        token = uuid.uuid4().hex[:12]
+        owner = User.objects.create_user(
+            username=f'webhook-benchmark-{token}', email=f'webhook-benchmark-{token}@example.invalid',
+            password=None, role='agencyadmin', is_active=False,
+        )
+        api_key = APIKey.objects.create(user=owner, name='Webhook benchmark', is_active=False)
+        receivers = [StubReceiver(delay=options['latency']) for _ in range(options['endpoints'])]
+        for receiver in receivers:
+            receiver.__enter__()
+        try:
+            # The stubs listen on http://127.0.0.1
+            with override_settings(WEBHOOK_ALLOW_LOCAL_URLS=True):
+                totals, seconds = self.run(api_key, receivers, options)
+            received = sum(len(receiver.events()) for receiver in receivers)
+            requests = sum(len(receiver.requests) for receiver in receivers)
+        finally:
+            for receiver in receivers:
+                receiver.__exit__(None, None, None)
+            with transaction.atomic():
+                WebhookDelivery.objects.filter(subscription__api_key=api_key).delete()
+                # Takes the key and its subscriptions with it
+                owner.delete()
+
+        self.stdout.write(
+            f"Delivered {totals['delivered']} ({received} received in {requests} requests) to "
+            f"{options['endpoints']} endpoints in {seconds:.2f}s: {totals['delivered'] / seconds:,.0f} deliveries/s "
+            f"({options['latency'] * 1000:.0f} ms per reply)"
+        )
+
+    def run(self, api_key, receivers, options):
+        subscriptions = [
+            WebhookSubscription.objects.create(api_key=api_key, url=receiver.url) for receiver in receivers
+        ]
+        now = timezone.now()
+        WebhookDelivery.objects.bulk_create([
+            WebhookDelivery(
+                subscription=subscriptions[number % len(subscriptions)],
+                payload={'submission_id': uuid.uuid4(), 'name': f'Benchmark {number}'},
+                next_attempt_at=now, created_at=now,
+            )
+            for number in range(options['deliveries'])
+        ], batch_size=1000)
+
+        started = time.perf_counter()
+        totals = dispatch_webhooks(subscription_ids=[subscription.pk for subscription in subscriptions])
+        return totals, time.perf_counter() - started
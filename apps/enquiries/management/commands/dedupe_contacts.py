@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.enquiries.dedupe import backfill_identity_hashes, cluster_submissions, merge_clusters
+from apps.enquiries.models import Contact, ContactUs
+
+
+class Command(BaseCommand):
+    help = "Hash contact phones and emails and link duplicate submissions to one Contact per person."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='user_id', type=int, help="Only submissions to this owner")
+        parser.add_argument('--rehash', action='store_true',
+                            help="Recompute every hash, e.g. after changing CONTACT_DEFAULT_COUNTRY_CODE")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Delete existing Contacts and cluster from scratch")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report the result and roll it back")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        submissions = ContactUs.objects.all()
+        contacts = Contact.objects.all()
+        if options['user_id']:
+            submissions = submissions.filter(submitted_by_user_id=options['user_id'])
+            contacts = contacts.filter(user_id=options['user_id'])
+
+        with transaction.atomic():
+            hashed = backfill_identity_hashes(submissions, rehash=options['rehash'], batch_size=options['batch_size'])
+            if options['rebuild']:
+                contacts.delete()
+            result = merge_clusters(cluster_submissions(submissions, options['batch_size']), options['batch_size'])
+            emptied, _ = contacts.filter(submissions__isnull=True).delete()
+            if options['dry_run']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{'Would link' if options['dry_run'] else 'Linked'} {result['submissions']} submissions "
+            f"into {result['clusters']} contacts: {hashed} hashed, {result['contacts_created']} contacts created, "
+            f"{result['contacts_merged']} merged, {emptied} without submissions deleted, "
+            f"{result['submissions_relinked']} submissions relinked"
+        )
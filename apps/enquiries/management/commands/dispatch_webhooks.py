@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.enquiries.webhooks import dispatch_webhooks, purge_deliveries
+
+
+class Command(BaseCommand):
+    help = "Send due partner webhook deliveries, retrying failed ones with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help="Deliveries claimed per pass")
+        parser.add_argument('--loop', action='store_true', help="Keep dispatching until interrupted")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between passes with --loop")
+        parser.add_argument('--purge-days', type=int, default=None,
+                            help="First delete delivered and failed deliveries older than this")
+
+    def handle(self, *args, **options):
+        if options['purge_days'] is not None:
+            self.stdout.write(f"Purged {purge_deliveries(options['purge_days'])} old deliveries")
+        while True:
+            totals = dispatch_webhooks(limit=options['limit'])
+            if any(totals.values()) or not options['loop']:
+                self.stdout.write(
+                    f"Delivered {totals['delivered']}, retrying {totals['retrying']}, failed {totals['failed']}"
+                )
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
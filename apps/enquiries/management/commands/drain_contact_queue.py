@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.enquiries.ingestion import drain_contact_spool
+
+
+class Command(BaseCommand):
+    help = "Write queued contact submissions to ContactUs in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help="Keep draining until interrupted")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between drains with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            drained = drain_contact_spool(batch_size=options['batch_size'])
+            if drained or not options['loop']:
+                self.stdout.write(f"Drained {drained} submissions")
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0010_galleryimage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicSiteSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etag', models.CharField(max_length=64)),
+                ('content', models.BinaryField(help_text='UTF-8 JSON')),
+                ('content_gzip', models.BinaryField()),
+                ('content_br', models.BinaryField(blank=True, help_text='Empty when brotli is not installed', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='public_site_snapshot', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0011_publicsitesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactus',
+            name='submission_id',
+            field=models.UUIDField(blank=True, editable=False, help_text='Set for submissions that went through the ingestion queue', null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='contactus',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
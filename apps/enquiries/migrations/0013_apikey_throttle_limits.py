@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0012_contactus_submission_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apikey',
+            name='throttle_burst',
+            field=models.PositiveIntegerField(blank=True, help_text='Requests allowed in a burst, empty for the default', null=True),
+        ),
+        migrations.AddField(
+            model_name='apikey',
+            name='throttle_per_minute',
+            field=models.PositiveIntegerField(blank=True, help_text='Sustained requests per minute, empty for the default', null=True),
+        ),
+    ]
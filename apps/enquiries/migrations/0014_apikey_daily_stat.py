@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0013_apikey_throttle_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='APIKeyDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('submissions', models.PositiveIntegerField(default=0)),
+                ('api_key', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='enquiries.apikey')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'unique_together': {('api_key', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    ContactUs = apps.get_model('enquiries', 'ContactUs')
+    APIKeyDailyStat = apps.get_model('enquiries', 'APIKeyDailyStat')
+    rows = (
+        ContactUs.objects.filter(api_key__isnull=False)
+        .annotate(date=TruncDate('created_at'))
+        .values('api_key_id', 'date')
+        .annotate(submissions=Count('id'))
+        .order_by()
+    )
+    APIKeyDailyStat.objects.bulk_create(
+        [
+            APIKeyDailyStat(api_key_id=row['api_key_id'], date=row['date'], submissions=row['submissions'])
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0014_apikey_daily_stat'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_daily_stats, migrations.RunPython.noop),
+    ]
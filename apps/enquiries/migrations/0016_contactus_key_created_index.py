@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0015_backfill_apikey_daily_stat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactus',
+            index=models.Index(fields=['api_key', '-created_at', '-id'], name='contactus_key_created_idx'),
+        ),
+    ]
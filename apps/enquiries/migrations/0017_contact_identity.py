@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:41
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enquiries', '0016_contactus_key_created_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactus',
+            name='email_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='contactus',
+            name='phone_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='Contact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('phone', models.CharField(blank=True, help_text='Normalized, E.164 style', max_length=20, null=True)),
+                ('email', models.EmailField(blank=True, help_text='Normalized, lowercased', max_length=254, null=True)),
+                ('submissions_count', models.PositiveIntegerField(default=0)),
+                ('first_seen_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contacts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_seen_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='contactus',
+            name='contact',
+            field=models.ForeignKey(blank=True, help_text='The person behind this submission, shared by their repeat submissions', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='submissions', to='enquiries.contact'),
+        ),
+        migrations.AddIndex(
+            model_name='contactus',
+            index=models.Index(fields=['submitted_by_user', 'phone_hash'], name='contactus_owner_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactus',
+            index=models.Index(fields=['submitted_by_user', 'email_hash'], name='contactus_owner_email_idx'),
+        ),
+    ]
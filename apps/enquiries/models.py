@@ -1,8 +1,66 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Greatest
 from apps.common.mixins import TimestampMixin
+import hashlib
+import re
+import secrets
 import uuid
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
+from datetime import timedelta
+
+NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_phone(value, default_country_code=None):
+    """
+    Return an E.164-style '+<digits>' number, or None if it is not one.
+
+    '+' and '00' prefixes mark an international number; anything else is
+    treated as national, its trunk zeros dropped and
+    CONTACT_DEFAULT_COUNTRY_CODE put in front.
+    """
+    if not value:
+        return None
+    text = str(value).strip()
+    digits = NON_DIGITS.sub('', text)
+    if text.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        digits = digits.lstrip('0')
+        if len(digits) <= 10:
+            digits = (default_country_code or settings.CONTACT_DEFAULT_COUNTRY_CODE) + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def normalize_email(value):
+    if not value:
+        return None
+    value = str(value).strip().lower()
+    return value if '@' in value else None
+
+
+def identity_hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest() if value else None
+
+
+class APIKeyQuerySet(models.QuerySet):
+    def with_enquiry_stats(self):
+        """Annotate enquiry_count, enquiries_last_7_days and last_submission_at in the same query"""
+        week_ago = timezone.now() - timedelta(days=7)
+        return self.annotate(
+            enquiry_count=models.Count('contact_submissions'),
+            enquiries_last_7_days=models.Count(
+                'contact_submissions', filter=models.Q(contact_submissions__created_at__gte=week_ago)
+            ),
+            last_submission_at=models.Max('contact_submissions__created_at'),
+        )
+
 
 class APIKey(models.Model):
     """Model to store API keys for external website integration"""
@@ -13,6 +71,14 @@ class APIKey(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     last_used = models.DateTimeField(null=True, blank=True)
     website_url = models.URLField(blank=True, null=True, help_text="Website URL where this key is used")
+    throttle_burst = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Requests allowed in a burst, empty for the default"
+    )
+    throttle_per_minute = models.PositiveIntegerField(
+        null=True, blank=True, help_text="Sustained requests per minute, empty for the default"
+    )
+
+    objects = APIKeyQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.user.username} - {self.name}"
@@ -42,6 +108,7 @@ class Package(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     currency = models.CharField(max_length=10, default='INR', blank=True, null=True)
     image = models.ImageField(upload_to='package_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     features = models.TextField(help_text="Enter features separated by new lines", blank=True)
     duration_days = models.IntegerField(default=7)
     is_active = models.BooleanField(default=True)
@@ -49,6 +116,9 @@ class Package(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Resized copies built in the background, see apps.common.images
+    image_variant_fields = {'image': 'image_variants'}
+
     class Meta:
         ordering = ['package_type']
         unique_together = ['user', 'package_type']
@@ -65,12 +135,17 @@ class HomePage(models.Model):
     content = models.TextField(help_text="Main content for the homepage")
     background_video = models.FileField(upload_to='homepage_videos/', blank=True, null=True)
     background_image = models.ImageField(upload_to='homepage_images/', blank=True, null=True)
+    background_image_variants = models.JSONField(default=dict, blank=True, editable=False)
     welcome_title = models.CharField(max_length=200, default="Welcome")
     welcome_subtitle = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    image_variant_fields = {'background_image': 'background_image_variants'}
+    # Served with byte ranges through signed URLs, see apps.common.streaming
+    streamable_fields = ('background_video',)
+
     class Meta:
         ordering = ['-created_at']
 
@@ -87,7 +162,12 @@ class ContactUs(models.Model):
     package_type = models.CharField(max_length=50, blank=True, null=True)
     message = models.TextField(blank=True, null=True)
     is_processed = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Not auto_now_add: queued submissions keep the time they were received
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
+    submission_id = models.UUIDField(
+        unique=True, null=True, blank=True, editable=False,
+        help_text="Set for submissions that went through the ingestion queue"
+    )
 
     api_key = models.ForeignKey(
         'APIKey', 
@@ -105,9 +185,26 @@ class ContactUs(models.Model):
         related_name='contact_submissions',
         help_text="User who owns the API key used for submission"
     )
+    contact = models.ForeignKey(
+        'Contact',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='submissions',
+        help_text="The person behind this submission, shared by their repeat submissions"
+    )
+    # sha256 of the normalized phone and email, see Contact.link_submissions
+    phone_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
+    email_hash = models.CharField(max_length=64, blank=True, null=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Per-key listings walk created_at pages (see ContactUsListView)
+            models.Index(fields=['api_key', '-created_at', '-id'], name='contactus_key_created_idx'),
+            models.Index(fields=['submitted_by_user', 'phone_hash'], name='contactus_owner_phone_idx'),
+            models.Index(fields=['submitted_by_user', 'email_hash'], name='contactus_owner_email_idx'),
+        ]
         verbose_name = "Contact Us"
         verbose_name_plural = "Contact Us"
 
@@ -115,16 +212,302 @@ class ContactUs(models.Model):
         api_info = f" (via {self.api_key.name})" if self.api_key else ""
         return f"{self.name} - {self.email}{api_info}"
 
+    def set_identity_hashes(self):
+        self.phone_hash = identity_hash(normalize_phone(self.phone))
+        self.email_hash = identity_hash(normalize_email(self.email))
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.set_identity_hashes()
+        # One transaction, so a stored submission always has its webhook deliveries
+        with transaction.atomic():
+            if adding and self.contact_id is None:
+                Contact.link_submissions([self])
+            super().save(*args, **kwargs)
+            if adding:
+                WebhookDelivery.enqueue([self])
+
+
+class Contact(models.Model):
+    """
+    A person who contacted one owner, possibly many times across partner sites.
+
+    Submissions sharing a normalized phone or email with an earlier
+    submission of the same owner point at the same Contact.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='contacts')
+    name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=20, blank=True, null=True, help_text="Normalized, E.164 style")
+    email = models.EmailField(blank=True, null=True, help_text="Normalized, lowercased")
+    submissions_count = models.PositiveIntegerField(default=0)
+    first_seen_at = models.DateTimeField(default=timezone.now)
+    last_seen_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-last_seen_at']
+
+    def __str__(self):
+        return f"{self.name} - {self.phone or self.email}"
+
+    @classmethod
+    def link_submissions(cls, submissions):
+        """
+        Point unsaved submissions at their Contact, creating Contacts as needed.
+
+        Known contacts are found with one query over the indexed
+        (owner, phone_hash) and (owner, email_hash) columns of earlier
+        submissions. Call set_identity_hashes() on each submission first.
+        Two first-time submissions racing each other may get separate
+        Contacts; dedupe_contacts merges those.
+        """
+        pending = [
+            submission for submission in submissions
+            if submission.contact_id is None and submission.submitted_by_user_id
+            and (submission.phone_hash or submission.email_hash)
+        ]
+        if not pending:
+            return
+
+        owner_ids = {submission.submitted_by_user_id for submission in pending}
+        phone_hashes = {submission.phone_hash for submission in pending if submission.phone_hash}
+        email_hashes = {submission.email_hash for submission in pending if submission.email_hash}
+        known = {}
+        rows = ContactUs.objects.filter(
+            models.Q(phone_hash__in=phone_hashes) | models.Q(email_hash__in=email_hashes),
+            submitted_by_user_id__in=owner_ids, contact__isnull=False
+        ).order_by('-contact_id').values_list('submitted_by_user_id', 'phone_hash', 'email_hash', 'contact_id')
+        # Lowest contact id wins when a phone and an email point at different contacts
+        for owner_id, phone_hash, email_hash, contact_id in rows:
+            if phone_hash:
+                known[(owner_id, 'phone', phone_hash)] = contact_id
+            if email_hash:
+                known[(owner_id, 'email', email_hash)] = contact_id
+
+        new_contacts, assignments, existing = [], [], {}
+        for submission in pending:
+            owner_id = submission.submitted_by_user_id
+            keys = [
+                (owner_id, kind, value) for kind, value in
+                (('phone', submission.phone_hash), ('email', submission.email_hash)) if value
+            ]
+            # Either a Contact created in this call or the id of a stored one
+            match = next((known[key] for key in keys if key in known), None)
+            if match is None:
+                match = cls(
+                    user_id=owner_id, name=submission.name, submissions_count=0,
+                    phone=normalize_phone(submission.phone), email=normalize_email(submission.email),
+                    first_seen_at=submission.created_at, last_seen_at=submission.created_at,
+                )
+                new_contacts.append(match)
+            for key in keys:
+                known.setdefault(key, match)
+            assignments.append((submission, match))
+
+            if isinstance(match, cls):
+                match.submissions_count += 1
+                match.last_seen_at = max(match.last_seen_at, submission.created_at)
+            else:
+                count, last_seen_at = existing.get(match, (0, submission.created_at))
+                existing[match] = (count + 1, max(last_seen_at, submission.created_at))
+
+        cls.objects.bulk_create(new_contacts)
+        for submission, match in assignments:
+            if isinstance(match, cls):
+                submission.contact = match
+            else:
+                submission.contact_id = match
+        for contact_id, (count, last_seen_at) in existing.items():
+            cls.objects.filter(pk=contact_id).update(
+                submissions_count=models.F('submissions_count') + count,
+                last_seen_at=Greatest('last_seen_at', models.Value(last_seen_at)),
+            )
+
 class GalleryImage(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='gallery_images')
     image = models.ImageField(upload_to='gallery/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     title = models.CharField(max_length=255, blank=True, null=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    image_variant_fields = {'image': 'image_variants'}
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f"Gallery Image ({self.id}) for user {self.user.username}"
+
+class PublicSiteSnapshot(models.Model):
+    """Prebuilt public payload of one user: active packages, homepage and gallery"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='public_site_snapshot')
+    etag = models.CharField(max_length=64)
+    content = models.BinaryField(help_text="UTF-8 JSON")
+    content_gzip = models.BinaryField()
+    content_br = models.BinaryField(blank=True, null=True, help_text="Empty when brotli is not installed")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Public site snapshot for {self.user.username}"
+
+
+class APIKeyDailyStat(models.Model):
+    """Contact submissions received through an API key per day, kept for traffic charts"""
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    submissions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        unique_together = ['api_key', 'date']
+
+    def __str__(self):
+        return f"{self.api_key.name} - {self.date}: {self.submissions}"
+
+    @classmethod
+    def record(cls, counts):
+        """Add {(api_key_id, date): submissions} to the stored counters"""
+        for (api_key_id, date), submissions in counts.items():
+            updated = cls.objects.filter(api_key_id=api_key_id, date=date).update(
+                submissions=models.F('submissions') + submissions
+            )
+            if updated:
+                continue
+            try:
+                with transaction.atomic():
+                    cls.objects.create(api_key_id=api_key_id, date=date, submissions=submissions)
+            except IntegrityError:
+                # Created concurrently, add to that row instead
+                cls.objects.filter(api_key_id=api_key_id, date=date).update(
+                    submissions=models.F('submissions') + submissions
+                )
+
+    @classmethod
+    def traffic(cls, api_key, days=30):
+        """Daily submissions for the last `days` days up to today, oldest first, zero-filled"""
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        stored = dict(
+            cls.objects.filter(api_key=api_key, date__gte=start, date__lte=today).values_list('date', 'submissions')
+        )
+        return [
+            {'date': start + timedelta(days=offset), 'submissions': stored.get(start + timedelta(days=offset), 0)}
+            for offset in range(days)
+        ]
+
+
+def generate_webhook_secret():
+    return secrets.token_hex(32)
+
+
+class WebhookSubscription(models.Model):
+    """An endpoint of a partner notified of submissions made with one of their API keys"""
+    api_key = models.ForeignKey(APIKey, on_delete=models.CASCADE, related_name='webhooks')
+    url = models.URLField(max_length=500)
+    secret = models.CharField(
+        max_length=64, default=generate_webhook_secret, help_text="Key of the X-Webhook-Signature HMAC"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_success_at = models.DateTimeField(null=True, blank=True)
+    last_failure_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.api_key.name} -> {self.url}"
+
+
+class WebhookDelivery(models.Model):
+    """
+    Outbox row: one event waiting for, or done with, delivery to one subscription.
+
+    Rows are written in the transaction that stores the submission and sent
+    later by dispatch_webhooks, so partner endpoints never slow a submission.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='deliveries')
+    contact = models.ForeignKey(
+        ContactUs, on_delete=models.SET_NULL, null=True, blank=True, related_name='webhook_deliveries'
+    )
+    event = models.CharField(max_length=50, default='contact.created')
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # Also the lease of a dispatcher that claimed the row, see apps.enquiries.webhooks
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_due_idx'),
+        ]
+        verbose_name_plural = "Webhook deliveries"
+
+    def __str__(self):
+        return f"{self.event} #{self.pk} ({self.status})"
+
+    @staticmethod
+    def contact_payload(submission):
+        return {
+            'id': submission.pk,
+            'submission_id': submission.submission_id,
+            'api_key_id': submission.api_key_id,
+            'name': submission.name,
+            'email': submission.email,
+            'phone': submission.phone,
+            'package_type': submission.package_type,
+            'message': submission.message,
+            'created_at': submission.created_at,
+        }
+
+    @classmethod
+    def enqueue(cls, submissions):
+        """
+        Queue a contact.created delivery per active subscription of each submission's key.
+
+        Call inside the transaction that stores the submissions. Rows bulk
+        created without their pks are looked up by submission_id.
+        """
+        api_key_ids = {submission.api_key_id for submission in submissions if submission.api_key_id}
+        if not api_key_ids:
+            return []
+        subscriptions = {}
+        for subscription_id, api_key_id in WebhookSubscription.objects.filter(
+            api_key_id__in=api_key_ids, is_active=True
+        ).values_list('id', 'api_key_id'):
+            subscriptions.setdefault(api_key_id, []).append(subscription_id)
+        if not subscriptions:
+            return []
+
+        missing = [submission.submission_id for submission in submissions if submission.pk is None]
+        stored_ids = {
+            str(submission_id): pk for submission_id, pk in
+            ContactUs.objects.filter(submission_id__in=missing).values_list('submission_id', 'id')
+        } if missing else {}
+
+        now = timezone.now()
+        deliveries = []
+        for submission in submissions:
+            payload = cls.contact_payload(submission)
+            if submission.pk is None:
+                payload['id'] = stored_ids.get(str(submission.submission_id))
+            deliveries.extend(
+                cls(
+                    subscription_id=subscription_id, contact_id=payload['id'], payload=payload,
+                    next_attempt_at=now, created_at=now,
+                )
+                for subscription_id in subscriptions.get(submission.api_key_id, ())
+            )
+        return cls.objects.bulk_create(deliveries)
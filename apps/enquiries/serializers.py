@@ -1,8 +1,11 @@
 from rest_framework import serializers
-from .models import APIKey, Package, HomePage, ContactUs, GalleryImage
+from .models import APIKey, Package, HomePage, ContactUs, GalleryImage, WebhookSubscription
 from django.contrib.auth.models import User
 from drf_extra_fields.fields import Base64ImageField, Base64FileField
+from apps.common.models import ChunkedUpload
+from apps.common.serializers import ImageSrcsetField, StreamURLField
 from rest_framework.exceptions import ValidationError
+from .webhooks import UnsafeWebhookURL, resolve_webhook_url
 import mimetypes
 import base64
 from io import BytesIO
@@ -119,21 +122,76 @@ class CustomBase64ImageField(Base64ImageField):
 
 class APIKeySerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
+    enquiry_count = serializers.SerializerMethodField()
+    enquiries_last_7_days = serializers.SerializerMethodField()
+    last_submission_at = serializers.SerializerMethodField()
     
     class Meta:
         model = APIKey
-        fields = ['id', 'key', 'name', 'is_active', 'created_at', 'last_used', 'website_url', 'username']
+        fields = [
+            'id', 'key', 'name', 'is_active', 'created_at', 'last_used', 'website_url', 'username',
+            'enquiry_count', 'enquiries_last_7_days', 'last_submission_at'
+        ]
         read_only_fields = ['key', 'created_at', 'last_used', 'username']
 
+    def _with_enquiry_stats(self, obj):
+        """Annotated by APIKey.objects.with_enquiry_stats(), queried only for a freshly saved key"""
+        if not hasattr(obj, 'enquiry_count'):
+            stats = APIKey.objects.with_enquiry_stats().filter(pk=obj.pk).values(
+                'enquiry_count', 'enquiries_last_7_days', 'last_submission_at'
+            ).first() or {}
+            for name in ('enquiry_count', 'enquiries_last_7_days', 'last_submission_at'):
+                setattr(obj, name, stats.get(name))
+        return obj
+
+    def get_enquiry_count(self, obj):
+        return self._with_enquiry_stats(obj).enquiry_count or 0
+
+    def get_enquiries_last_7_days(self, obj):
+        return self._with_enquiry_stats(obj).enquiries_last_7_days or 0
+
+    def get_last_submission_at(self, obj):
+        last_submission_at = self._with_enquiry_stats(obj).last_submission_at
+        return serializers.DateTimeField().to_representation(last_submission_at) if last_submission_at else None
+
+
+class APIKeyTrafficSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    submissions = serializers.IntegerField()
+
+class WebhookSubscriptionSerializer(serializers.ModelSerializer):
+    pending_deliveries = serializers.SerializerMethodField()
+
+    class Meta:
+        model = WebhookSubscription
+        fields = [
+            'id', 'api_key', 'url', 'secret', 'is_active', 'created_at',
+            'last_success_at', 'last_failure_at', 'pending_deliveries'
+        ]
+        read_only_fields = ['api_key', 'secret', 'created_at', 'last_success_at', 'last_failure_at']
+
+    def get_pending_deliveries(self, obj):
+        pending = getattr(obj, 'pending_deliveries', None)
+        return pending if pending is not None else obj.deliveries.filter(status='pending').count()
+
+    def validate_url(self, value):
+        try:
+            resolve_webhook_url(value)
+        except UnsafeWebhookURL as error:
+            raise serializers.ValidationError(str(error))
+        return value
+
+
 class PackageSerializer(serializers.ModelSerializer):
     features_list = serializers.ReadOnlyField(source='get_features_list')
     image=CustomBase64ImageField(required=False)
+    image_srcset = ImageSrcsetField('image')
     username = serializers.CharField(source='user.username', read_only=True)
     class Meta:
         model = Package
         fields = [
             'id', 'package_type', 'title', 'description', 'price', 'currency',
-            'image', 'features', 'features_list', 'duration_days', 'is_active',
+            'image', 'image_srcset', 'features', 'features_list', 'duration_days', 'is_active',
             'is_featured', 'created_at', 'updated_at', 'username'
         ]
 
@@ -146,12 +204,15 @@ class PackageUpdateSerializer(serializers.ModelSerializer):
 class HomePageSerializer(serializers.ModelSerializer):
     background_image = CustomBase64ImageField(required=False)
     background_video = CustomBase64FileField(required=False)
+    background_image_srcset = ImageSrcsetField('background_image')
+    background_video_stream_url = StreamURLField('background_video')
     
     username = serializers.CharField(source='user.username', read_only=True)
     class Meta:
         model = HomePage
         fields = [
-            'id', 'content', 'background_video', 'background_image',
+            'id', 'content', 'background_video', 'background_video_stream_url',
+            'background_image', 'background_image_srcset',
             'welcome_title', 'welcome_subtitle', 'is_active',
             'created_at', 'updated_at', 'username'
         ]
@@ -164,6 +225,19 @@ class HomePageUpdateSerializer(serializers.ModelSerializer):
         model = HomePage
         fields = ['content', 'background_image', 'background_video', 'welcome_title', 'welcome_subtitle']
 
+class HomePageVideoSerializer(serializers.Serializer):
+    upload_id = serializers.UUIDField()
+
+    def validate_upload_id(self, value):
+        upload = ChunkedUpload.objects.filter(
+            pk=value, user=self.context['request'].user, purpose='homepage_video'
+        ).first()
+        if upload is None:
+            raise ValidationError("No homepage video upload with this id.")
+        if upload.status != 'complete':
+            raise ValidationError("Complete the upload first.")
+        return upload
+
 class ContactUsSerializer(serializers.ModelSerializer):
     class Meta:
         model = ContactUs
@@ -178,15 +252,16 @@ class ContactUsListSerializer(serializers.ModelSerializer):
         model = ContactUs
         fields = [
             'id', 'name', 'email', 'phone', 'package_type', 'message', 
-            'created_at', 'api_key_name', 'api_key_website', 'submitted_by_username'
+            'created_at', 'api_key_name', 'api_key_website', 'submitted_by_username', 'contact'
         ]
-        read_only_fields = ['created_at', 'api_key', 'submitted_by_user']
+        read_only_fields = ['created_at', 'api_key', 'submitted_by_user', 'contact']
 
 class GalleryImageSerializer(serializers.ModelSerializer):
     image = CustomBase64ImageField(required=True)
+    image_srcset = ImageSrcsetField('image')
     username = serializers.CharField(source='user.username', read_only=True)
     
     class Meta:
         model = GalleryImage
-        fields = ['id', 'image', 'title', 'is_active', 'created_at', 'username']
+        fields = ['id', 'image', 'image_srcset', 'title', 'is_active', 'created_at', 'username']
         read_only_fields = ['created_at', 'username']
\ No newline at end of file
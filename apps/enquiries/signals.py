@@ -0,0 +1,95 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.common.images import image_variants_ready
+
+from .authentication import api_key_cache
+from .bundle import refresh_bundle_snapshot
+from .caching import adjust_contact_total, bump_content_version, forget_contact_totals
+from .ingestion import contacts_ingested
+from .models import APIKey, APIKeyDailyStat, ContactUs, GalleryImage, HomePage, Package
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def invalidate_api_key(sender, instance, **kwargs):
+    """Drop a saved or deleted key from the authentication cache"""
+    api_key_cache.invalidate(instance.key)
+    # Again after commit, in case a concurrent request re-cached the old row
+    transaction.on_commit(lambda: api_key_cache.invalidate(instance.key))
+    if kwargs.get('created', True):
+        # A new key, or a deleted one whose submissions were detached
+        user_id = instance.user_id
+        forget_contact_totals(user_id)
+        transaction.on_commit(lambda: forget_contact_totals(user_id))
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+@receiver(post_save, sender=HomePage)
+@receiver(post_delete, sender=HomePage)
+@receiver(post_save, sender=GalleryImage)
+@receiver(post_delete, sender=GalleryImage)
+def invalidate_public_content(sender, instance, **kwargs):
+    """Start a new public content version and rebuild the owner's bundle"""
+    if instance.user_id is None:
+        return
+    owner_id = instance.user_id
+    bump_content_version(owner_id)
+    transaction.on_commit(lambda: bump_content_version(owner_id))
+    transaction.on_commit(lambda: refresh_bundle_snapshot(owner_id))
+
+
+def contact_owner_id(contact):
+    if contact.submitted_by_user_id:
+        return contact.submitted_by_user_id
+    return APIKey.objects.filter(pk=contact.api_key_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=ContactUs)
+def count_contact_submission(sender, instance, created, raw=False, **kwargs):
+    """Add a submission made through the API to its key's daily counter and owner's total"""
+    if created and not raw and instance.api_key_id:
+        APIKeyDailyStat.record({(instance.api_key_id, timezone.localdate(instance.created_at)): 1})
+        adjust_contact_total(contact_owner_id(instance), 1)
+
+
+@receiver(post_delete, sender=ContactUs)
+def uncount_contact_submission(sender, instance, **kwargs):
+    if instance.api_key_id:
+        adjust_contact_total(contact_owner_id(instance), -1)
+
+
+@receiver(contacts_ingested)
+def count_ingested_contacts(sender, contacts, **kwargs):
+    """Drained submissions are bulk created, so post_save never fires for them"""
+    counts = {}
+    for contact in contacts:
+        if contact.api_key_id:
+            key = (contact.api_key_id, timezone.localdate(contact.created_at))
+            counts[key] = counts.get(key, 0) + 1
+    APIKeyDailyStat.record(counts)
+
+    # Owners of keys whose submissions do not name them, in one query for the batch
+    unnamed = {contact.api_key_id for contact in contacts if contact.api_key_id and not contact.submitted_by_user_id}
+    key_owners = dict(APIKey.objects.filter(pk__in=unnamed).values_list('pk', 'user_id')) if unnamed else {}
+    totals = {}
+    for contact in contacts:
+        if contact.api_key_id:
+            owner_id = contact.submitted_by_user_id or key_owners.get(contact.api_key_id)
+            totals[owner_id] = totals.get(owner_id, 0) + 1
+    for owner_id, total in totals.items():
+        adjust_contact_total(owner_id, total)
+
+
+@receiver(image_variants_ready, sender=Package)
+@receiver(image_variants_ready, sender=HomePage)
+@receiver(image_variants_ready, sender=GalleryImage)
+def publish_image_variants(sender, instance, **kwargs):
+    """Variants are stored with a queryset update, which the save receivers above never see"""
+    if instance.user_id is None:
+        return
+    bump_content_version(instance.user_id)
+    refresh_bundle_snapshot(instance.user_id)
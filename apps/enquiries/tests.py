@@ -1,3 +1,714 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from apps.users.models import User
+from .authentication import api_key_cache, last_used_buffer
+from .bundle import choose_encoding
+from .caching import get_contact_totals
+from .ingestion import ContactSpool, drain_contact_spool
+from .models import APIKey, APIKeyDailyStat, ContactUs, Package, WebhookDelivery, WebhookSubscription
+from .throttling import LocalBuckets, RedisBuckets, local_buckets
+from .webhook_receiver import StubReceiver
+from .webhooks import dispatch_webhooks, resolve_webhook_url, verify_signature
+
+
+@override_settings(WEBHOOK_ALLOW_LOCAL_URLS=True)
+class WebhookOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.api_key = APIKey.objects.create(user=cls.owner, name='Partner site')
+        cls.other_key = APIKey.objects.create(user=cls.owner, name='Quiet site')
+
+    def subscribe(self, url='http://127.0.0.1:9/hooks/', **kwargs):
+        return WebhookSubscription.objects.create(api_key=self.api_key, url=url, **kwargs)
+
+    def submit(self, number=0, api_key=None):
+        return ContactUs.objects.create(
+            name=f'Pilgrim {number}', phone=f'98765{number:05d}', api_key=api_key or self.api_key,
+            submitted_by_user=self.owner,
+        )
+
+    def test_submission_queues_one_delivery_per_active_subscription(self):
+        subscription = self.subscribe()
+        self.subscribe(is_active=False)
+
+        response = APIClient().post(
+            '/api/enquiries/apikey/contact/', {'name': 'Amina', 'phone': '9876543210'},
+            format='json', HTTP_X_API_KEY=self.api_key.key,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.submit(api_key=self.other_key)
+
+        delivery = WebhookDelivery.objects.get()
+        contact = ContactUs.objects.get(name='Amina')
+        self.assertEqual(delivery.subscription, subscription)
+        self.assertEqual(delivery.contact, contact)
+        self.assertEqual(delivery.status, 'pending')
+        self.assertEqual(delivery.payload['id'], contact.pk)
+        self.assertEqual(delivery.payload['phone'], '9876543210')
+
+    def test_drained_submissions_queue_deliveries_with_their_ids(self):
+        self.subscribe()
+        with tempfile.TemporaryDirectory() as directory:
+            spool = ContactSpool(directory, fsync=False)
+            for number in range(3):
+                spool.append({
+                    'submission_id': f'00000000-0000-4000-8000-{number:012d}',
+                    'api_key_id': self.api_key.pk,
+                    'user_id': self.owner.pk,
+                    'created_at': timezone.now(),
+                    'data': {'name': f'Queued {number}', 'phone': '9876500000'},
+                })
+            self.assertEqual(drain_contact_spool(spool=spool), 3)
+
+        deliveries = WebhookDelivery.objects.select_related('contact')
+        self.assertEqual(len(deliveries), 3)
+        for delivery in deliveries:
+            self.assertIsNotNone(delivery.contact)
+            self.assertEqual(delivery.payload['id'], delivery.contact_id)
+            self.assertEqual(delivery.payload['name'], delivery.contact.name)
+
+    @override_settings(WEBHOOK_BATCH_SIZE=2)
+    def test_dispatch_sends_signed_batches(self):
+        with StubReceiver() as receiver:
+            subscription = self.subscribe(url=receiver.url)
+            submissions = [self.submit(number) for number in range(5)]
+
+            totals = dispatch_webhooks()
+
+        self.assertEqual(totals, {'delivered': 5, 'retrying': 0, 'failed': 0})
+        self.assertEqual(len(receiver.requests), 3)
+        for headers, body in receiver.requests:
+            self.assertTrue(verify_signature(subscription.secret, headers['X-Webhook-Signature'], body))
+            self.assertFalse(verify_signature('wrong secret', headers['X-Webhook-Signature'], body))
+        self.assertEqual(
+            [event['data']['id'] for event in receiver.events()], [submission.pk for submission in submissions]
+        )
+        self.assertFalse(WebhookDelivery.objects.exclude(status='delivered').exists())
+        subscription.refresh_from_db()
+        self.assertIsNotNone(subscription.last_success_at)
+
+    @override_settings(WEBHOOK_BATCH_SIZE=1, WEBHOOK_MAX_ATTEMPTS=3)
+    def test_failed_endpoint_backs_off_then_gives_up(self):
+        with StubReceiver(default_status=503) as receiver:
+            self.subscribe(url=receiver.url)
+            first, second = self.submit(1), self.submit(2)
+
+            self.assertEqual(dispatch_webhooks(), {'delivered': 0, 'retrying': 1, 'failed': 0})
+            failed = WebhookDelivery.objects.get(contact=first)
+            waiting = WebhookDelivery.objects.get(contact=second)
+            self.assertEqual((failed.attempts, failed.response_status), (1, 503))
+            self.assertGreater(failed.next_attempt_at, timezone.now() + timedelta(seconds=10))
+            # Not sent after the endpoint failed, so no attempt is counted
+            self.assertEqual(waiting.attempts, 0)
+            self.assertGreater(waiting.next_attempt_at, timezone.now())
+            # Nothing is due until the backoff runs out
+            self.assertEqual(dispatch_webhooks(), {'delivered': 0, 'retrying': 0, 'failed': 0})
+
+            WebhookDelivery.objects.update(next_attempt_at=timezone.now(), attempts=2)
+            self.assertEqual(dispatch_webhooks(), {'delivered': 0, 'retrying': 0, 'failed': 1})
+            receiver.default_status = 200
+            WebhookDelivery.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+            self.assertEqual(dispatch_webhooks(), {'delivered': 1, 'retrying': 0, 'failed': 0})
+
+        self.assertEqual(WebhookDelivery.objects.get(contact=first).status, 'failed')
+        self.assertEqual(WebhookDelivery.objects.get(contact=second).status, 'delivered')
+
+    def test_dispatch_can_be_limited_to_subscriptions(self):
+        with StubReceiver() as receiver, StubReceiver() as other:
+            subscription = self.subscribe(url=receiver.url)
+            self.subscribe(url=other.url)
+            self.submit()
+
+            self.assertEqual(
+                dispatch_webhooks(subscription_ids=[subscription.pk]), {'delivered': 1, 'retrying': 0, 'failed': 0}
+            )
+        self.assertEqual(len(receiver.requests), 1)
+        self.assertEqual(other.requests, [])
+        self.assertEqual(WebhookDelivery.objects.filter(status='pending').count(), 1)
+
+    def test_unreachable_endpoint_is_retried(self):
+        with StubReceiver() as receiver:
+            url = receiver.url
+        self.subscribe(url=url)
+        self.submit()
+
+        self.assertEqual(dispatch_webhooks(), {'delivered': 0, 'retrying': 1, 'failed': 0})
+        delivery = WebhookDelivery.objects.get()
+        self.assertIsNone(delivery.response_status)
+        self.assertTrue(delivery.last_error)
+
+
+class WebhookURLTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.api_key = APIKey.objects.create(user=cls.owner, name='Partner site')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_subscription_needs_a_public_https_url(self):
+        for url in (
+            'http://93.184.216.34/hooks/', 'https://127.0.0.1/hooks/', 'https://localhost:8000/hooks/',
+            'https://10.0.0.5/hooks/', 'https://192.168.1.1/hooks/', 'https://169.254.169.254/latest/',
+            'https://[::1]/hooks/', 'https://[::ffff:127.0.0.1]/hooks/', 'https://0.0.0.0/hooks/',
+        ):
+            response = self.client.post(f'/api/enquiries/keys/{self.api_key.pk}/webhooks/', {'url': url}, format='json')
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('url', response.data)
+        self.assertFalse(WebhookSubscription.objects.exists())
+
+        parts, address = resolve_webhook_url('https://93.184.216.34:8443/hooks/?site=1')
+        self.assertEqual((address, parts.port, parts.request_uri), ('93.184.216.34', 8443, '/hooks/?site=1'))
+
+    def test_dispatch_refuses_a_private_address(self):
+        with StubReceiver() as receiver:
+            subscription = WebhookSubscription.objects.create(api_key=self.api_key, url=receiver.url)
+            ContactUs.objects.create(name='Amina', phone='9876543210', api_key=self.api_key)
+
+            self.assertEqual(dispatch_webhooks(), {'delivered': 0, 'retrying': 1, 'failed': 0})
+        self.assertEqual(receiver.requests, [])
+        delivery = WebhookDelivery.objects.get(subscription=subscription)
+        self.assertTrue(delivery.last_error.startswith('Refused:'))
+
+
+class PublicSiteBundleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.api_key = APIKey.objects.create(user=cls.owner, name='Partner site')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_choose_encoding_follows_weights(self):
+        available = ['br', 'gzip']
+        self.assertEqual(choose_encoding('gzip, deflate, br', available), 'br')
+        self.assertEqual(choose_encoding('br;q=0, gzip', available), 'gzip')
+        self.assertEqual(choose_encoding('gzip;q=0.5, br;q=0.8', available), 'br')
+        self.assertEqual(choose_encoding('br;q=0.2, gzip;q=0.9', available), 'gzip')
+        self.assertEqual(choose_encoding('br;q=0, gzip;q=0', available), None)
+        self.assertEqual(choose_encoding('*;q=0', available), None)
+        self.assertEqual(choose_encoding('*', available), 'br')
+        self.assertEqual(choose_encoding('*, br;q=0', available), 'gzip')
+        self.assertEqual(choose_encoding('identity;q=1, gzip;q=0.5', available), None)
+        self.assertEqual(choose_encoding('GZIP ; Q=0.7', available), 'gzip')
+        self.assertEqual(choose_encoding('br', ['gzip']), None)
+        self.assertEqual(choose_encoding('', available), None)
+        self.assertEqual(choose_encoding(None, available), None)
+
+    def test_bundle_respects_refused_encodings(self):
+        client = APIClient()
+        first = client.get(
+            '/api/enquiries/apikey/bundle/', HTTP_X_API_KEY=self.api_key.key, HTTP_ACCEPT_ENCODING='br;q=0, gzip'
+        )
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertIsNotNone(json.loads(gzip.decompress(first.content))['generated_at'])
+
+        plain = client.get(
+            '/api/enquiries/apikey/bundle/', HTTP_X_API_KEY=self.api_key.key, HTTP_ACCEPT_ENCODING='gzip;q=0'
+        )
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        json.loads(plain.content)
+
+        cached = client.get(
+            '/api/enquiries/apikey/bundle/', HTTP_X_API_KEY=self.api_key.key, HTTP_IF_NONE_MATCH=first['ETag']
+        )
+        self.assertEqual(cached.status_code, 304)
+
+
+class APIKeyCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+
+    def setUp(self):
+        cache.clear()
+        api_key_cache.clear()
+        # Timestamps left by earlier tests, before their ids are reused
+        last_used_buffer.flush()
+        self.api_key = APIKey.objects.create(user=self.owner, name='Partner site')
+        # As a request header carries it
+        self.key = str(self.api_key.key)
+
+    def validate(self):
+        return APIClient().get('/api/enquiries/apikey/validate-key/', HTTP_X_API_KEY=self.key).status_code
+
+    def test_key_and_user_are_read_once(self):
+        with self.assertNumQueries(1):
+            for _ in range(5):
+                self.assertEqual(api_key_cache.get(self.key).user.username, 'agency')
+        with self.assertNumQueries(1):
+            self.assertIsNone(api_key_cache.get('not-a-key'))
+
+    def test_deactivated_and_deleted_keys_stop_working_at_once(self):
+        self.assertEqual(self.validate(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_key.is_active = False
+            self.api_key.save()
+        self.assertEqual(self.validate(), 403)
+
+        self.api_key.is_active = True
+        self.api_key.save()
+        self.assertEqual(self.validate(), 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_key.delete()
+        self.assertEqual(self.validate(), 403)
+
+    def test_changes_from_other_workers_apply_after_the_local_timeout(self):
+        # update() sends no signal, as if another worker had revoked the key
+        with mock.patch('apps.enquiries.authentication.time.monotonic', return_value=1000.0):
+            api_key_cache.get(self.key)
+        APIKey.objects.filter(pk=self.api_key.pk).update(is_active=False)
+        with mock.patch('apps.enquiries.authentication.time.monotonic', return_value=1009.0):
+            self.assertIsNotNone(api_key_cache.get(self.key))
+        with mock.patch('apps.enquiries.authentication.time.monotonic', return_value=1010.0):
+            self.assertIsNone(api_key_cache.get(self.key))
+
+    def test_shared_cache_entry_is_dropped_on_save(self):
+        shared_key = api_key_cache.cache_key(self.key)
+        with mock.patch('apps.enquiries.authentication.cache_is_shared', return_value=True):
+            api_key_cache.get(self.key)
+            self.assertEqual(cache.get(shared_key).pk, self.api_key.pk)
+            # A worker with an empty local cache is served from the shared one
+            api_key_cache.clear()
+            with self.assertNumQueries(0):
+                api_key_cache.get(self.key)
+
+            self.api_key.name = 'Renamed'
+            self.api_key.save()
+            self.assertIsNone(cache.get(shared_key))
+            self.assertEqual(api_key_cache.get(self.key).name, 'Renamed')
+
+    @override_settings(API_KEY_LAST_USED_FLUSH_INTERVAL=3600)
+    def test_last_used_is_written_in_bulk(self):
+        other_key = APIKey.objects.create(user=self.owner, name='Other site')
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                last_used_buffer.touch(self.api_key.pk, timezone.now())
+                last_used_buffer.touch(other_key.pk, timezone.now())
+        self.assertFalse(APIKey.objects.filter(last_used__isnull=False).exists())
+        # One bulk UPDATE in a transaction
+        with CaptureQueriesContext(connection) as captured:
+            last_used_buffer.flush()
+        self.assertEqual(len([query for query in captured if query['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(APIKey.objects.filter(last_used__isnull=False).count(), 2)
+
+
+class APIKeyStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.other_owner = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+        cls.busy_key = APIKey.objects.create(user=cls.owner, name='Busy site')
+        cls.quiet_key = APIKey.objects.create(user=cls.owner, name='Quiet site')
+        cls.other_key = APIKey.objects.create(user=cls.other_owner, name='Other site')
+        cls.now = timezone.now()
+        for days_ago in (0, 0, 3, 10):
+            ContactUs.objects.create(
+                name='Amina', phone='9876543210', api_key=cls.busy_key, created_at=cls.now - timedelta(days=days_ago)
+            )
+        ContactUs.objects.create(name='Bilal', phone='9876543210', api_key=cls.other_key, created_at=cls.now)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def keys(self):
+        response = self.client.get('/api/enquiries/keys/')
+        self.assertEqual(response.status_code, 200)
+        return {key['name']: key for key in response.data['results']}
+
+    def test_list_is_annotated(self):
+        keys = self.keys()
+        self.assertEqual(set(keys), {'Busy site', 'Quiet site'})
+        busy, quiet = keys['Busy site'], keys['Quiet site']
+        self.assertEqual((busy['enquiry_count'], busy['enquiries_last_7_days']), (4, 3))
+        self.assertIsNotNone(busy['last_submission_at'])
+        self.assertEqual((quiet['enquiry_count'], quiet['enquiries_last_7_days']), (0, 0))
+        self.assertIsNone(quiet['last_submission_at'])
+
+        response = self.client.get(f'/api/enquiries/keys/{self.busy_key.pk}/')
+        self.assertEqual(response.data['enquiry_count'], 4)
+
+    def test_list_costs_the_same_queries_for_any_number_of_keys(self):
+        with CaptureQueriesContext(connection) as few:
+            self.keys()
+        for number in range(5):
+            api_key = APIKey.objects.create(user=self.owner, name=f'Site {number}')
+            ContactUs.objects.create(name='Amina', phone='9876543210', api_key=api_key)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.keys()), 7)
+        self.assertEqual(len(many), len(few))
+
+    def test_created_key_reports_empty_stats(self):
+        response = self.client.post('/api/enquiries/keys/', {'name': 'New site'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['enquiry_count'], response.data['last_submission_at']), (0, None))
+
+    def test_submissions_are_counted_per_day(self):
+        today = timezone.localdate(self.now)
+        self.assertEqual(
+            dict(APIKeyDailyStat.objects.filter(api_key=self.busy_key).values_list('date', 'submissions')),
+            {today: 2, today - timedelta(days=3): 1, today - timedelta(days=10): 1},
+        )
+
+    def test_traffic_is_zero_filled(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/enquiries/keys/{self.busy_key.pk}/traffic/', {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['days'], response.data['total']), (7, 3))
+        traffic = response.data['traffic']
+        self.assertEqual([day['submissions'] for day in traffic], [0, 0, 0, 1, 0, 0, 2])
+        self.assertEqual(traffic[-1]['date'], timezone.localdate().isoformat())
+
+        response = self.client.get(f'/api/enquiries/keys/{self.busy_key.pk}/traffic/', {'days': 1000})
+        self.assertEqual((response.data['days'], response.data['total']), (366, 4))
+
+    def test_traffic_refuses_bad_days_and_other_owners_keys(self):
+        response = self.client.get(f'/api/enquiries/keys/{self.busy_key.pk}/traffic/', {'days': 'week'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'/api/enquiries/keys/{self.other_key.pk}/traffic/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ContactListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.other_owner = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+        cls.main_key = APIKey.objects.create(user=cls.owner, name='Main site')
+        cls.second_key = APIKey.objects.create(user=cls.owner, name='Second site')
+        cls.other_key = APIKey.objects.create(user=cls.other_owner, name='Other site')
+        now = timezone.now()
+        for number, (api_key, package_type, days_ago) in enumerate([
+            (cls.main_key, 'umrah', 0), (cls.main_key, 'hajj', 1), (cls.main_key, 'umrah', 40),
+            (cls.second_key, 'umrah', 2), (cls.other_key, 'umrah', 0),
+        ]):
+            ContactUs.objects.create(
+                name=f'Pilgrim {number}', phone='9876543210', api_key=api_key, package_type=package_type,
+                is_processed=number == 0, created_at=now - timedelta(days=days_ago),
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def contacts(self, **params):
+        response = self.client.get('/api/enquiries/admin/contacts/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def names(self, **params):
+        return sorted(contact['name'] for contact in self.contacts(**params).data['data'])
+
+    def test_totals_are_cached_and_adjusted(self):
+        response = self.contacts()
+        self.assertEqual((response.data['total_count'], response.data['user_api_keys']), (4, 2))
+        self.assertEqual(response.data['count'], 4)
+
+        contact = ContactUs.objects.create(name='New', phone='9876543210', api_key=self.second_key)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_contact_totals(self.owner.pk), (5, 2))
+        # Submissions made without a key are not the owner's
+        ContactUs.objects.create(name='Walk in', phone='9876543210')
+        response = self.client.delete(f'/api/enquiries/admin/contacts/{contact.pk}/')
+        self.assertEqual(response.status_code, 204)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_contact_totals(self.owner.pk), (4, 2))
+        self.assertEqual(get_contact_totals(self.other_owner.pk), (1, 1))
+
+    def test_key_changes_recount(self):
+        self.contacts()
+        APIKey.objects.create(user=self.owner, name='Third site')
+        self.assertEqual(get_contact_totals(self.owner.pk), (4, 3))
+        # Its submissions are kept but no longer belong to a key
+        self.second_key.delete()
+        self.assertEqual(get_contact_totals(self.owner.pk), (3, 2))
+        self.assertEqual(self.contacts().data['total_count'], 3)
+
+    def test_unfiltered_list_uses_the_cached_total(self):
+        self.contacts()
+        with CaptureQueriesContext(connection) as captured:
+            response = self.contacts()
+        self.assertEqual(response.data['count'], 4)
+        self.assertFalse([query for query in captured if 'COUNT(' in query['sql'].upper()])
+
+        # A filtered page counts its own rows
+        response = self.contacts(package_type='umrah')
+        self.assertEqual((response.data['count'], response.data['total_count']), (3, 4))
+
+    def test_filters(self):
+        today = timezone.localdate()
+        days_ago = {days: (today - timedelta(days=days)).isoformat() for days in (1, 2, 3)}
+        self.assertEqual(self.names(package_type='hajj'), ['Pilgrim 1'])
+        self.assertEqual(self.names(processed='true'), ['Pilgrim 0'])
+        self.assertEqual(self.names(processed='0'), ['Pilgrim 1', 'Pilgrim 2', 'Pilgrim 3'])
+        self.assertEqual(self.names(api_key=self.second_key.pk), ['Pilgrim 3'])
+        self.assertEqual(self.names(api_key=self.other_key.pk), [])
+        self.assertEqual(self.names(start_date=days_ago[2], end_date=days_ago[1]), ['Pilgrim 1', 'Pilgrim 3'])
+        self.assertEqual(self.names(end_date=days_ago[3]), ['Pilgrim 2'])
+
+    def test_bad_filters_are_refused(self):
+        for params in [{'processed': 'maybe'}, {'api_key': 'main'}, {'start_date': '01/03/2025'},
+                       {'end_date': '2025-02-30'}]:
+            with self.subTest(params=params):
+                response = self.client.get('/api/enquiries/admin/contacts/', params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.data)
+
+
+@override_settings(API_KEY_LAST_USED_FLUSH_INTERVAL=3600)
+class PublicContentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.other_owner = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+        cls.api_key = APIKey.objects.create(user=cls.owner, name='Partner site')
+        cls.other_key = APIKey.objects.create(user=cls.other_owner, name='Other site')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.older = self.package('umrah_classic', 'Classic')
+        self.newer = self.package('umrah_delux', 'Delux')
+        Package.objects.filter(pk=self.older.pk).update(updated_at=timezone.now() - timedelta(days=1))
+
+    def package(self, package_type, title, user=None):
+        return Package.objects.create(
+            user=user or self.owner, package_type=package_type, title=title, description='Makkah and Madinah',
+            price='1000.00',
+        )
+
+    def get(self, path='/api/enquiries/apikey/packages/', key=None, **headers):
+        return self.client.get(path, HTTP_X_API_KEY=str(key or self.api_key.key), **headers)
+
+    def titles(self, response):
+        return sorted(package['title'] for package in response.data['results'])
+
+    def test_headers_and_warm_cache(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(response), ['Classic', 'Delux'])
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Last-Modified'], http_date(self.newer.updated_at.timestamp()))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=120')
+        self.assertIn('X-API-Key', response['Vary'])
+
+        with self.assertNumQueries(0):
+            repeat = self.get()
+        self.assertEqual((repeat['ETag'], repeat.data), (response['ETag'], response.data))
+
+    def test_matching_etag_gets_304(self):
+        etag = self.get()['ETag']
+        for if_none_match in [etag, f'W/{etag}', f'"stale", {etag}', '*']:
+            with self.subTest(if_none_match=if_none_match):
+                response = self.get(HTTP_IF_NONE_MATCH=if_none_match)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertFalse(response.content)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_etag_differs_per_url_and_owner(self):
+        etags = {
+            self.get()['ETag'],
+            self.get('/api/enquiries/apikey/packages/umrah_delux/')['ETag'],
+            self.get('/api/enquiries/apikey/homepage/')['ETag'],
+            self.get(key=self.other_key.key)['ETag'],
+        }
+        self.assertEqual(len(etags), 4)
+        self.assertEqual(self.get(key=self.other_key.key).data['results'], [])
+
+    def test_changes_start_a_new_version(self):
+        etag = self.get()['ETag']
+        self.newer.title = 'Deluxe'
+        self.newer.save()
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(response), ['Classic', 'Deluxe'])
+
+        # Another owner's change leaves this one alone
+        etag = response['ETag']
+        self.package('umrah_classic', 'Theirs', user=self.other_owner)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_deletion_is_caught_though_last_modified_stays(self):
+        first = self.get()
+        self.older.delete()
+        response = self.get(HTTP_IF_NONE_MATCH=first['ETag'], HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Last-Modified'], first['Last-Modified'])
+        self.assertEqual(self.titles(response), ['Delux'])
+
+    def test_if_modified_since(self):
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        earlier = http_date(self.newer.updated_at.timestamp() - 60)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=earlier).status_code, 200)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE='not a date').status_code, 200)
+
+
+class TokenBucketThrottleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.api_key = APIKey.objects.create(
+            user=cls.owner, name='Partner site', throttle_burst=2, throttle_per_minute=60
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_buckets._buckets.clear()
+
+    def assert_buckets_refill(self, buckets, key):
+        # A full bucket allows a burst, then one token a second
+        self.assertIsNone(buckets.take(key, 3, 1.0, 1000.0))
+        self.assertIsNone(buckets.take(key, 3, 1.0, 1000.0))
+        self.assertIsNone(buckets.take(key, 3, 1.0, 1000.0))
+        self.assertAlmostEqual(buckets.take(key, 3, 1.0, 1000.0), 1.0)
+        self.assertAlmostEqual(buckets.take(key, 3, 1.0, 1000.5), 0.5)
+        self.assertIsNone(buckets.take(key, 3, 1.0, 1001.0))
+        self.assertIsNotNone(buckets.take(key, 3, 1.0, 1001.0))
+        # Never more than the burst, however long it was idle
+        for _ in range(3):
+            self.assertIsNone(buckets.take(key, 3, 1.0, 5000.0))
+        self.assertIsNotNone(buckets.take(key, 3, 1.0, 5000.0))
+
+    def test_local_buckets_refill(self):
+        self.assert_buckets_refill(LocalBuckets(), 'bucket')
+
+    @unittest.skipUnless(os.environ.get('REDIS_URL'), "Needs a Redis server in REDIS_URL")
+    def test_redis_buckets_refill(self):
+        redis_cache = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': os.environ['REDIS_URL']}
+        with override_settings(CACHES={'default': redis_cache}):
+            key = f'throttle-test:{os.getpid()}'
+            self.addCleanup(cache.delete, key)
+            self.assert_buckets_refill(RedisBuckets(), key)
+
+    def test_endpoint_refuses_requests_beyond_the_burst(self):
+        client = APIClient()
+        for _ in range(2):
+            response = client.get('/api/enquiries/apikey/validate-key/', HTTP_X_API_KEY=self.api_key.key)
+            self.assertEqual(response.status_code, 200)
+        response = client.get('/api/enquiries/apikey/validate-key/', HTTP_X_API_KEY=self.api_key.key)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        # Buckets are per route
+        response = client.get('/api/enquiries/apikey/bundle/', HTTP_X_API_KEY=self.api_key.key)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unreachable_redis_falls_back_to_local_buckets(self):
+        unreachable = mock.Mock(take=mock.Mock(side_effect=ConnectionError))
+        client = APIClient()
+        with mock.patch('apps.enquiries.throttling.shared_buckets', return_value=unreachable):
+            statuses = [
+                client.get('/api/enquiries/apikey/validate-key/', HTTP_X_API_KEY=self.api_key.key).status_code
+                for _ in range(3)
+            ]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(unreachable.take.call_count, 3)
+
+
+class ContactSpoolTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.api_key = APIKey.objects.create(user=cls.owner, name='Partner site')
+        cls.other_key = APIKey.objects.create(user=cls.owner, name='Second site')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spool = ContactSpool(directory.name, fsync=False)
+
+    def record(self, number, api_key=None, user_id=None):
+        return {
+            'submission_id': f'00000000-0000-4000-8000-{number:012d}',
+            'api_key_id': (api_key or self.api_key).pk,
+            'user_id': user_id,
+            'created_at': timezone.now(),
+            'data': {'name': f'Queued {number}', 'phone': '9876500000'},
+        }
+
+    def test_append_after_a_torn_line_keeps_its_own_line(self):
+        self.spool.append(self.record(1, user_id=self.owner.pk))
+        # A writer that died halfway through its line
+        with open(self.spool.path, 'ab') as spool_file:
+            spool_file.write(b'{"submission_id":"00000000-0000-4000-8000-0000000000')
+        self.spool.append(self.record(2, user_id=self.owner.pk))
+        self.spool.append(self.record(3, user_id=self.owner.pk))
+
+        with open(self.spool.path, 'rb') as spool_file:
+            self.assertEqual(len(spool_file.read().splitlines()), 4)
+        with self.assertLogs('apps.enquiries.ingestion', 'WARNING') as logs:
+            self.assertEqual(drain_contact_spool(spool=self.spool), 3)
+        self.assertIn('line 2', logs.output[0])
+        self.assertEqual(
+            sorted(ContactUs.objects.values_list('name', flat=True)), ['Queued 1', 'Queued 2', 'Queued 3']
+        )
+
+    def test_key_owners_are_read_once_per_batch(self):
+        self.assertEqual(get_contact_totals(self.owner.pk), (0, 2))
+        for number in range(10):
+            self.spool.append(self.record(number, api_key=(self.api_key, self.other_key)[number % 2]))
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(drain_contact_spool(spool=self.spool), 10)
+        owner_queries = [
+            query['sql'] for query in captured
+            if query['sql'].startswith('SELECT') and 'FROM "enquiries_apikey" WHERE' in query['sql']
+        ]
+        self.assertEqual(len(owner_queries), 1)
+        self.assertEqual(get_contact_totals(self.owner.pk), (10, 2))
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.throttling import BaseThrottle
+
+from .models import APIKey
+
+
+class LocalBuckets:
+    """In-process token buckets, used without Redis or while it is unreachable"""
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, burst, refill_per_second, now):
+        """Take a token if there is one, return the seconds to wait for it otherwise (None when taken)"""
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * refill_per_second)
+            wait = None
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / refill_per_second
+            if len(self._buckets) >= self.max_size and key not in self._buckets:
+                self._buckets.clear()
+            self._buckets[key] = (tokens, now)
+            return wait
+
+
+local_buckets = LocalBuckets()
+
+
+class RedisBuckets:
+    """
+    Token buckets in Redis, shared by all workers.
+
+    A bucket is a hash of its tokens and when they were counted. One Lua
+    script refills, takes and stores it, so each request is a single
+    atomic round trip (EVALSHA, loading the script once per server).
+    """
+    script = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local burst, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or burst
+    local updated_at = tonumber(bucket[2]) or now
+    if now > updated_at then
+        tokens = math.min(burst, tokens + (now - updated_at) * rate)
+        updated_at = now
+    end
+    local wait = ''
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = tostring((1 - tokens) / rate)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(updated_at))
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    return wait
+    """
+
+    def __init__(self):
+        self._script = None
+
+    def take(self, key, burst, refill_per_second, now):
+        """Take a token if there is one, return the seconds to wait for it otherwise (None when taken)"""
+        redis_cache = caches['default']
+        key = redis_cache.make_and_validate_key(key)
+        # The cache's own connection pool; Django has no public accessor for the client
+        client = redis_cache._cache.get_client(key, write=True)
+        if self._script is None:
+            self._script = client.register_script(self.script)
+        # Gone once it would have refilled anyway
+        timeout = int(burst / refill_per_second) + 1
+        wait = self._script(keys=[key], args=[burst, refill_per_second, now, timeout], client=client)
+        return float(wait) if wait else None
+
+
+redis_buckets = RedisBuckets()
+
+
+def shared_buckets():
+    """Buckets all workers share, or None when the default cache is not Redis"""
+    return redis_buckets if isinstance(caches['default'], RedisCache) else None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per API key, client IP and route.
+
+    A bucket holds up to `burst` tokens and refills at `per_minute` tokens
+    a minute. Limits come from the APIKey record when set there, else from
+    settings[`settings_name`]. The Retry-After header comes from wait().
+
+    With Redis as the cache the buckets live there and each request takes
+    its token in one script call. Otherwise the cache is per process
+    anyway, and so are the buckets. If Redis fails the process-local
+    buckets are used instead.
+    """
+    settings_name = 'API_KEY_THROTTLE'
+
+    def get_limits(self, request):
+        defaults = getattr(settings, self.settings_name)
+        burst, per_minute = defaults['burst'], defaults['per_minute']
+        if isinstance(request.auth, APIKey):
+            burst = request.auth.throttle_burst or burst
+            per_minute = request.auth.throttle_per_minute or per_minute
+        return burst, per_minute
+
+    def get_cache_key(self, request, view):
+        api_key_id = request.auth.pk if isinstance(request.auth, APIKey) else '-'
+        route = request.resolver_match.route if request.resolver_match else view.__class__.__name__
+        ident = f"{api_key_id}|{self.get_ident(request)}|{route}"
+        return 'throttle:bucket:%s' % hashlib.md5(ident.encode('utf-8')).hexdigest()
+
+    def allow_request(self, request, view):
+        burst, per_minute = self.get_limits(request)
+        key = self.get_cache_key(request, view)
+        now = time.time()
+        refill_per_second = per_minute / 60.0
+
+        buckets = shared_buckets() or local_buckets
+        try:
+            self.wait_seconds = buckets.take(key, burst, refill_per_second, now)
+        except Exception:
+            if buckets is local_buckets:
+                raise
+            self.wait_seconds = local_buckets.take(key, burst, refill_per_second, now)
+        return self.wait_seconds is None
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class PublicFormThrottle(TokenBucketThrottle):
+    """Token bucket for the secret-key form endpoints, by client IP and route"""
+    settings_name = 'PUBLIC_FORM_THROTTLE'
@@ -6,6 +6,9 @@ app_name = 'enquiries'
 urlpatterns = [    
     path('keys/', views.APIKeyListCreateView.as_view(), name='apikey_list_create'),
     path('keys/<int:pk>/', views.APIKeyDetailView.as_view(), name='apikey_detail'),
+    path('keys/<int:pk>/traffic/', views.APIKeyTrafficView.as_view(), name='apikey_traffic'),
+    path('keys/<int:pk>/webhooks/', views.WebhookSubscriptionListCreateView.as_view(), name='apikey_webhook_list_create'),
+    path('keys/<int:pk>/webhooks/<int:webhook_pk>/', views.WebhookSubscriptionDetailView.as_view(), name='apikey_webhook_detail'),
     
     # Package Management (For logged-in CRM Users only)
     path('admin/packages/', views.PackageListCreateView.as_view(), name='admin_package_list_create'),
@@ -14,6 +17,7 @@ urlpatterns = [
     # Homepage Management (For logged-in CRM Users only)
     path('admin/homepage/', views.HomePageListCreateView.as_view(), name='admin_homepage_list_create'),
     path('admin/homepage/<int:pk>/', views.HomePageDetailView.as_view(), name='admin_homepage_detail'),
+    path('admin/homepage/<int:pk>/video/', views.HomePageVideoView.as_view(), name='admin_homepage_video'),
     
     # Contact Management (For logged-in CRM Users only)
     path('admin/contacts/', views.ContactUsListView.as_view(), name='admin_contact_list'),
@@ -25,7 +29,9 @@ urlpatterns = [
     path('apikey/packages/', views.PackageListAPIView.as_view(), name='api_package_list'),
     path('apikey/packages/<str:package_type>/', views.PackageDetailAPIView.as_view(), name='api_package_detail'),
     path('apikey/homepage/', views.HomePageAPIView.as_view(), name='api_homepage'),
+    path('apikey/bundle/', views.PublicSiteBundleView.as_view(), name='api_site_bundle'),
     path('apikey/contact/', views.ContactUsCreateAPIView.as_view(), name='api_contact_create'),
+    path('apikey/contact/queue/', views.ContactUsEnqueueAPIView.as_view(), name='api_contact_enqueue'),
     
     # Utility Endpoints (Require API Key)
     path('apikey/validate-key/', views.validate_api_key, name='validate_api_key'),
@@ -1,18 +1,30 @@
-from datetime import timezone
+from datetime import datetime, timedelta, timezone
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
-from .models import APIKey, Package, HomePage, ContactUs, GalleryImage
+from .models import APIKey, APIKeyDailyStat, Package, HomePage, ContactUs, GalleryImage, WebhookSubscription
 from .serializers import (
-    APIKeySerializer, PackageSerializer, PackageUpdateSerializer,
-    HomePageSerializer, HomePageUpdateSerializer, 
+    APIKeySerializer, APIKeyTrafficSerializer, PackageSerializer, PackageUpdateSerializer,
+    HomePageSerializer, HomePageUpdateSerializer, HomePageVideoSerializer,
     ContactUsSerializer, ContactUsListSerializer,
-    GalleryImageSerializer
+    GalleryImageSerializer, WebhookSubscriptionSerializer
 )
 from .authentication import APIKeyAuthentication
 from .permissions import HasValidAPIKey
+from .caching import PublicContentCacheMixin, get_contact_totals
+from .bundle import choose_encoding, get_bundle
+from .ingestion import enqueue_contact
+from .throttling import TokenBucketThrottle
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import quote_etag
+from django.conf import settings
+from django.utils import timezone as django_timezone
+from django.utils.dateparse import parse_date
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticated
 from django.http import JsonResponse
@@ -21,6 +33,7 @@ from rest_framework.authentication import SessionAuthentication
 from django.contrib.auth import get_user_model
 
 from apps.common.permissions import IsSuperAdmin 
+from apps.common.pagination import CreatedAtCursorPagination, OptionalCursorPagination
 User = get_user_model()
 # API Key Management Views (For CRM users)
 
@@ -30,7 +43,7 @@ class APIKeyListCreateView(generics.ListCreateAPIView):
     authentication_classes = [JWTAuthentication, SessionAuthentication]
     
     def get_queryset(self):
-        return APIKey.objects.filter(user=self.request.user)
+        return APIKey.objects.filter(user=self.request.user).select_related('user').with_enquiry_stats()
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -41,7 +54,49 @@ class APIKeyDetailView(generics.RetrieveUpdateDestroyAPIView):
     authentication_classes = [JWTAuthentication, SessionAuthentication]
     
     def get_queryset(self):
-        return APIKey.objects.filter(user=self.request.user)
+        return APIKey.objects.filter(user=self.request.user).select_related('user').with_enquiry_stats()
+
+class APIKeyTrafficView(APIView):
+    """Daily contact submissions through one of the user's keys, ?days=30 (max 366)"""
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def get(self, request, pk):
+        api_key = get_object_or_404(APIKey, pk=pk, user=request.user)
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+        except ValueError:
+            return Response({'detail': 'days must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        traffic = APIKeyDailyStat.traffic(api_key, days)
+        return Response({
+            'api_key': api_key.pk,
+            'days': days,
+            'total': sum(day['submissions'] for day in traffic),
+            'traffic': APIKeyTrafficSerializer(traffic, many=True).data,
+        })
+
+class WebhookSubscriptionQuerysetMixin:
+    def get_queryset(self):
+        return WebhookSubscription.objects.filter(
+            api_key_id=self.kwargs['pk'], api_key__user=self.request.user
+        ).annotate(pending_deliveries=Count('deliveries', filter=Q(deliveries__status='pending')))
+
+class WebhookSubscriptionListCreateView(WebhookSubscriptionQuerysetMixin, generics.ListCreateAPIView):
+    """Endpoints notified of submissions made with one of the user's keys; the secret signs each request"""
+    serializer_class = WebhookSubscriptionSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def perform_create(self, serializer):
+        api_key = get_object_or_404(APIKey, pk=self.kwargs['pk'], user=self.request.user)
+        serializer.save(api_key=api_key)
+
+class WebhookSubscriptionDetailView(WebhookSubscriptionQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = WebhookSubscriptionSerializer
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    lookup_url_kwarg = 'webhook_pk'
 
 # Package Management Views
 class PackageListCreateView(generics.ListCreateAPIView):
@@ -86,7 +141,7 @@ class PackageDetailView(generics.RetrieveUpdateDestroyAPIView):
                          }, status=status.HTTP_200_OK)
 
 # Package Views for External Websites (API Key Required)
-class PackageListAPIView(generics.ListAPIView):
+class PackageListAPIView(PublicContentCacheMixin, generics.ListAPIView):
     """
     Get all active packages for external websites - Requires API Key
     """
@@ -95,9 +150,10 @@ class PackageListAPIView(generics.ListAPIView):
     def get_queryset(self):
         return Package.objects.filter(user=self.request.user, is_active=True)
     authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
     permission_classes = [HasValidAPIKey]
 
-class PackageDetailAPIView(generics.RetrieveAPIView):
+class PackageDetailAPIView(PublicContentCacheMixin, generics.RetrieveAPIView):
     """
     Get specific package details for external websites - Requires API Key
     """
@@ -107,6 +163,7 @@ class PackageDetailAPIView(generics.RetrieveAPIView):
     def get_queryset(self):
         return Package.objects.filter(user=self.request.user, is_active=True)
     authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
     permission_classes = [HasValidAPIKey]
 
 # HomePage Management Views
@@ -147,8 +204,24 @@ class HomePageDetailView(generics.RetrieveUpdateDestroyAPIView):
         self.perform_destroy(instance)
         return Response({'success': True}, status=status.HTTP_200_OK)
         
+class HomePageVideoView(APIView):
+    """
+    Set the background video from a completed chunked upload: {upload_id}
+    Upload with purpose=homepage_video through /api/common/uploads/ first
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+
+    def post(self, request, pk):
+        homepage = get_object_or_404(HomePage, pk=pk, user=request.user)
+        serializer = HomePageVideoSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        homepage.background_video.name = serializer.validated_data['upload_id'].file.name
+        homepage.save()
+        return Response(HomePageSerializer(homepage, context={'request': request}).data)
+
 # HomePage Views for External Websites (API Key Required)
-class HomePageAPIView(generics.ListAPIView):
+class HomePageAPIView(PublicContentCacheMixin, generics.ListAPIView):
     """
     Get homepage content for external websites - Requires API Key
     """
@@ -157,6 +230,7 @@ class HomePageAPIView(generics.ListAPIView):
     def get_queryset(self):
         return HomePage.objects.filter(user=self.request.user, is_active=True)
     authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
     permission_classes = [HasValidAPIKey]
 
 # Contact Us Views
@@ -167,6 +241,7 @@ class ContactUsCreateAPIView(generics.CreateAPIView):
     serializer_class = ContactUsSerializer
     queryset = ContactUs.objects.all()
     authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
     permission_classes = [HasValidAPIKey]
     
     def perform_create(self, serializer):
@@ -175,35 +250,113 @@ class ContactUsCreateAPIView(generics.CreateAPIView):
 
         serializer.save(api_key=api_key, submitted_by_user=submitted_by_user)
 
+class ContactUsEnqueueAPIView(APIView):
+    """
+    Queue a contact form submission from external websites - Requires API Key
+    Validates and returns 202; drain_contact_queue writes the ContactUs rows in batches
+    """
+    authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
+    permission_classes = [HasValidAPIKey]
+
+    def post(self, request):
+        serializer = ContactUsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        submission_id = enqueue_contact(serializer.validated_data, request.auth)
+        return Response({
+            'message': 'Submission received',
+            'submission_id': submission_id
+        }, status=status.HTTP_202_ACCEPTED)
+
 class ContactUsListView(generics.ListAPIView):
     """
     Get contact submissions based on user's API keys - For logged-in users only
-    Shows only contacts submitted through their API keys
+    Shows only contacts submitted through their API keys, newest first, in cursor pages
+    Filters: package_type, processed, api_key, start_date, end_date (YYYY-MM-DD, inclusive)
     """
     serializer_class = ContactUsListSerializer
+    pagination_class = CreatedAtCursorPagination
+    filter_backends = []
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication, SessionAuthentication]
+    filter_params = ('package_type', 'processed', 'api_key', 'start_date', 'end_date')
     
     def get_queryset(self):
         user = self.request.user
-        # Get all API keys belonging to the logged-in user
-        user_api_keys = APIKey.objects.filter(user=user)
-        # Return contacts submitted through user's API keys
-        return ContactUs.objects.filter(
+        # Contacts submitted through user's API keys, keys resolved in a subquery
+        user_api_keys = APIKey.objects.filter(user=user).values('pk')
+        queryset = ContactUs.objects.filter(
             api_key__in=user_api_keys
-        ).order_by('-created_at')
+        ).select_related('api_key', 'submitted_by_user')
+        return self.apply_filters(queryset)
+
+    def apply_filters(self, queryset):
+        params = self.request.query_params
+
+        package_type = params.get('package_type')
+        if package_type:
+            queryset = queryset.filter(package_type=package_type)
+
+        processed = params.get('processed')
+        if processed:
+            if processed.lower() not in ('true', 'false', '1', '0'):
+                raise ValidationError({'processed': 'Use true or false.'})
+            queryset = queryset.filter(is_processed=processed.lower() in ('true', '1'))
+
+        api_key = params.get('api_key')
+        if api_key:
+            if not api_key.isdigit():
+                raise ValidationError({'api_key': 'Must be an API key id.'})
+            queryset = queryset.filter(api_key_id=api_key)
+
+        # Whole days as created_at ranges, so the created_at index is used
+        start_date = self.parse_date_param('start_date')
+        if start_date:
+            queryset = queryset.filter(created_at__gte=self.start_of_day(start_date))
+        end_date = self.parse_date_param('end_date')
+        if end_date:
+            queryset = queryset.filter(created_at__lt=self.start_of_day(end_date + timedelta(days=1)))
+        return queryset
+
+    def parse_date_param(self, name):
+        value = self.request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            # Well formed but not a real day, such as 2025-02-30
+            parsed = None
+        if parsed is None:
+            raise ValidationError({name: 'Use the YYYY-MM-DD format.'})
+        return parsed
+
+    @staticmethod
+    def start_of_day(day):
+        return django_timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    @property
+    def is_filtered(self):
+        return any(self.request.query_params.get(name) for name in self.filter_params)
     
     def list(self, request, *args, **kwargs):
+        total_count, user_api_keys_count = get_contact_totals(request.user.pk)
+        if not self.is_filtered:
+            # The maintained total stands in for the paginator's COUNT
+            self.pagination_count = total_count
+
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        
-        # Add additional context
-        user_api_keys_count = APIKey.objects.filter(user=request.user).count()
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        paginator = self.paginator
         
         return Response({
             'message': f'Contact submissions from your {user_api_keys_count} API key(s)',
-            'total_count': queryset.count(),
+            'total_count': total_count,
+            'count': paginator.count,
             'user_api_keys': user_api_keys_count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
             'data': serializer.data
         })
 
@@ -242,6 +395,7 @@ class ContactUsAdminView(generics.ListAPIView):
     """
     queryset = None  # ✅ This tells DRF not to expect a static queryset
     serializer_class = ContactUsListSerializer
+    pagination_class = OptionalCursorPagination
     permission_classes = [IsAuthenticated]
     authentication_classes = [JWTAuthentication, SessionAuthentication]
 
@@ -306,9 +460,42 @@ class ContactUsAdminDetailView(generics.RetrieveUpdateDestroyAPIView):
         return Response(data)
 
 
+class PublicSiteBundleView(APIView):
+    """
+    Get packages, homepage and gallery in one response for external websites - Requires API Key
+    Served from a prebuilt snapshot, brotli or gzip encoded when the client accepts it
+    """
+    authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
+    permission_classes = [HasValidAPIKey]
+
+    def get(self, request):
+        bundle = get_bundle(request.user.pk)
+        etag = quote_etag(bundle['etag'])
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in [value.strip().removeprefix('W/') for value in if_none_match.split(',')]:
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            available = ['br', 'gzip'] if bundle['content_br'] else ['gzip']
+            encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'), available)
+            if encoding:
+                response = HttpResponse(bundle[f'content_{encoding}'], content_type='application/json')
+                response['Content-Encoding'] = encoding
+            else:
+                response = HttpResponse(bundle['content'], content_type='application/json')
+            response['Content-Length'] = len(response.content)
+
+        response['ETag'] = etag
+        response['Cache-Control'] = f'public, max-age={settings.PUBLIC_CONTENT_MAX_AGE}'
+        patch_vary_headers(response, ['Accept-Encoding', 'X-API-Key'])
+        return response
+
+
 # API Key Validation
 @api_view(['GET'])
 @authentication_classes([APIKeyAuthentication])
+@throttle_classes([TokenBucketThrottle])
 @permission_classes([HasValidAPIKey])
 def validate_api_key(request):
     """
@@ -325,6 +512,7 @@ def validate_api_key(request):
 # Health check endpoint for websites
 @api_view(['GET'])
 @authentication_classes([APIKeyAuthentication])
+@throttle_classes([TokenBucketThrottle])
 @permission_classes([HasValidAPIKey])
 def api_health_check(request):
     """
@@ -364,13 +552,14 @@ class GalleryImageDetailView(generics.RetrieveUpdateDestroyAPIView):
         return GalleryImage.objects.filter(user=self.request.user)
 
 # Gallery API for External Websites
-class GalleryImageAPIView(generics.ListAPIView):
+class GalleryImageAPIView(PublicContentCacheMixin, generics.ListAPIView):
     """
     Get gallery images for external websites - Requires API Key.
     Only shows images belonging to the API key owner.
     """
     serializer_class = GalleryImageSerializer
     authentication_classes = [APIKeyAuthentication]
+    throttle_classes = [TokenBucketThrottle]
     permission_classes = [HasValidAPIKey]
 
     def get_queryset(self):
@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver:
+    """
+    Local webhook endpoint that records what it receives, for tests and benchmarks.
+
+    Answers with the status codes in `responses` in turn, then with
+    `default_status`; `delay` seconds of latency are added to every reply.
+    Use as a context manager; `url` is valid inside the block.
+    """
+    def __init__(self, default_status=200, responses=None, delay=0):
+        self.default_status = default_status
+        self.responses = list(responses or [])
+        self.delay = delay
+        self.requests = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/hooks/"
+
+    def events(self):
+        """Every event received, in arrival order"""
+        with self.lock:
+            return [event for _, body in self.requests for event in json.loads(body)['events']]
+
+    def reply_status(self):
+        with self.lock:
+            return self.responses.pop(0) if self.responses else self.default_status
+
+    def __enter__(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so connection pooling shows
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if receiver.delay:
+                    time.sleep(receiver.delay)
+                status = receiver.reply_status()
+                if 200 <= status < 300:
+                    with receiver.lock:
+                        receiver.requests.append((dict(self.headers), body))
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,282 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import urllib3
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WebhookDelivery, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+USER_AGENT = 'UmrahServices-Webhooks/1.0'
+
+_http = None
+_http_lock = threading.Lock()
+
+
+def get_http():
+    """Pooled connections shared by every dispatch, kept alive between batches"""
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = urllib3.PoolManager(
+                num_pools=settings.WEBHOOK_HTTP_POOLS,
+                maxsize=settings.WEBHOOK_WORKERS,
+                timeout=urllib3.Timeout(
+                    connect=settings.WEBHOOK_TIMEOUT['connect'], read=settings.WEBHOOK_TIMEOUT['read']
+                ),
+                retries=False,
+                headers={'User-Agent': USER_AGENT},
+            )
+        return _http
+
+
+class UnsafeWebhookURL(ValueError):
+    """A webhook URL the dispatcher refuses to post to"""
+
+
+def resolve_webhook_url(url):
+    """
+    Return (url parts, address to connect to) for a webhook URL.
+
+    Only https URLs whose host resolves to public addresses are accepted,
+    so a subscription cannot point the dispatcher at this server, the
+    private network or a cloud metadata endpoint. Checked when a
+    subscription is saved and again before each post, which connects to
+    the checked address so the name cannot resolve elsewhere in between.
+    WEBHOOK_ALLOW_LOCAL_URLS lifts the checks for local stub receivers.
+    """
+    try:
+        parts = urllib3.util.parse_url(url)
+    except urllib3.exceptions.LocationParseError:
+        raise UnsafeWebhookURL("Enter a valid URL.")
+    allow_local = settings.WEBHOOK_ALLOW_LOCAL_URLS
+    if parts.scheme != 'https' and not (allow_local and parts.scheme == 'http'):
+        raise UnsafeWebhookURL("Webhook URLs must use https.")
+    if not parts.host:
+        raise UnsafeWebhookURL("Enter a valid URL.")
+    host = parts.host.strip('[]')
+    try:
+        addresses = {
+            info[4][0].split('%', 1)[0]
+            for info in socket.getaddrinfo(host, parts.port or 443, type=socket.SOCK_STREAM)
+        }
+    except (socket.gaierror, UnicodeError):
+        raise UnsafeWebhookURL(f"Could not resolve {host}.")
+    if not allow_local:
+        for address in addresses:
+            ip = ipaddress.ip_address(address)
+            if not ip.is_global or ip.is_multicast:
+                raise UnsafeWebhookURL(f"{host} resolves to a private or reserved address.")
+    return parts, sorted(addresses)[0]
+
+
+def sign(secret, timestamp, body):
+    """'t=<unix time>,v1=<hex HMAC-SHA256 of "<t>." + body>'"""
+    digest = hmac.new(secret.encode('utf-8'), f"{timestamp}.".encode('utf-8') + body, hashlib.sha256)
+    return f"t={timestamp},v1={digest.hexdigest()}"
+
+
+def verify_signature(secret, header, body, tolerance=300, now=None):
+    """What a receiver does with the X-Webhook-Signature header; False if forged or too old"""
+    try:
+        parts = dict(part.split('=', 1) for part in (header or '').split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > tolerance:
+        return False
+    expected = sign(secret, timestamp, body).split('v1=', 1)[1]
+    return hmac.compare_digest(expected, parts.get('v1', ''))
+
+
+def backoff_delay(attempts):
+    """Seconds before retry number `attempts`: doubling from WEBHOOK_BACKOFF_BASE, capped, jittered"""
+    delay = min(settings.WEBHOOK_BACKOFF_BASE * 2 ** (attempts - 1), settings.WEBHOOK_BACKOFF_MAX)
+    # Spread retries of deliveries that failed together
+    return random.uniform(delay / 2, delay)
+
+
+def claim_due_deliveries(limit, subscription_ids=None):
+    """
+    Lease up to `limit` due deliveries to this dispatcher, oldest first.
+
+    Claimed rows get next_attempt_at pushed WEBHOOK_LEASE_SECONDS ahead,
+    so other dispatchers skip them, and a dispatcher that dies mid-batch
+    only delays them until the lease runs out. `subscription_ids` limits
+    the claim to those subscriptions.
+    """
+    now = timezone.now()
+    due = WebhookDelivery.objects.filter(status='pending', next_attempt_at__lte=now, subscription__is_active=True)
+    if subscription_ids is not None:
+        due = due.filter(subscription_id__in=subscription_ids)
+    with transaction.atomic():
+        ids = list(
+            due.select_for_update(skip_locked=True, of=('self',))
+            .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        WebhookDelivery.objects.filter(pk__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=settings.WEBHOOK_LEASE_SECONDS)
+        )
+    return list(WebhookDelivery.objects.filter(pk__in=ids).select_related('subscription').order_by('id'))
+
+
+def encode_batch(deliveries):
+    return json.dumps({
+        'events': [
+            {'id': delivery.pk, 'event': delivery.event, 'created_at': delivery.created_at, 'data': delivery.payload}
+            for delivery in deliveries
+        ]
+    }, cls=DjangoJSONEncoder, separators=(',', ':')).encode('utf-8')
+
+
+def post_batch(url, secret, deliveries):
+    """POST one batch, return (HTTP status or None, error message or '')"""
+    try:
+        parts, address = resolve_webhook_url(url)
+    except UnsafeWebhookURL as exc:
+        return None, f"Refused: {exc}"[:1000]
+    body = encode_batch(deliveries)
+    headers = {
+        'Content-Type': 'application/json',
+        'Host': parts.netloc,
+        SIGNATURE_HEADER: sign(secret, int(time.time()), body),
+    }
+    host = parts.host.strip('[]')
+    # TLS still checks the certificate against the host name
+    tls = {'server_hostname': host, 'assert_hostname': host} if parts.scheme == 'https' else None
+    try:
+        # To the address just checked, so the name cannot resolve elsewhere in between
+        pool = get_http().connection_from_host(address, parts.port, parts.scheme, pool_kwargs=tls)
+        response = pool.urlopen('POST', parts.request_uri, body=body, headers=headers, preload_content=False)
+    except urllib3.exceptions.HTTPError as exc:
+        return None, f"{type(exc).__name__}: {exc}"[:1000]
+    try:
+        # Read the body away so the connection goes back to the pool
+        response.drain_conn()
+    finally:
+        response.release_conn()
+    if 200 <= response.status < 300:
+        return response.status, ''
+    return response.status, f"HTTP {response.status}"
+
+
+def deliver_to_endpoint(subscription, deliveries):
+    """
+    Send one endpoint's deliveries in WEBHOOK_BATCH_SIZE batches, in order.
+
+    Runs on a worker thread and touches no database. Stops at the first
+    failed batch; returns [(deliveries, status, error)] for the batches
+    sent and the deliveries left unsent.
+    """
+    results = []
+    size = settings.WEBHOOK_BATCH_SIZE
+    for start in range(0, len(deliveries), size):
+        batch = deliveries[start:start + size]
+        status, error = post_batch(subscription.url, subscription.secret, batch)
+        results.append((batch, status, error))
+        if error:
+            return results, deliveries[start + size:]
+    return results, []
+
+
+def record_results(results, unsent):
+    """Mark delivered batches, schedule retries for failed ones, release the unsent"""
+    now = timezone.now()
+    summary = {'delivered': 0, 'retrying': 0, 'failed': 0}
+    succeeded, retry_at = set(), {}
+    for batch, status, error in results:
+        ids = [delivery.pk for delivery in batch]
+        if not error:
+            WebhookDelivery.objects.filter(pk__in=ids).update(
+                status='delivered', delivered_at=now, attempts=F('attempts') + 1,
+                response_status=status, last_error='',
+            )
+            summary['delivered'] += len(ids)
+            succeeded.add(batch[0].subscription_id)
+            continue
+
+        logger.warning("Webhook batch to subscription %s failed: %s", batch[0].subscription_id, error)
+        by_attempt = {}
+        for delivery in batch:
+            by_attempt.setdefault(delivery.attempts + 1, []).append(delivery.pk)
+        for attempts, attempt_ids in by_attempt.items():
+            changes = {'attempts': attempts, 'response_status': status, 'last_error': error}
+            if attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                changes['status'] = 'failed'
+                summary['failed'] += len(attempt_ids)
+            else:
+                changes['next_attempt_at'] = now + timedelta(seconds=backoff_delay(attempts))
+                summary['retrying'] += len(attempt_ids)
+            WebhookDelivery.objects.filter(pk__in=attempt_ids).update(**changes)
+        retry_at[batch[0].subscription_id] = now + timedelta(seconds=backoff_delay(min(by_attempt)))
+
+    # Not attempted because an earlier batch to the endpoint failed: they wait
+    # alongside it, without an attempt counted
+    unsent_ids = {}
+    for delivery in unsent:
+        unsent_ids.setdefault(delivery.subscription_id, []).append(delivery.pk)
+    for subscription_id, ids in unsent_ids.items():
+        WebhookDelivery.objects.filter(pk__in=ids).update(next_attempt_at=retry_at[subscription_id])
+    if succeeded:
+        WebhookSubscription.objects.filter(pk__in=succeeded).update(last_success_at=now)
+    if retry_at:
+        WebhookSubscription.objects.filter(pk__in=retry_at).update(last_failure_at=now)
+    return summary
+
+
+def dispatch_webhooks(limit=None, subscription_ids=None):
+    """
+    Deliver every due webhook, return counts of delivered, retrying and failed deliveries.
+
+    Each pass claims up to `limit` deliveries and sends them per endpoint,
+    endpoints in parallel on WEBHOOK_WORKERS threads; `subscription_ids`
+    restricts dispatch to those subscriptions. Delivery is at least once:
+    receivers should ignore event ids they have already seen.
+    """
+    limit = limit or settings.WEBHOOK_CLAIM_SIZE
+    totals = {'delivered': 0, 'retrying': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=settings.WEBHOOK_WORKERS, thread_name_prefix='webhooks') as pool:
+        while True:
+            deliveries = claim_due_deliveries(limit, subscription_ids)
+            if not deliveries:
+                return totals
+            by_subscription = {}
+            for delivery in deliveries:
+                by_subscription.setdefault(delivery.subscription_id, []).append(delivery)
+            futures = [
+                pool.submit(deliver_to_endpoint, batch[0].subscription, batch)
+                for batch in by_subscription.values()
+            ]
+            results, unsent = [], []
+            for future in futures:
+                endpoint_results, endpoint_unsent = future.result()
+                results.extend(endpoint_results)
+                unsent.extend(endpoint_unsent)
+            for name, count in record_results(results, unsent).items():
+                totals[name] += count
+
+
+def purge_deliveries(days):
+    """Delete delivered and failed deliveries older than `days`, return how many"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = WebhookDelivery.objects.filter(
+        status__in=['delivered', 'failed'], created_at__lt=cutoff
+    ).delete()
+    return deleted
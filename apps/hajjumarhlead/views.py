@@ -3,12 +3,14 @@ from rest_framework.response import Response
 from .models import HajjUmrahBookingDemo, HajjUmrahBookingService
 from .serializers import HajjUmrahBookingDemoSerializer, HajjUmrahBookingServiceSerializer
 from .permissions import IsSuperAdmin, HasValidSecretKey
+from apps.enquiries.throttling import PublicFormThrottle
 
 
 class HajjUmrahBookingDemoCreateView(generics.CreateAPIView):
     queryset = HajjUmrahBookingDemo.objects.all()
     serializer_class = HajjUmrahBookingDemoSerializer
     permission_classes = [HasValidSecretKey]
+    throttle_classes = [PublicFormThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -33,6 +35,7 @@ class HajjUmrahBookingServiceCreateView(generics.CreateAPIView):
     queryset = HajjUmrahBookingService.objects.all()
     serializer_class = HajjUmrahBookingServiceSerializer
     permission_classes = [HasValidSecretKey]
+    throttle_classes = [PublicFormThrottle]
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
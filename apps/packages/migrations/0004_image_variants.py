@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-19 05:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_alter_package_discount_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
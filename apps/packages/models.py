@@ -22,6 +22,7 @@ class Package(TimestampMixin):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     discount_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,default=0.00)
     image = models.ImageField(upload_to='packages/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     is_active = models.BooleanField(default=True)
     
     # User who created the package (superadmin or others)
@@ -30,5 +31,8 @@ class Package(TimestampMixin):
     # Optional: Owner to whom it is assigned (agency, franchise, or freelancer)
     assigned_to = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_packages')
 
+    # Resized copies built in the background, see apps.common.images
+    image_variant_fields = {'image': 'image_variants'}
+
     def __str__(self):
         return self.name
@@ -4,6 +4,7 @@ from django.core.files.base import ContentFile
 from rest_framework import serializers
 from .models import Package
 from apps.users.serializers import UserSerializer  # Adjust import path as needed
+from apps.common.serializers import ImageSrcsetField
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -42,6 +43,7 @@ class PackageSerializer(serializers.ModelSerializer):
     
     # Use custom base64 image field
     image = Base64ImageField(required=False, allow_null=True)
+    image_srcset = ImageSrcsetField('image')
     
     class Meta:
         model = Package
@@ -56,6 +58,7 @@ class PackageSerializer(serializers.ModelSerializer):
             'price',
             'discount_price',
             'image',
+            'image_srcset',
             'is_active',
             'created_by',
             'assigned_to',
@@ -172,6 +175,7 @@ class PackageListSerializer(serializers.ModelSerializer):
     
     # Use custom base64 image field for consistent handling
     image = Base64ImageField(required=False, allow_null=True)
+    image_srcset = ImageSrcsetField('image')
     
     class Meta:
         model = Package
@@ -186,6 +190,7 @@ class PackageListSerializer(serializers.ModelSerializer):
             'price',
             'discount_price',
             'image',
+            'image_srcset',
             'is_active',
             'created_by_name',
             'assigned_to_name',
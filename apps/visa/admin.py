@@ -1,7 +1,7 @@
 # admin.py - Add this to your existing admin configuration
 
 from django.contrib import admin
-from .models import Payment
+from .models import Payment, VisaEvent
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -75,4 +75,13 @@ class PaymentAdmin(admin.ModelAdmin):
             from django.utils import timezone
             obj.processed_by = request.user
             obj.processed_at = timezone.now()
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(VisaEvent)
+class VisaEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'application', 'document', 'action', 'from_status', 'to_status', 'actor', 'created_at']
+    list_filter = ['action', 'to_status', 'created_at']
+    search_fields = ['application__application_number', 'remarks']
+    raw_id_fields = ['application', 'document', 'actor']
+    readonly_fields = ['created_at']
@@ -0,0 +1,211 @@
+import io
+import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from apps.common.scanning import ScanRejected, sniff_content_type, scan_file
+from apps.common.storage import release_unreferenced
+
+from .models import VisaDocument
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_CONTENT_TYPES = {'application/pdf', 'image/jpeg', 'image/png', 'image/webp'}
+NORMALIZED_DIR = 'visa_documents/normalized'
+THUMBNAIL_DIR = 'visa_documents/thumbnails'
+IMAGE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError, OSError)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.VISA_DOCUMENT_WORKERS, thread_name_prefix='visa-documents'
+            )
+        return _executor
+
+
+def validate_source(storage, name):
+    """
+    Return the content type of a stored source file.
+
+    Refuses anything but a readable PDF or image, whatever its name or
+    declared type says.
+    """
+    with storage.open(name, 'rb') as source:
+        content_type = sniff_content_type(source.read(16))
+        if content_type not in DOCUMENT_CONTENT_TYPES:
+            raise ScanRejected("Only PDF, JPEG, PNG and WebP files are accepted.")
+        if content_type.startswith('image/'):
+            source.seek(0)
+            try:
+                with Image.open(source) as image:
+                    image.verify()
+            except IMAGE_ERRORS:
+                raise ScanRejected("The image is damaged or too large to read.")
+    return content_type
+
+
+def normalize_image(source, max_edge):
+    """Upright RGB copy no larger than max_edge, with EXIF and other metadata left behind"""
+    with Image.open(source) as image:
+        if image.format == 'JPEG':
+            # Let the decoder downscale by a power of two, no smaller than we need
+            scale = max_edge / max(image.size)
+            image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            # Flatten any transparency onto white, as a scan would be
+            converted = image.convert('RGBA')
+            image = Image.new('RGB', image.size, (255, 255, 255))
+            image.paste(converted, mask=converted.getchannel('A'))
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        # A new image without the source's info, so nothing is carried over
+        return Image.frombytes('RGB', image.size, image.tobytes())
+
+
+def encode_jpeg(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def encode_pdf(pages, quality):
+    buffer = io.BytesIO()
+    pages[0].save(
+        buffer, 'PDF', save_all=True, append_images=pages[1:], quality=quality,
+        resolution=settings.VISA_DOCUMENT_PDF_DPI,
+    )
+    return buffer.getvalue()
+
+
+def normalize_document(document, names, content_types, storage):
+    """
+    Store the normalized document file and its thumbnail, return the field changes.
+
+    Images are downscaled to VISA_DOCUMENT_MAX_EDGE for their document
+    type and recompressed; several images become one PDF, a page each.
+    A PDF upload is kept as it is.
+    """
+    if any(content_type == 'application/pdf' for content_type in content_types):
+        return {'normalized_at': timezone.now()}
+
+    sizes = settings.VISA_DOCUMENT_MAX_EDGE
+    max_edge = sizes.get(document.document_type, sizes['default'])
+    pages = []
+    for name in names:
+        with storage.open(name, 'rb') as source:
+            pages.append(normalize_image(source, max_edge))
+
+    quality = settings.VISA_DOCUMENT_JPEG_QUALITY
+    stem = os.path.splitext(os.path.basename(names[0]))[0]
+    if len(pages) == 1:
+        content, extension = encode_jpeg(pages[0], quality), 'jpg'
+    else:
+        content, extension = encode_pdf(pages, quality), 'pdf'
+    thumbnail = pages[0].copy()
+    thumbnail.thumbnail((settings.VISA_DOCUMENT_THUMBNAIL_EDGE,) * 2, Image.LANCZOS)
+    return {
+        'document_file': storage.save(f"{NORMALIZED_DIR}/{stem}.{extension}", ContentFile(content)),
+        'thumbnail': storage.save(f"{THUMBNAIL_DIR}/{stem}.jpg", ContentFile(encode_jpeg(thumbnail, quality))),
+        'normalized_at': timezone.now(),
+    }
+
+
+def process_document(pk):
+    """
+    Validate, virus-scan and normalize one stored document, record the outcome.
+
+    The uploaded files stay in source_files for audit. A rejected document
+    is left without a file, its files deleted once nothing else (such as
+    their chunked upload) refers to them. A scanner that could not run leaves the document
+    in 'error' for scan_visa_documents to retry. Returns the new
+    scan_status, or None if the document or its file changed meanwhile.
+    """
+    document = VisaDocument.objects.filter(pk=pk).first()
+    if document is None or not document.document_file:
+        return None
+    storage = document.document_file.storage
+    current = document.document_file.name
+    names = list(document.source_files) or [current]
+    try:
+        content_types = [validate_source(storage, name) for name in names]
+        if len(names) > 1 and 'application/pdf' in content_types:
+            raise ScanRejected("Pages of a multi-page document must be images.")
+        for name in names:
+            with storage.open(name, 'rb') as source:
+                scan_file(source)
+        scan_status, scan_error = 'clean', ''
+    except ScanRejected as error:
+        scan_status, scan_error = 'rejected', str(error)[:255]
+    except Exception as error:
+        logger.warning("Could not scan visa document %s", pk, exc_info=True)
+        scan_status, scan_error = 'error', f"{type(error).__name__}: {error}"[:255]
+
+    now = timezone.now()
+    changes = {
+        'scan_status': scan_status, 'scan_error': scan_error, 'scanned_at': now, 'updated_at': now,
+        'source_files': names,
+    }
+    if scan_status == 'clean':
+        try:
+            changes.update(normalize_document(document, names, content_types, storage))
+        except IMAGE_ERRORS:
+            # Still a valid, scanned file; serve it as uploaded
+            logger.warning("Could not normalize visa document %s", pk, exc_info=True)
+    elif scan_status == 'rejected':
+        # The files are deleted below, leave no names pointing at them
+        changes.update({'document_file': '', 'thumbnail': '', 'source_files': [], 'normalized_at': None})
+
+    # Only if the file is still the one we processed
+    updated = VisaDocument.objects.filter(pk=pk, document_file=current).update(**changes)
+    created = [changes[field] for field in ('document_file', 'thumbnail') if changes.get(field)]
+    if not updated:
+        for name in created:
+            release_unreferenced(name, storage)
+        return None
+
+    # Earlier normalized output replaced by this run
+    replaced = [current] if current not in names and changes.get('document_file', current) != current else []
+    if document.thumbnail and document.thumbnail.name not in created:
+        replaced.append(document.thumbnail.name)
+    if scan_status == 'rejected':
+        replaced.extend(names)
+    for name in replaced:
+        # A source is also the file of its chunked upload, which keeps it
+        release_unreferenced(name, storage)
+    return scan_status
+
+
+def process_document_in_worker(pk):
+    try:
+        process_document(pk)
+    except Exception:
+        logger.exception("Processing visa document %s failed", pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_document_check(document):
+    """Process the document after the surrounding transaction commits, off the request thread"""
+    pk = document.pk
+
+    def submit():
+        if settings.VISA_DOCUMENT_ASYNC:
+            get_executor().submit(process_document_in_worker, pk)
+        else:
+            process_document(pk)
+
+    transaction.on_commit(submit)
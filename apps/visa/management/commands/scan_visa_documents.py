@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from apps.visa.documents import process_document
+from apps.visa.models import VisaDocument
+
+
+class Command(BaseCommand):
+    help = "Validate, virus-scan and normalize visa documents that are unchecked or whose scan failed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', dest='statuses', action='append', choices=['pending', 'error', 'clean'],
+                            help="Scan documents in this state (default pending and error); may be repeated")
+
+    def handle(self, *args, **options):
+        statuses = options['statuses'] or ['pending', 'error']
+        results = {}
+        ids = list(VisaDocument.objects.filter(scan_status__in=statuses).order_by('pk').values_list('pk', flat=True))
+        for pk in ids:
+            scan_status = process_document(pk)
+            results[scan_status] = results.get(scan_status, 0) + 1
+        summary = ', '.join(f"{status or 'skipped'} {count}" for status, count in sorted(results.items(), key=str))
+        self.stdout.write(f"Checked {len(ids)} document(s){': ' + summary if summary else ''}")
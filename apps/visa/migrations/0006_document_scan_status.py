@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visa', '0005_payment_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visadocument',
+            name='scan_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='visadocument',
+            name='scan_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('clean', 'Clean'), ('rejected', 'Rejected'), ('error', 'Scan failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='visadocument',
+            name='scanned_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-19 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visa', '0006_document_scan_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visadocument',
+            name='normalized_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='visadocument',
+            name='source_files',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='visadocument',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='visa_documents/thumbnails/'),
+        ),
+    ]
@@ -1,6 +1,17 @@
+import uuid
+
 from django.db import models 
 from apps.common.mixins import TimestampMixin 
  
+class VisaApplicationQuerySet(models.QuerySet):
+    def with_document_counts(self):
+        """Annotate documents_count and verified_documents_count in the same query"""
+        return self.annotate(
+            documents_count=models.Count('documents'),
+            verified_documents_count=models.Count('documents', filter=models.Q(documents__is_verified=True)),
+        )
+
+
 class VisaApplication(TimestampMixin): 
     STATUS_CHOICES = [ 
         ('submitted', 'Submitted'),
@@ -35,17 +46,50 @@ class VisaApplication(TimestampMixin):
     remarks = models.TextField(blank=True, null=True) 
     processed_by = models.ForeignKey('users.User', related_name='processed_applications', on_delete=models.SET_NULL, null=True, blank=True)  # SuperAdmin
     processed_at = models.DateTimeField(null=True, blank=True)
+
+    # Status changes a superadmin may make; statuses not listed here are unrestricted
+    STATUS_TRANSITIONS = {
+        'submitted': ['under_review', 'rejected'],
+        'under_review': ['approved', 'rejected'],
+        'approved': ['issued', 'rejected'],
+    }
+
+    objects = VisaApplicationQuerySet.as_manager()
  
     def __str__(self): 
         return f"Visa Application {self.application_number} - {self.applicant_name}" 
  
     def save(self, *args, **kwargs): 
         if not self.application_number: 
-            import uuid 
-            self.application_number = f"VA{str(uuid.uuid4())[:8].upper()}" 
+            self.application_number = self.generate_application_number()
          
-        self.total_fee = self.processing_fee + self.embassy_fee + self.service_fee 
+        self.total_fee = self.calculate_total_fee()
         super().save(*args, **kwargs) 
+
+    @classmethod
+    def transition_error(cls, current_status, new_status):
+        """Why current_status cannot change to new_status, or None if it can"""
+        allowed = cls.STATUS_TRANSITIONS.get(current_status)
+        if allowed is not None and new_status not in allowed:
+            return f"Cannot change status from {current_status} to {new_status}"
+        return None
+
+    def calculate_total_fee(self):
+        return self.processing_fee + self.embassy_fee + self.service_fee
+
+    @staticmethod
+    def generate_application_number():
+        return f"VA{str(uuid.uuid4())[:8].upper()}"
+
+    @classmethod
+    def generate_application_numbers(cls, count):
+        """count distinct unused application numbers, checked against the table one query per round"""
+        numbers = set()
+        while len(numbers) < count:
+            candidates = {cls.generate_application_number() for _ in range(count - len(numbers))} - numbers
+            taken = cls.objects.filter(application_number__in=candidates).values_list('application_number', flat=True)
+            numbers |= candidates.difference(taken)
+        return list(numbers)
  
     class Meta:
         ordering = ['-created_at']
@@ -65,6 +109,13 @@ class VisaDocument(TimestampMixin):
         ('flight_booking', 'Flight Booking'), 
         ('other', 'Other'), 
     ] 
+
+    SCAN_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('clean', 'Clean'),
+        ('rejected', 'Rejected'),
+        ('error', 'Scan failed'),
+    ]
  
     visa_application = models.ForeignKey(VisaApplication, related_name='documents', on_delete=models.CASCADE) 
     document_type = models.CharField(max_length=50, choices=DOCUMENT_TYPE_CHOICES) 
@@ -73,6 +124,18 @@ class VisaDocument(TimestampMixin):
     is_verified = models.BooleanField(default=False) 
     verified_by = models.ForeignKey('users.User', related_name='verified_documents', on_delete=models.SET_NULL, null=True, blank=True)
     verified_at = models.DateTimeField(null=True, blank=True)
+    # Set off the request thread by apps.visa.documents
+    scan_status = models.CharField(max_length=10, choices=SCAN_STATUS_CHOICES, default='pending')
+    scan_error = models.CharField(max_length=255, blank=True)
+    scanned_at = models.DateTimeField(null=True, blank=True)
+    # The files as uploaded, one per page, kept for audit; document_file becomes
+    # their normalized version (a JPEG, or a PDF for several pages)
+    source_files = models.JSONField(default=list, blank=True)
+    thumbnail = models.ImageField(upload_to='visa_documents/thumbnails/', blank=True, null=True)
+    normalized_at = models.DateTimeField(null=True, blank=True)
+
+    # Storage names kept alive by this row besides its file fields, see apps.common.storage
+    stored_name_fields = ('source_files',)
  
     def __str__(self): 
         return f"{self.get_document_type_display()} - {self.visa_application.application_number}"
@@ -81,6 +144,31 @@ class VisaDocument(TimestampMixin):
         ordering = ['-created_at']
 
 
+class VisaEvent(models.Model):
+    """One processing step on an application or its documents, for the audit trail"""
+    ACTION_CHOICES = [
+        ('status_changed', 'Status changed'),
+        ('document_verified', 'Document verified'),
+        ('document_rejected', 'Document rejected'),
+    ]
+
+    application = models.ForeignKey(VisaApplication, related_name='events', on_delete=models.CASCADE)
+    document = models.ForeignKey(VisaDocument, related_name='events', on_delete=models.SET_NULL, null=True, blank=True)
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20, blank=True)
+    actor = models.ForeignKey('users.User', related_name='visa_events', on_delete=models.SET_NULL, null=True)
+    remarks = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.get_action_display()} - {self.application_id}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['application', 'created_at'], name='visa_event_application_idx')]
+
+
 class Payment(TimestampMixin):
     STATUS_CHOICES = [
         ('inprocess', 'In Process'),
@@ -125,6 +213,11 @@ class Payment(TimestampMixin):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Dashboard date ranges, for everyone and per payer
+            models.Index(fields=['created_at'], name='payment_created_idx'),
+            models.Index(fields=['paid_by', 'created_at'], name='payment_payer_created_idx'),
+        ]
         permissions = [
             ('can_view_all_payments', 'Can view all payments'),
             ('can_process_payments', 'Can process payments'),
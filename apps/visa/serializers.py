@@ -1,20 +1,37 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import VisaApplication, VisaDocument,Payment
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from apps.common.models import ChunkedUpload
+from .models import VisaApplication, VisaDocument, VisaEvent, Payment
 
 User = get_user_model()
 
+# Times a bulk create draws fresh application numbers after a concurrent insert took one
+APPLICATION_NUMBER_ATTEMPTS = 3
+
 class VisaDocumentSerializer(serializers.ModelSerializer):
     verified_by_name = serializers.CharField(source='verified_by.get_full_name', read_only=True)
+    original_files = serializers.SerializerMethodField()
     
     class Meta:
         model = VisaDocument
         fields = [
-            'id', 'document_type', 'document_file', 'description', 
+            'id', 'document_type', 'document_file', 'thumbnail', 'original_files', 'description', 
             'is_verified', 'verified_by', 'verified_by_name', 'verified_at',
-            'created_at', 'updated_at'
+            'scan_status', 'scan_error', 'normalized_at', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'thumbnail', 'is_verified', 'verified_by', 'verified_at', 'scan_status', 'scan_error', 'normalized_at'
         ]
-        read_only_fields = ['is_verified', 'verified_by', 'verified_at']
+    
+    def get_original_files(self, obj):
+        """URLs of the files as uploaded, for audit"""
+        request = self.context.get('request')
+        storage = obj.document_file.storage
+        urls = [storage.url(name) for name in obj.source_files]
+        return [request.build_absolute_uri(url) for url in urls] if request else urls
 
 class VisaApplicationListSerializer(serializers.ModelSerializer):
     """Serializer for listing visa applications"""
@@ -23,6 +40,7 @@ class VisaApplicationListSerializer(serializers.ModelSerializer):
     visa_type_display = serializers.CharField(source='get_visa_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     documents_count = serializers.SerializerMethodField()
+    verified_documents_count = serializers.SerializerMethodField()
     
     class Meta:
         model = VisaApplication
@@ -31,11 +49,21 @@ class VisaApplicationListSerializer(serializers.ModelSerializer):
             'destination_country', 'visa_type', 'visa_type_display',
             'status', 'status_display', 'travel_date', 'return_date',
             'total_fee', 'applied_by_name', 'processed_by_name',
-            'documents_count', 'created_at', 'updated_at'
+            'documents_count', 'verified_documents_count', 'created_at', 'updated_at'
         ]
     
+    def _with_document_counts(self, obj):
+        """Annotated by VisaApplication.objects.with_document_counts(), counted here otherwise"""
+        if not hasattr(obj, 'documents_count'):
+            obj.documents_count = obj.documents.count()
+            obj.verified_documents_count = obj.documents.filter(is_verified=True).count()
+        return obj
+    
     def get_documents_count(self, obj):
-        return obj.documents.count()
+        return self._with_document_counts(obj).documents_count
+    
+    def get_verified_documents_count(self, obj):
+        return self._with_document_counts(obj).verified_documents_count
 
 class VisaApplicationDetailSerializer(serializers.ModelSerializer):
     """Serializer for detailed visa application view"""
@@ -111,19 +139,9 @@ class VisaApplicationStatusUpdateSerializer(serializers.ModelSerializer):
     
     def validate_status(self, value):
         """Validate status transitions"""
-        current_status = self.instance.status
-        valid_transitions = {
-            'submitted': ['under_review', 'rejected'],
-            'under_review': ['approved', 'rejected'],
-            'approved': ['issued', 'rejected'],
-        }
-        
-        if current_status in valid_transitions:
-            if value not in valid_transitions[current_status]:
-                raise serializers.ValidationError(
-                    f"Cannot change status from {current_status} to {value}"
-                )
-        
+        error = VisaApplication.transition_error(self.instance.status, value)
+        if error:
+            raise serializers.ValidationError(error)
         return value
     
     def update(self, instance, validated_data):
@@ -132,9 +150,35 @@ class VisaApplicationStatusUpdateSerializer(serializers.ModelSerializer):
             from django.utils import timezone
             instance.processed_by = self.context['request'].user
             instance.processed_at = timezone.now()
+            event = VisaEvent(
+                application=instance, action='status_changed', from_status=instance.status,
+                to_status=validated_data['status'], actor=instance.processed_by,
+                remarks=(validated_data.get('remarks') or '')[:255],
+            )
+            # The status change and its audit row stand or fall together
+            with transaction.atomic():
+                instance = super().update(instance, validated_data)
+                event.save()
+            return instance
         
         return super().update(instance, validated_data)
 
+class VisaBulkStatusSerializer(serializers.Serializer):
+    """Serializer for changing the status of many applications (SuperAdmin only)"""
+    application_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=settings.VISA_BULK_MAX_IDS
+    )
+    status = serializers.ChoiceField(choices=VisaApplication.STATUS_CHOICES)
+    remarks = serializers.CharField(required=False, allow_blank=True)
+
+class VisaBulkVerifySerializer(serializers.Serializer):
+    """Serializer for verifying or rejecting many documents (SuperAdmin only)"""
+    document_ids = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=settings.VISA_BULK_MAX_IDS
+    )
+    is_verified = serializers.BooleanField()
+    remarks = serializers.CharField(required=False, allow_blank=True, max_length=255)
+
 class VisaApplicationSubmitSerializer(serializers.Serializer):
     """Serializer for submitting applications"""
     confirm = serializers.BooleanField(required=True)
@@ -162,6 +206,149 @@ class VisaDocumentUploadSerializer(serializers.ModelSerializer):
         
         return data
     
+class VisaDocumentAttachSerializer(serializers.ModelSerializer):
+    """
+    Serializer for adding a document from completed chunked uploads.
+
+    Pass upload_id for a single file, or upload_ids for the pages of one
+    document (images only), which are combined into one PDF.
+    """
+    upload_id = serializers.UUIDField(write_only=True, required=False)
+    upload_ids = serializers.ListField(
+        child=serializers.UUIDField(), write_only=True, required=False, allow_empty=False,
+        max_length=settings.VISA_DOCUMENT_MAX_PAGES
+    )
+    
+    class Meta:
+        model = VisaDocument
+        fields = ['upload_id', 'upload_ids', 'document_type', 'description']
+    
+    def validate(self, attrs):
+        upload_ids = attrs.pop('upload_ids', None)
+        upload_id = attrs.pop('upload_id', None)
+        if (upload_ids is None) == (upload_id is None):
+            raise serializers.ValidationError("Give either upload_id or upload_ids.")
+        upload_ids = upload_ids or [upload_id]
+        if len(set(upload_ids)) != len(upload_ids):
+            raise serializers.ValidationError({'upload_ids': "An upload can only be one page."})
+        
+        uploads = ChunkedUpload.objects.filter(
+            pk__in=upload_ids, user=self.context['request'].user, purpose='visa_document'
+        ).in_bulk()
+        missing = [str(pk) for pk in upload_ids if pk not in uploads]
+        if missing:
+            raise serializers.ValidationError(f"No visa document upload with id {', '.join(missing)}.")
+        uploads = [uploads[pk] for pk in upload_ids]
+        if any(upload.status != 'complete' for upload in uploads):
+            raise serializers.ValidationError("Complete the upload first.")
+        if len(uploads) > 1 and any(not upload.content_type.startswith('image/') for upload in uploads):
+            raise serializers.ValidationError({'upload_ids': "Only images can be combined into one document."})
+        
+        names = [upload.file.name for upload in uploads]
+        attached = Q(document_file__in=names)
+        for name in names:
+            # A text match on the JSON list, which every database supports
+            attached |= Q(source_files__icontains=f'"{name}"')
+        if VisaDocument.objects.filter(attached).exists():
+            raise serializers.ValidationError("This upload is already attached to a document.")
+        attrs['source_files'] = names
+        return attrs
+    
+    def create(self, validated_data):
+        document = VisaDocument(**validated_data)
+        # The worker replaces it with the normalized file
+        document.document_file.name = document.source_files[0]
+        document.save()
+        return document
+    
+class VisaGroupDocumentSerializer(VisaDocumentUploadSerializer):
+    """A document for one applicant of a group, by their index in applicants"""
+    applicant = serializers.IntegerField(min_value=0)
+    
+    class Meta(VisaDocumentUploadSerializer.Meta):
+        fields = ['applicant', 'document_type', 'document_file', 'description']
+    
+class VisaApplicationBulkCreateSerializer(serializers.Serializer):
+    """
+    Serializer for creating the applications of a group in one go.
+
+    template holds the fields the group shares; each entry of applicants
+    adds applicant_name and passport_number and may override any of them.
+    """
+    template = serializers.DictField()
+    applicants = serializers.ListField(
+        child=serializers.DictField(), allow_empty=False, max_length=settings.VISA_BULK_MAX_APPLICANTS
+    )
+    documents = VisaGroupDocumentSerializer(
+        many=True, required=False, max_length=settings.VISA_BULK_MAX_DOCUMENTS
+    )
+    
+    def validate(self, attrs):
+        rows, errors = [], []
+        for applicant in attrs['applicants']:
+            serializer = VisaApplicationCreateSerializer(data={**attrs['template'], **applicant})
+            if serializer.is_valid():
+                rows.append(serializer.validated_data)
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+        if any(errors):
+            raise serializers.ValidationError({'applicants': errors})
+        
+        passports = [row['passport_number'] for row in rows]
+        repeated = sorted({number for number in passports if passports.count(number) > 1})
+        if repeated:
+            raise serializers.ValidationError({'applicants': f"Passport numbers appear more than once: {', '.join(repeated)}"})
+        trips = {(row['passport_number'], row['travel_date']) for row in rows}
+        existing = VisaApplication.objects.filter(
+            passport_number__in=passports, travel_date__in={travel_date for _, travel_date in trips}
+        ).exclude(status='rejected').values_list('passport_number', 'travel_date')
+        clashes = sorted(number for number, travel_date in existing if (number, travel_date) in trips)
+        if clashes:
+            raise serializers.ValidationError({
+                'applicants': f"Already applied for these travel dates: {', '.join(clashes)}"
+            })
+        
+        for document in attrs.get('documents', []):
+            if document['applicant'] >= len(rows):
+                raise serializers.ValidationError({'documents': f"There is no applicant {document['applicant']}."})
+        attrs['applicants'] = rows
+        return attrs
+    
+    def create(self, validated_data):
+        user = self.context['request'].user
+        applications = []
+        for row in validated_data['applicants']:
+            application = VisaApplication(**row, applied_by=user)
+            application.total_fee = application.calculate_total_fee()
+            applications.append(application)
+        
+        with transaction.atomic():
+            for attempt in range(APPLICATION_NUMBER_ATTEMPTS):
+                numbers = VisaApplication.generate_application_numbers(len(applications))
+                for application, number in zip(applications, numbers):
+                    application.application_number = number
+                try:
+                    with transaction.atomic():
+                        VisaApplication.objects.bulk_create(applications)
+                    break
+                except IntegrityError:
+                    # A number was taken between drawing and inserting; draw them again
+                    if attempt == APPLICATION_NUMBER_ATTEMPTS - 1:
+                        raise
+            if applications[0].pk is None:
+                # Backends that do not return ids from a bulk insert
+                ids = dict(VisaApplication.objects.filter(application_number__in=numbers).values_list(
+                    'application_number', 'pk'
+                ))
+                for application in applications:
+                    application.pk = ids[application.application_number]
+            VisaDocument.objects.bulk_create([
+                VisaDocument(visa_application=applications[document.pop('applicant')], **document)
+                for document in validated_data.get('documents', [])
+            ])
+        return applications
+    
 class PaymentCreateSerializer(serializers.ModelSerializer):
     """Serializer for creating payments (Other users)"""
     
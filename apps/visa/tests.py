@@ -1,3 +1,710 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import zipfile
+from datetime import date, datetime, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from apps.common.models import ChunkedUpload
+from apps.common.scanning import ScanRejected
+from apps.common.tests import TemporaryMediaMixin
+from apps.users.models import User
+from .models import Payment, VisaApplication, VisaDocument, VisaEvent
+
+
+def reject_every_file(field_file):
+    raise ScanRejected("Rejected by the test scanner.")
+
+
+def scanner_unreachable(field_file):
+    raise ConnectionRefusedError("clamd is down")
+
+
+def jpeg(size, exif=None, colors=('red', 'blue')):
+    """A JPEG whose left half is colors[0] and right half colors[1], as stored"""
+    image = Image.new('RGB', size, colors[1])
+    image.paste(colors[0], (0, 0, size[0] // 2, size[1]))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif.tobytes() if exif else b'')
+    return buffer.getvalue()
+
+
+class VisaApplicationQueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.accountant = User.objects.create_user(
+            username='accounts', email='accounts@example.com', password='pass', role='accountant',
+            created_by=cls.admin
+        )
+        cls.superadmin = User.objects.create_user(
+            username='root', email='root@example.com', password='pass', role='superadmin'
+        )
+        for number in range(25):
+            application = VisaApplication.objects.create(
+                applicant_name=f'Pilgrim {number}', passport_number=f'P{number:07d}', nationality='Indian',
+                destination_country='Saudi Arabia', visa_type='umrah', travel_date=date(2025, 3, 1),
+                return_date=date(2025, 3, 15), purpose_of_visit='Umrah', status='submitted',
+                processing_fee=Decimal('500.00'), embassy_fee=Decimal('1500.00'), service_fee=Decimal('250.00'),
+                applied_by=cls.accountant if number % 2 else cls.admin,
+                processed_by=cls.superadmin if number % 3 == 0 else None,
+            )
+            for index in range(number % 4):
+                VisaDocument.objects.create(
+                    visa_application=application, document_type='passport',
+                    document_file=f'visa_documents/{number}-{index}.pdf',
+                    is_verified=index == 0, verified_by=cls.superadmin if index == 0 else None,
+                )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list_page_costs_two_queries(self):
+        # The page count and the page itself
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/visa/applications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 25)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(
+            [row['id'] for row in response.data['results']],
+            list(VisaApplication.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:20])
+        )
+
+        for row in response.data['results']:
+            application = VisaApplication.objects.get(pk=row['id'])
+            self.assertEqual(row['documents_count'], application.documents.count())
+            self.assertEqual(row['verified_documents_count'], application.documents.filter(is_verified=True).count())
+            self.assertEqual(row['applied_by_name'], application.applied_by.get_full_name())
+
+    def test_cursor_list_page_costs_two_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/visa/applications/', {'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_detail_costs_two_queries(self):
+        application = VisaApplication.objects.filter(documents__isnull=False).distinct().first()
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/visa/applications/{application.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['documents']), application.documents.count())
+        verified = [document for document in response.data['documents'] if document['is_verified']]
+        self.assertEqual(verified[0]['verified_by_name'], self.superadmin.get_full_name())
+
+
+class VisaBulkCreateTests(TemporaryMediaMixin, TestCase):
+    template = {
+        'nationality': 'Indian', 'destination_country': 'Saudi Arabia', 'visa_type': 'umrah',
+        'travel_date': '2025-03-01', 'return_date': '2025-03-15', 'purpose_of_visit': 'Umrah',
+        'processing_fee': '500.00', 'embassy_fee': '1500.00', 'service_fee': '250.00',
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create(self, applicants, **template):
+        return self.client.post('/api/visa/applications/bulk-create/', {
+            'template': {**self.template, **template}, 'applicants': applicants,
+        }, format='json')
+
+    def test_applicants_override_the_template(self):
+        response = self.create([
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+            {'applicant_name': 'Yusuf', 'passport_number': 'P0000002', 'visa_type': 'tourist', 'service_fee': '0'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        amina, yusuf = VisaApplication.objects.order_by('id')
+        self.assertEqual((amina.visa_type, amina.total_fee), ('umrah', Decimal('2250.00')))
+        self.assertEqual((yusuf.visa_type, yusuf.total_fee), ('tourist', Decimal('2000.00')))
+        self.assertEqual({amina.applied_by, yusuf.applied_by}, {self.user})
+        self.assertNotEqual(amina.application_number, yusuf.application_number)
+
+    def test_errors_are_reported_per_applicant(self):
+        response = self.create([
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+            {'applicant_name': 'Yusuf'},
+            {'applicant_name': 'Bilal', 'passport_number': 'P0000003', 'return_date': '2025-02-01'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['applicants']
+        self.assertEqual(errors[0], {})
+        self.assertIn('passport_number', errors[1])
+        self.assertIn('non_field_errors', errors[2])
+
+        response = self.create([
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+        ])
+        self.assertIn('P0000001', str(response.data['applicants']))
+        self.assertFalse(VisaApplication.objects.exists())
+
+    def test_existing_trip_is_refused(self):
+        self.create([{'applicant_name': 'Amina', 'passport_number': 'P0000001'}])
+        response = self.create([
+            {'applicant_name': 'Yusuf', 'passport_number': 'P0000002'},
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('P0000001', str(response.data['applicants']))
+        # Another travel date is another trip
+        response = self.create([{'applicant_name': 'Amina', 'passport_number': 'P0000001'}], travel_date='2025-04-01',
+                               return_date='2025-04-15')
+        self.assertEqual(response.status_code, 201)
+
+    def test_taken_application_numbers_are_drawn_again(self):
+        self.create([{'applicant_name': 'Amina', 'passport_number': 'P0000001'}])
+        taken = VisaApplication.objects.get().application_number
+        draws = [[taken, 'VA0000000B'], ['VA0000000C', 'VA0000000D']]
+        with mock.patch.object(VisaApplication, 'generate_application_numbers', side_effect=draws):
+            response = self.create([
+                {'applicant_name': 'Yusuf', 'passport_number': 'P0000002'},
+                {'applicant_name': 'Bilal', 'passport_number': 'P0000003'},
+            ])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(row['application_number'] for row in response.data['applications']), ['VA0000000C', 'VA0000000D']
+        )
+
+    def test_multipart_attaches_documents_to_their_applicants(self):
+        payload = {'template': self.template, 'applicants': [
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+            {'applicant_name': 'Yusuf', 'passport_number': 'P0000002'},
+        ]}
+        response = self.client.post('/api/visa/applications/bulk-create/', {
+            'payload': json.dumps(payload),
+            'applicant_0_passport': SimpleUploadedFile('amina.pdf', b'%PDF-1.4', 'application/pdf'),
+            'applicant_1_photo': [
+                SimpleUploadedFile('yusuf.jpg', b'\xff\xd8\xff', 'image/jpeg'),
+                SimpleUploadedFile('yusuf-2.jpg', b'\xff\xd8\xff\xe0', 'image/jpeg'),
+            ],
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        documents = VisaDocument.objects.order_by('id').values_list(
+            'visa_application__applicant_name', 'document_type'
+        )
+        self.assertEqual(list(documents), [('Amina', 'passport'), ('Yusuf', 'photo'), ('Yusuf', 'photo')])
+        self.assertEqual(
+            [row['documents_count'] for row in response.data['applications']], [1, 2]
+        )
+
+    def test_multipart_needs_named_files_of_known_applicants(self):
+        payload = json.dumps({'template': self.template, 'applicants': [
+            {'applicant_name': 'Amina', 'passport_number': 'P0000001'},
+        ]})
+        for field, status in (('passport', 400), ('applicant_1_passport', 400)):
+            response = self.client.post('/api/visa/applications/bulk-create/', {
+                'payload': payload, field: SimpleUploadedFile('scan.pdf', b'%PDF-1.4', 'application/pdf'),
+            }, format='multipart')
+            self.assertEqual(response.status_code, status, field)
+        response = self.client.post('/api/visa/applications/bulk-create/', {'payload': '[]'}, format='multipart')
+        self.assertIn('payload', response.data)
+        self.assertFalse(VisaApplication.objects.exists())
+
+
+@override_settings(VISA_DOCUMENT_ASYNC=False, UPLOAD_SCAN_HOOKS=[])
+class VisaDocumentProcessingTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.application = VisaApplication.objects.create(
+            applicant_name='Amina', passport_number='P0000001', nationality='Indian',
+            destination_country='Saudi Arabia', visa_type='umrah', travel_date=date(2025, 3, 1),
+            return_date=date(2025, 3, 15), purpose_of_visit='Umrah', status='draft',
+            processing_fee=Decimal('500.00'), embassy_fee=Decimal('1500.00'), service_fee=Decimal('250.00'),
+            applied_by=self.user,
+        )
+
+    def upload(self, content, filename, content_type):
+        upload_id = self.client.post('/api/common/uploads/', {
+            'purpose': 'visa_document', 'filename': filename, 'content_type': content_type,
+            'total_size': len(content),
+        }, format='json').data['id']
+        self.client.generic(
+            'PUT', f'/api/common/uploads/{upload_id}/', content, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes 0-{len(content) - 1}/{len(content)}',
+        )
+        response = self.client.post(
+            f'/api/common/uploads/{upload_id}/complete/', {'sha256': hashlib.sha256(content).hexdigest()},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return upload_id
+
+    def attach(self, document_type, **upload_ids):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f'/api/visa/applications/{self.application.pk}/documents/attach/',
+                {'document_type': document_type, **upload_ids}, format='json'
+            )
+        self.assertEqual(response.status_code, 201)
+        return VisaDocument.objects.get(pk=response.data['id'])
+
+    def test_photo_is_turned_upright_stripped_and_downscaled(self):
+        exif = Image.Exif()
+        # Rotate 90 degrees clockwise to display, plus details that must not leak
+        exif[0x0112] = 6
+        exif[0x010f] = 'PhoneMaker'
+        exif[0x8825] = {2: (12.0, 34.0, 56.0)}
+        upload_id = self.upload(jpeg((1600, 1200), exif), 'photo.jpg', 'image/jpeg')
+
+        document = self.attach('photo', upload_id=upload_id)
+        self.assertEqual(document.scan_status, 'clean')
+        self.assertIsNotNone(document.normalized_at)
+        self.assertTrue(document.document_file.name.startswith('visa_documents/normalized/'))
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertEqual(document.source_files, [upload.file.name])
+
+        with document.document_file.open('rb') as normalized, Image.open(normalized) as image:
+            # Upright, and no larger than the 1200 pixels for photos
+            self.assertEqual((image.format, image.size), ('JPEG', (900, 1200)))
+            self.assertEqual(dict(image.getexif()), {})
+            self.assertNotIn('exif', image.info)
+            image = image.convert('RGB')
+            red, _, blue = image.getpixel((450, 100))
+            self.assertGreater(red, blue)
+            red, _, blue = image.getpixel((450, 1100))
+            self.assertGreater(blue, red)
+        with document.thumbnail.open('rb') as thumbnail, Image.open(thumbnail) as image:
+            self.assertEqual(image.size, (240, 320))
+        # The upload is kept as it was for audit
+        with upload.file.open('rb') as original, Image.open(original) as image:
+            self.assertEqual((image.size, image.getexif()[0x010f]), ((1600, 1200), 'PhoneMaker'))
+
+    def test_pages_are_combined_into_one_pdf(self):
+        transparent = io.BytesIO()
+        Image.new('RGBA', (800, 600), (255, 0, 0, 0)).save(transparent, 'PNG')
+        upload_ids = [
+            self.upload(jpeg((3000, 4000)), 'page-1.jpg', 'image/jpeg'),
+            self.upload(jpeg((1000, 1400)), 'page-2.jpg', 'image/jpeg'),
+            self.upload(transparent.getvalue(), 'page-3.png', 'image/png'),
+        ]
+
+        document = self.attach('bank_statement', upload_ids=upload_ids)
+        self.assertEqual(document.scan_status, 'clean')
+        self.assertEqual(len(document.source_files), 3)
+        self.assertTrue(document.document_file.name.endswith('.pdf'))
+        with document.document_file.open('rb') as pdf:
+            content = pdf.read()
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertEqual(content.count(b'/Type /Page') - content.count(b'/Type /Pages'), 3)
+        with document.thumbnail.open('rb') as thumbnail, Image.open(thumbnail) as image:
+            # The first page's
+            self.assertEqual(image.size, (240, 320))
+
+    def test_pdf_is_kept_as_uploaded(self):
+        upload_id = self.upload(b'%PDF-1.4\n' + bytes(200), 'statement.pdf', 'application/pdf')
+        document = self.attach('bank_statement', upload_id=upload_id)
+        self.assertEqual(document.scan_status, 'clean')
+        self.assertEqual(document.document_file.name, ChunkedUpload.objects.get(pk=upload_id).file.name)
+        self.assertFalse(document.thumbnail)
+
+    @override_settings(UPLOAD_SCAN_HOOKS=['apps.visa.tests.reject_every_file'])
+    def test_rejected_document_is_left_without_files(self):
+        upload_id = self.upload(jpeg((400, 300)), 'photo.jpg', 'image/jpeg')
+        document = self.attach('photo', upload_id=upload_id)
+        self.assertEqual((document.scan_status, document.scan_error), ('rejected', "Rejected by the test scanner."))
+        self.assertEqual((document.document_file.name, document.source_files), ('', []))
+        self.assertFalse(document.thumbnail)
+        self.assertIsNone(document.normalized_at)
+
+        # Still the file of its chunked upload, until that goes too
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertTrue(upload.file.storage.exists(upload.file.name))
+        with self.captureOnCommitCallbacks(execute=True):
+            upload.delete()
+        self.assertFalse(upload.file.storage.exists(upload.file.name))
+
+    def test_files_are_judged_by_their_content(self):
+        text = self.upload(b'%PDX not a document at all', 'statement.pdf', 'application/pdf')
+        damaged = self.upload(jpeg((400, 300))[:200], 'photo.jpg', 'image/jpeg')
+
+        document = self.attach('bank_statement', upload_id=text)
+        self.assertEqual(document.scan_status, 'rejected')
+        self.assertEqual(document.scan_error, "Only PDF, JPEG, PNG and WebP files are accepted.")
+        document = self.attach('photo', upload_id=damaged)
+        self.assertEqual(document.scan_status, 'rejected')
+        self.assertEqual(document.scan_error, "The image is damaged or too large to read.")
+
+    @override_settings(UPLOAD_SCAN_HOOKS=['apps.visa.tests.scanner_unreachable'])
+    def test_scanner_failure_is_retried(self):
+        upload_id = self.upload(b'%PDF-1.4\n' + bytes(200), 'statement.pdf', 'application/pdf')
+        with self.assertLogs('apps.visa.documents', 'WARNING'):
+            document = self.attach('bank_statement', upload_id=upload_id)
+        # Not the file's fault: it keeps its file for the retry
+        self.assertEqual(
+            (document.scan_status, document.scan_error), ('error', "ConnectionRefusedError: clamd is down")
+        )
+        self.assertEqual(document.document_file.name, ChunkedUpload.objects.get(pk=upload_id).file.name)
+
+        with override_settings(UPLOAD_SCAN_HOOKS=[]):
+            call_command('scan_visa_documents', stdout=io.StringIO())
+        document.refresh_from_db()
+        self.assertEqual((document.scan_status, document.scan_error), ('clean', ''))
+
+
+class VisaBulkProcessingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.superadmin = User.objects.create_user(
+            username='root', email='root@example.com', password='pass', role='superadmin'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.superadmin)
+
+    def create_applications(self, count, status='submitted'):
+        return VisaApplication.objects.bulk_create([
+            VisaApplication(
+                application_number=f'VA{status[:2].upper()}{number:06d}', applicant_name=f'Pilgrim {number}',
+                passport_number=f'P{number:07d}', nationality='Indian', destination_country='Saudi Arabia',
+                visa_type='umrah', travel_date=date(2025, 3, 1), return_date=date(2025, 3, 15),
+                purpose_of_visit='Umrah', status=status, processing_fee=Decimal('500.00'),
+                embassy_fee=Decimal('1500.00'), service_fee=Decimal('250.00'), total_fee=Decimal('2250.00'),
+                applied_by=self.admin,
+            )
+            for number in range(count)
+        ])
+
+    def update_status(self, ids, new_status, **extra):
+        return self.client.post('/api/visa/applications/bulk-status-update/', {
+            'application_ids': ids, 'status': new_status, **extra,
+        }, format='json')
+
+    def test_status_results_per_id(self):
+        submitted, raced = self.create_applications(2)
+        issued, = self.create_applications(1, status='issued')
+        approved, = self.create_applications(1, status='approved')
+
+        transition_error = VisaApplication.transition_error
+
+        def checked_while_another_admin_acts(current_status, new_status):
+            VisaApplication.objects.filter(pk=raced.pk).update(status='under_review')
+            return transition_error(current_status, new_status)
+
+        with mock.patch.object(VisaApplication, 'transition_error', side_effect=checked_while_another_admin_acts):
+            response = self.update_status(
+                [submitted.pk, raced.pk, issued.pk, approved.pk, 999999, submitted.pk], 'rejected', remarks='Blurred'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated_count'], 3)
+        results = {result['id']: result for result in response.data['results']}
+        self.assertEqual(
+            {pk: result['result'] for pk, result in results.items()},
+            {submitted.pk: 'updated', raced.pk: 'conflict', issued.pk: 'updated', approved.pk: 'updated',
+             999999: 'not_found'}
+        )
+
+        submitted.refresh_from_db()
+        self.assertEqual(
+            (submitted.status, submitted.processed_by, submitted.remarks), ('rejected', self.superadmin, 'Blurred')
+        )
+        raced.refresh_from_db()
+        self.assertEqual((raced.status, raced.processed_by), ('under_review', None))
+        self.assertEqual(
+            sorted(VisaEvent.objects.values_list('application_id', 'action', 'from_status', 'to_status', 'remarks')),
+            sorted([
+                (submitted.pk, 'status_changed', 'submitted', 'rejected', 'Blurred'),
+                (issued.pk, 'status_changed', 'issued', 'rejected', 'Blurred'),
+                (approved.pk, 'status_changed', 'approved', 'rejected', 'Blurred'),
+            ])
+        )
+
+    def test_invalid_transitions_are_reported(self):
+        submitted, = self.create_applications(1)
+        response = self.update_status([submitted.pk], 'issued')
+        self.assertEqual(response.data['updated_count'], 0)
+        self.assertEqual(response.data['results'], [{
+            'id': submitted.pk, 'result': 'invalid', 'error': "Cannot change status from submitted to issued",
+        }])
+        self.assertFalse(VisaEvent.objects.exists())
+
+    def test_status_update_query_budget(self):
+        applications = self.create_applications(300)
+        # Read statuses, one UPDATE, events in one insert, plus the savepoint pair
+        with self.assertNumQueries(7):
+            response = self.update_status([application.pk for application in applications], 'under_review')
+        self.assertEqual(response.data['updated_count'], 300)
+        self.assertEqual(VisaEvent.objects.filter(to_status='under_review').count(), 300)
+
+    def test_only_superadmins_change_status(self):
+        submitted, = self.create_applications(1)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.update_status([submitted.pk], 'under_review').status_code, 403)
+
+    def test_single_status_change_rolls_back_with_its_event(self):
+        submitted, = self.create_applications(1)
+        with mock.patch.object(VisaEvent, 'save', side_effect=RuntimeError("disk full")):
+            with self.assertRaises(RuntimeError), self.assertLogs('django.request', 'ERROR'):
+                self.client.patch(
+                    f'/api/visa/applications/{submitted.pk}/status-update/', {'status': 'under_review'}, format='json'
+                )
+        submitted.refresh_from_db()
+        self.assertEqual((submitted.status, submitted.processed_at), ('submitted', None))
+
+        response = self.client.patch(
+            f'/api/visa/applications/{submitted.pk}/status-update/', {'status': 'under_review'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(VisaEvent.objects.values_list('from_status', 'to_status')), [('submitted', 'under_review')]
+        )
+
+    def test_documents_results_per_id(self):
+        application, = self.create_applications(1)
+        clean, pending, rejected = VisaDocument.objects.bulk_create([
+            VisaDocument(
+                visa_application=application, document_type='passport', document_file=f'visa_documents/{name}.pdf',
+                scan_status=scan_status,
+            )
+            for name, scan_status in (('clean', 'clean'), ('pending', 'pending'), ('rejected', 'rejected'))
+        ])
+
+        # Read the documents, one UPDATE, events in one insert, plus the savepoint pair
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/visa/documents/bulk-verify/', {
+                'document_ids': [clean.pk, pending.pk, rejected.pk, 999999], 'is_verified': False,
+                'remarks': 'Expired',
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated_count'], 2)
+        self.assertEqual(
+            [(result['id'], result['result']) for result in response.data['results']],
+            [(clean.pk, 'updated'), (pending.pk, 'updated'), (rejected.pk, 'invalid'), (999999, 'not_found')]
+        )
+        clean.refresh_from_db()
+        self.assertEqual((clean.is_verified, clean.verified_by), (False, self.superadmin))
+        self.assertIsNotNone(clean.verified_at)
+        self.assertEqual(
+            sorted(VisaEvent.objects.values_list('document_id', 'application_id', 'action', 'remarks')),
+            [(clean.pk, application.pk, 'document_rejected', 'Expired'),
+             (pending.pk, application.pk, 'document_rejected', 'Expired')]
+        )
+
+
+class VisaDocumentArchiveTests(TemporaryMediaMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def application(self, number, applicant_name, applied_by=None):
+        return VisaApplication.objects.create(
+            application_number=number, applicant_name=applicant_name, passport_number='P0000001',
+            nationality='Indian', destination_country='Saudi Arabia', visa_type='umrah', travel_date=date(2025, 3, 1),
+            return_date=date(2025, 3, 15), purpose_of_visit='Umrah', status='submitted',
+            processing_fee=Decimal('500.00'), embassy_fee=Decimal('1500.00'), service_fee=Decimal('250.00'),
+            applied_by=applied_by or self.user,
+        )
+
+    def document(self, application, document_type, content=None, **kwargs):
+        name = f'visa_documents/{application.application_number}-{document_type}.pdf'
+        if content is not None:
+            name = default_storage.save(name, ContentFile(content))
+        return VisaDocument.objects.create(
+            visa_application=application, document_type=document_type, document_file=name, **kwargs
+        )
+
+    def archive(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_archive_has_a_folder_per_application(self):
+        amina = self.application('VA00000001', 'Amina Khan')
+        yusuf = self.application('VA00000002', 'Yusuf')
+        # Larger than one streamed block
+        passport = self.document(amina, 'passport', b'%PDF-1.4\n' + bytes(range(256)) * 1024)
+        photo = self.document(amina, 'photo', b'%PDF-1.4 photo')
+        lost = self.document(yusuf, 'passport')
+        self.document(yusuf, 'photo', b'%PDF-1.4 rejected', scan_status='rejected')
+        other = self.application('VA00000003', 'Other', applied_by=User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        ))
+        self.document(other, 'passport', b'%PDF-1.4 other')
+
+        with self.assertLogs('apps.common.streaming', 'WARNING'):
+            archive = self.archive(self.client.get('/api/visa/documents/archive/', {
+                'application_ids': f'{amina.pk},{yusuf.pk},{other.pk}',
+            }))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [
+            f'VA00000001_amina-khan/passport_{passport.pk}.pdf',
+            f'VA00000001_amina-khan/photo_{photo.pk}.pdf',
+            'MISSING.txt',
+        ])
+        with passport.document_file.open('rb') as stored:
+            self.assertEqual(archive.read(f'VA00000001_amina-khan/passport_{passport.pk}.pdf'), stored.read())
+        self.assertEqual(archive.read('MISSING.txt').decode(), f'VA00000002_yusuf/passport_{lost.pk}.pdf\n')
+
+    def test_single_application_archive(self):
+        amina = self.application('VA00000001', 'Amina Khan')
+        photo = self.document(amina, 'photo', b'%PDF-1.4 photo')
+        response = self.client.get(f'/api/visa/applications/{amina.pk}/documents/archive/')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="VA00000001.zip"')
+        archive = self.archive(response)
+        self.assertEqual(archive.namelist(), [f'VA00000001_amina-khan/photo_{photo.pk}.pdf'])
+        self.assertEqual(archive.read(archive.namelist()[0]), b'%PDF-1.4 photo')
+
+    def test_archive_needs_a_filter(self):
+        self.assertEqual(self.client.get('/api/visa/documents/archive/').status_code, 400)
+        response = self.client.get('/api/visa/documents/archive/', {'application_ids': '1,x'})
+        self.assertIn('application_ids', response.data)
+
+
+class VisaDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        cls.accountant = User.objects.create_user(
+            username='accounts', email='accounts@example.com', password='pass', role='accountant',
+            created_by=cls.admin
+        )
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+        rows = [
+            ('submitted', 'umrah', cls.admin), ('submitted', 'umrah', cls.accountant), ('submitted', 'hajj', cls.admin),
+            ('approved', 'tourist', cls.admin), ('rejected', 'umrah', cls.accountant), ('draft', 'umrah', cls.admin),
+            ('issued', 'umrah', other),
+        ]
+        for number, (status, visa_type, applied_by) in enumerate(rows):
+            VisaApplication.objects.create(
+                applicant_name=f'Pilgrim {number}', passport_number=f'P{number:07d}', nationality='Indian',
+                destination_country='Saudi Arabia', visa_type=visa_type, travel_date=date(2025, 3, 1),
+                return_date=date(2025, 3, 15), purpose_of_visit='Umrah', status=status,
+                processing_fee=Decimal('500.00'), embassy_fee=Decimal('1500.00'), service_fee=Decimal('250.50'),
+                applied_by=applied_by,
+            )
+
+    def test_dashboard_in_one_query(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        with self.assertNumQueries(1):
+            response = client.get('/api/visa/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        # The other agency's application is not counted
+        self.assertEqual(data['total_applications'], 6)
+        self.assertEqual(data['status_breakdown'], {
+            'pending_review': 3, 'under_review': 0, 'approved': 1, 'rejected': 1, 'issued': 0,
+        })
+        self.assertEqual(data['visa_type_breakdown'], {'hajj': 1, 'umrah': 4, 'ramadan': 0, 'tourist': 1})
+        self.assertEqual(data['fee_breakdown']['submitted'], {
+            'processing_fee': Decimal('1500.00'), 'embassy_fee': Decimal('4500.00'),
+            'service_fee': Decimal('751.50'), 'total_fee': Decimal('6751.50'),
+        })
+        self.assertEqual(data['fee_breakdown']['issued']['total_fee'], 0)
+        # Statuses outside STATUS_CHOICES still get their fees
+        self.assertEqual(data['fee_breakdown']['draft']['total_fee'], Decimal('2250.50'))
+
+    def test_superadmin_sees_every_agency(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username='root', email='root@example.com', password='pass', role='superadmin'
+        ))
+        response = client.get('/api/visa/dashboard/')
+        self.assertEqual(response.data['total_applications'], 7)
+        self.assertEqual(response.data['status_breakdown']['issued'], 1)
+
+
+class PaymentDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(
+            username='agency', email='agency@example.com', password='pass', role='agencyadmin'
+        )
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='pass', role='agencyadmin'
+        )
+        rows = [
+            # Either side of the first and last moment of March
+            (datetime(2025, 2, 28, 23, 59, 59), 'completed', 'cash', '100.00', cls.admin),
+            (datetime(2025, 3, 1, 0, 0), 'completed', 'upi', '200.00', cls.admin),
+            (datetime(2025, 3, 15, 12, 0), 'inprocess', 'upi', '300.00', cls.admin),
+            (datetime(2025, 3, 31, 23, 59, 59), 'rejected', 'card', '400.00', cls.admin),
+            (datetime(2025, 4, 1, 0, 0), 'completed', 'cash', '500.00', cls.admin),
+            (datetime(2025, 3, 10, 0, 0), 'completed', 'cash', '900.00', other),
+        ]
+        for created_at, status, payment_mode, amount, paid_by in rows:
+            payment = Payment.objects.create(
+                payment_amount=Decimal(amount), payment_mode=payment_mode, no_of_travelers=1, status=status,
+                paid_by=paid_by,
+            )
+            Payment.objects.filter(pk=payment.pk).update(created_at=created_at.replace(tzinfo=dt_timezone.utc))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_dashboard_shape(self):
+        # The grouped figures, then the recent payments
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/visa/payments/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['total_payments'], 5)
+        self.assertEqual(data['status_breakdown'], {'inprocess': 1, 'completed': 3, 'rejected': 1})
+        self.assertEqual(data['amount_breakdown'], {
+            'total_amount': Decimal('1500.00'), 'completed_amount': Decimal('800.00'),
+            'inprocess_amount': Decimal('300.00'),
+        })
+        self.assertEqual(
+            data['payment_mode_breakdown']['upi'], {'label': 'UPI', 'count': 2, 'amount': Decimal('500.00')}
+        )
+        self.assertEqual(data['payment_mode_breakdown']['cheque']['count'], 0)
+        # All of them are long before this month
+        self.assertEqual(data['monthly_stats'], {'count': 0, 'amount': 0})
+        self.assertEqual(
+            [payment['payment_amount'] for payment in data['recent_payments']],
+            ['500.00', '400.00', '300.00', '200.00', '100.00']
+        )
+
+    def test_date_range_is_inclusive(self):
+        response = self.client.get(
+            '/api/visa/payments/dashboard/', {'start_date': '2025-03-01', 'end_date': '2025-03-31'}
+        )
+        self.assertEqual(response.data['total_payments'], 3)
+        self.assertEqual(response.data['amount_breakdown']['total_amount'], Decimal('900.00'))
+        self.assertEqual(len(response.data['recent_payments']), 3)
+
+        response = self.client.get('/api/visa/payments/dashboard/', {'start_date': '2025-03-31'})
+        self.assertEqual(response.data['total_payments'], 2)
+        response = self.client.get('/api/visa/payments/dashboard/', {'end_date': '2025-02-28'})
+        self.assertEqual(response.data['total_payments'], 1)
+
+    def test_bad_date_is_refused(self):
+        for params in ({'start_date': '03/01/2025'}, {'end_date': '2025-02-30'}):
+            response = self.client.get('/api/visa/payments/dashboard/', params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(next(iter(params)), response.data)
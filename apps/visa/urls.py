@@ -7,6 +7,7 @@ urlpatterns = [
     # Visa Application URLs
     path('applications/', views.VisaApplicationListView.as_view(), name='application-list'),
     path('applications/create/', views.VisaApplicationCreateView.as_view(), name='application-create'),
+    path('applications/bulk-create/', views.VisaApplicationBulkCreateView.as_view(), name='application-bulk-create'),
     path('applications/<int:pk>/', views.VisaApplicationDetailView.as_view(), name='application-detail'),
     path('applications/<int:pk>/update/', views.VisaApplicationUpdateView.as_view(), name='application-update'),
     path('applications/<int:pk>/delete/', views.VisaApplicationDeleteView.as_view(), name='application-delete'),
@@ -14,13 +15,18 @@ urlpatterns = [
     
     # SuperAdmin only URLs
     path('applications/<int:pk>/status-update/', views.VisaApplicationStatusUpdateView.as_view(), name='application-status-update'),
+    path('applications/bulk-status-update/', views.bulk_update_visa_status, name='application-bulk-status-update'),
     path('dashboard/', views.visa_application_dashboard, name='dashboard'),
     
     # Document URLs
     path('applications/<int:application_id>/documents/', views.VisaDocumentListView.as_view(), name='document-list'),
     path('applications/<int:application_id>/documents/upload/', views.VisaDocumentUploadView.as_view(), name='document-upload'),
+    path('applications/<int:application_id>/documents/attach/', views.VisaDocumentAttachView.as_view(), name='document-attach'),
+    path('applications/<int:pk>/documents/archive/', views.visa_application_documents_archive, name='document-archive'),
+    path('documents/archive/', views.visa_documents_archive, name='documents-archive'),
     path('applications/<int:application_id>/documents/<int:pk>/delete/', views.VisaDocumentDeleteView.as_view(), name='document-delete'),
     path('documents/<int:document_id>/verify/', views.verify_document, name='document-verify'),
+    path('documents/bulk-verify/', views.bulk_verify_documents, name='document-bulk-verify'),
     
     # Utility URLs
     path('visa-types/', views.visa_types_list, name='visa-types'),
@@ -2,21 +2,38 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Sum, Count
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.text import slugify
+from datetime import datetime, timedelta
+import json
+import os
+import re
+from decimal import Decimal
+from rest_framework.exceptions import ValidationError
 from .models import Payment
 from apps.common.permissions import IsAgencyAdmin, IsSuperAdmin
-from .models import VisaApplication, VisaDocument
+from apps.common.pagination import OptionalCursorPagination
+from apps.common.streaming import zip_response
+from .models import VisaApplication, VisaDocument, VisaEvent
+from .documents import schedule_document_check
 from .serializers import (
     VisaApplicationListSerializer,
     VisaApplicationDetailSerializer,
     VisaApplicationCreateSerializer,
+    VisaApplicationBulkCreateSerializer,
     VisaApplicationUpdateSerializer,
     VisaApplicationStatusUpdateSerializer,
+    VisaBulkStatusSerializer,
+    VisaBulkVerifySerializer,
     VisaApplicationSubmitSerializer,
     VisaDocumentSerializer,
     VisaDocumentUploadSerializer,
+    VisaDocumentAttachSerializer,
     PaymentCreateSerializer,
     PaymentListSerializer,
     PaymentDetailSerializer,
@@ -25,6 +42,9 @@ from .serializers import (
 )
 
 
+GROUP_DOCUMENT_FIELD = re.compile(r'^applicant_(?P<applicant>\d+)_(?P<document_type>\w+)$')
+
+
 def get_accessible_queryset(user, queryset):
     """
     Helper function to filter queryset based on user role.
@@ -85,10 +105,14 @@ class VisaApplicationListView(generics.ListAPIView):
     """List visa applications based on user role"""
     serializer_class = VisaApplicationListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptionalCursorPagination
     
     def get_queryset(self):
         user = self.request.user
-        queryset = VisaApplication.objects.all()
+        # Meta.ordering does not apply to grouped queries, so order explicitly
+        queryset = VisaApplication.objects.select_related('applied_by', 'processed_by').with_document_counts().order_by(
+            '-created_at', '-id'
+        )
         queryset = get_accessible_queryset(user, queryset)
         
         # Filter by status if provided
@@ -119,7 +143,9 @@ class VisaApplicationDetailView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        queryset = VisaApplication.objects.all()
+        queryset = VisaApplication.objects.select_related('applied_by', 'processed_by').prefetch_related(
+            Prefetch('documents', queryset=VisaDocument.objects.select_related('verified_by'))
+        )
         return get_accessible_queryset(self.request.user, queryset)
 
 
@@ -129,6 +155,55 @@ class VisaApplicationCreateView(generics.CreateAPIView):
     permission_classes = [IsAgencyAdmin]
 
 
+class VisaApplicationBulkCreateView(generics.CreateAPIView):
+    """
+    Create the applications of a group in one request (Agency and Accountants):
+    {template: {shared fields}, applicants: [{applicant_name, passport_number, overrides}]}
+    As multipart, send that JSON in a 'payload' field and each applicant's files as
+    applicant_<index>_<document_type>, e.g. applicant_0_passport
+    """
+    serializer_class = VisaApplicationBulkCreateSerializer
+    permission_classes = [IsAgencyAdmin]
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=group_request_data(request))
+        serializer.is_valid(raise_exception=True)
+        applications = serializer.save()
+        for document in VisaDocument.objects.filter(visa_application__in=applications).only('pk'):
+            schedule_document_check(document)
+        
+        queryset = VisaApplication.objects.filter(pk__in=[application.pk for application in applications])
+        queryset = queryset.select_related('applied_by', 'processed_by').with_document_counts().order_by('id')
+        return Response({
+            'created': len(applications),
+            'applications': VisaApplicationListSerializer(queryset, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+
+
+def group_request_data(request):
+    """The bulk create body; for multipart, the JSON payload field plus the files as documents"""
+    if not request.content_type.startswith('multipart/'):
+        return request.data
+    try:
+        data = json.loads(request.data.get('payload', ''))
+    except ValueError:
+        raise ValidationError({'payload': "Send the group as JSON in the payload field."})
+    if not isinstance(data, dict):
+        raise ValidationError({'payload': "Send the group as JSON in the payload field."})
+    
+    data['documents'] = []
+    for field in request.FILES:
+        match = GROUP_DOCUMENT_FIELD.match(field)
+        if not match:
+            raise ValidationError({field: "Name files applicant_<index>_<document_type>."})
+        for document_file in request.FILES.getlist(field):
+            data['documents'].append({
+                'applicant': int(match['applicant']), 'document_type': match['document_type'],
+                'document_file': document_file,
+            })
+    return data
+
+
 class VisaApplicationUpdateView(generics.UpdateAPIView):
     """Update visa application (Agency and Accountants can update, draft status only)"""
     serializer_class = VisaApplicationUpdateSerializer
@@ -163,7 +238,7 @@ def submit_visa_application(request, pk):
     if serializer.is_valid():
         # Check if all required documents are uploaded
         required_docs = ['passport', 'photo']
-        uploaded_docs = application.documents.values_list('document_type', flat=True)
+        uploaded_docs = application.documents.exclude(scan_status='rejected').values_list('document_type', flat=True)
         
         missing_docs = [doc for doc in required_docs if doc not in uploaded_docs]
         if missing_docs:
@@ -199,28 +274,43 @@ def visa_application_dashboard(request):
     queryset = VisaApplication.objects.all()
     queryset = get_accessible_queryset(user, queryset)
     
-    total_applications = queryset.count()
-    pending_review = queryset.filter(status='submitted').count()
-    under_review = queryset.filter(status='under_review').count()
-    approved = queryset.filter(status='approved').count()
-    rejected = queryset.filter(status='rejected').count()
-    issued = queryset.filter(status='issued').count()
+    # One grouped query over (status, visa_type), pivoted below
+    rows = queryset.order_by().values('status', 'visa_type').annotate(
+        count=Count('id'),
+        processing_fee=Sum('processing_fee'),
+        embassy_fee=Sum('embassy_fee'),
+        service_fee=Sum('service_fee'),
+    )
     
-    # Visa type breakdown
-    visa_type_stats = {}
-    for choice in VisaApplication.VISA_TYPE_CHOICES:
-        visa_type_stats[choice[0]] = queryset.filter(visa_type=choice[0]).count()
+    fee_fields = ('processing_fee', 'embassy_fee', 'service_fee')
+    status_counts = {}
+    visa_type_stats = {choice[0]: 0 for choice in VisaApplication.VISA_TYPE_CHOICES}
+    fee_breakdown = {
+        choice[0]: {field: Decimal('0') for field in fee_fields} for choice in VisaApplication.STATUS_CHOICES
+    }
+    total_applications = 0
+    for row in rows:
+        total_applications += row['count']
+        status_counts[row['status']] = status_counts.get(row['status'], 0) + row['count']
+        if row['visa_type'] in visa_type_stats:
+            visa_type_stats[row['visa_type']] += row['count']
+        fees = fee_breakdown.setdefault(row['status'], {field: Decimal('0') for field in fee_fields})
+        for field in fee_fields:
+            fees[field] += row[field] or 0
+    for fees in fee_breakdown.values():
+        fees['total_fee'] = sum(fees[field] for field in fee_fields)
     
     return Response({
         'total_applications': total_applications,
         'status_breakdown': {
-            'pending_review': pending_review,
-            'under_review': under_review,
-            'approved': approved,
-            'rejected': rejected,
-            'issued': issued,
+            'pending_review': status_counts.get('submitted', 0),
+            'under_review': status_counts.get('under_review', 0),
+            'approved': status_counts.get('approved', 0),
+            'rejected': status_counts.get('rejected', 0),
+            'issued': status_counts.get('issued', 0),
         },
         'visa_type_breakdown': visa_type_stats,
+        'fee_breakdown': fee_breakdown,
     })
 
 
@@ -258,7 +348,23 @@ class VisaDocumentUploadView(generics.CreateAPIView):
             from rest_framework.exceptions import ValidationError
             raise ValidationError("Cannot upload documents for this application status")
         
-        serializer.save(visa_application=application)
+        document = serializer.save(visa_application=application)
+        schedule_document_check(document)
+
+
+class VisaDocumentAttachView(VisaDocumentUploadView):
+    """
+    Add a document from a completed chunked upload: {upload_id, document_type, description}
+    Upload with purpose=visa_document through /api/common/uploads/ first; scan_status starts as pending
+    """
+    serializer_class = VisaDocumentAttachSerializer
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(VisaDocumentSerializer(serializer.instance, context={'request': request}).data,
+                        status=status.HTTP_201_CREATED)
 
 
 class VisaDocumentDeleteView(generics.DestroyAPIView):
@@ -287,6 +393,10 @@ def verify_document(request, document_id):
     document.verified_by = request.user
     document.verified_at = timezone.now()
     document.save()
+    VisaEvent.objects.create(
+        application_id=document.visa_application_id, document=document,
+        action='document_verified' if is_verified else 'document_rejected', actor=request.user
+    )
     
     return Response({
         'message': f'Document {"verified" if is_verified else "rejected"}',
@@ -294,6 +404,184 @@ def verify_document(request, document_id):
     })
 
 
+@api_view(['POST'])
+@permission_classes([IsSuperAdmin])
+def bulk_update_visa_status(request):
+    """
+    Change the status of many applications (SuperAdmin only): {application_ids, status, remarks}
+    Each id is reported as updated, invalid (transition not allowed), conflict or not_found
+    """
+    serializer = VisaBulkStatusSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['application_ids']))
+    new_status = serializer.validated_data['status']
+    remarks = serializer.validated_data.get('remarks')
+    now = timezone.now()
+    
+    results = {pk: {'id': pk, 'result': 'not_found'} for pk in ids}
+    by_status = {}
+    for pk, current_status in VisaApplication.objects.filter(pk__in=ids).values_list('pk', 'status'):
+        error = VisaApplication.transition_error(current_status, new_status)
+        if error:
+            results[pk] = {'id': pk, 'result': 'invalid', 'error': error}
+        else:
+            by_status.setdefault(current_status, []).append(pk)
+    
+    events = []
+    if by_status:
+        changes = {'status': new_status, 'processed_by': request.user, 'processed_at': now, 'updated_at': now}
+        if remarks is not None:
+            changes['remarks'] = remarks
+        # One UPDATE, each row still guarded by the status it was checked against
+        guard = Q()
+        for current_status, pks in by_status.items():
+            guard |= Q(pk__in=pks, status=current_status)
+        with transaction.atomic():
+            updated_count = VisaApplication.objects.filter(guard).update(**changes)
+            checked = [pk for pks in by_status.values() for pk in pks]
+            if updated_count == len(checked):
+                updated = set(checked)
+            else:
+                updated = set(VisaApplication.objects.filter(
+                    pk__in=checked, processed_at=now, processed_by=request.user
+                ).values_list('pk', flat=True))
+            for current_status, pks in by_status.items():
+                for pk in pks:
+                    if pk not in updated:
+                        results[pk] = {'id': pk, 'result': 'conflict', 'error': "Changed by someone else meanwhile"}
+                        continue
+                    results[pk] = {'id': pk, 'result': 'updated'}
+                    events.append(VisaEvent(
+                        application_id=pk, action='status_changed', from_status=current_status,
+                        to_status=new_status, actor=request.user, remarks=(remarks or '')[:255],
+                    ))
+            VisaEvent.objects.bulk_create(events)
+    
+    return Response({
+        'message': f'{len(events)} applications updated successfully',
+        'updated_count': len(events),
+        'status': new_status,
+        'results': list(results.values()),
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsSuperAdmin])
+def bulk_verify_documents(request):
+    """
+    Verify or reject many documents (SuperAdmin only): {document_ids, is_verified, remarks}
+    Each id is reported as updated, invalid (file rejected by the scan), conflict or not_found
+    """
+    serializer = VisaBulkVerifySerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    ids = list(dict.fromkeys(serializer.validated_data['document_ids']))
+    is_verified = serializer.validated_data['is_verified']
+    remarks = serializer.validated_data.get('remarks', '')
+    now = timezone.now()
+    
+    results = {pk: {'id': pk, 'result': 'not_found'} for pk in ids}
+    applications = {}
+    rows = VisaDocument.objects.filter(pk__in=ids).values_list('pk', 'visa_application_id', 'scan_status')
+    for pk, application_id, scan_status in rows:
+        if scan_status == 'rejected':
+            results[pk] = {'id': pk, 'result': 'invalid', 'error': "The file was rejected by the scan"}
+        else:
+            applications[pk] = application_id
+    
+    events = []
+    if applications:
+        with transaction.atomic():
+            updated_count = VisaDocument.objects.filter(pk__in=applications).exclude(scan_status='rejected').update(
+                is_verified=is_verified, verified_by=request.user, verified_at=now, updated_at=now
+            )
+            if updated_count == len(applications):
+                updated = set(applications)
+            else:
+                updated = set(VisaDocument.objects.filter(
+                    pk__in=applications, verified_at=now, verified_by=request.user
+                ).values_list('pk', flat=True))
+            for pk, application_id in applications.items():
+                if pk not in updated:
+                    results[pk] = {'id': pk, 'result': 'conflict', 'error': "Changed by someone else meanwhile"}
+                    continue
+                results[pk] = {'id': pk, 'result': 'updated'}
+                events.append(VisaEvent(
+                    application_id=application_id, document_id=pk, actor=request.user, remarks=remarks,
+                    action='document_verified' if is_verified else 'document_rejected',
+                ))
+            VisaEvent.objects.bulk_create(events)
+    
+    return Response({
+        'message': f'{len(events)} documents {"verified" if is_verified else "rejected"}',
+        'updated_count': len(events),
+        'is_verified': is_verified,
+        'results': list(results.values()),
+    })
+
+
+def document_archive_entries(applications):
+    """(arcname, file) for every document of the applications, a folder per application"""
+    documents = VisaDocument.objects.filter(visa_application__in=applications).exclude(
+        scan_status='rejected'
+    ).exclude(document_file='').select_related('visa_application').only(
+        'id', 'document_type', 'document_file',
+        'visa_application__application_number', 'visa_application__applicant_name',
+    ).order_by('visa_application_id', 'document_type', 'id')
+    for document in documents.iterator(chunk_size=500):
+        application = document.visa_application
+        folder = f"{application.application_number}_{slugify(application.applicant_name) or 'applicant'}"
+        extension = os.path.splitext(document.document_file.name)[1].lower()
+        yield f"{folder}/{document.document_type}_{document.pk}{extension}", document.document_file
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def visa_application_documents_archive(request, pk):
+    """Download every document of an application as one ZIP"""
+    queryset = get_accessible_queryset(request.user, VisaApplication.objects.all())
+    application = get_object_or_404(queryset, pk=pk)
+    return zip_response(
+        document_archive_entries(VisaApplication.objects.filter(pk=application.pk)),
+        f"{application.application_number}.zip"
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def visa_documents_archive(request):
+    """
+    Download the documents of many applications as one ZIP, e.g. for an embassy batch
+    Filters: application_ids (comma separated), status, visa_type, travel_date; at least one is required
+    """
+    queryset = get_accessible_queryset(request.user, VisaApplication.objects.all())
+    params = request.query_params
+    if not any(params.get(name) for name in ('application_ids', 'status', 'visa_type', 'travel_date')):
+        raise ValidationError("Filter by application_ids, status, visa_type or travel_date.")
+    
+    if params.get('application_ids'):
+        try:
+            ids = [int(value) for value in params['application_ids'].split(',') if value.strip()]
+        except ValueError:
+            raise ValidationError({'application_ids': "Give application ids separated by commas."})
+        queryset = queryset.filter(pk__in=ids)
+    if params.get('status'):
+        queryset = queryset.filter(status=params['status'])
+    if params.get('visa_type'):
+        queryset = queryset.filter(visa_type=params['visa_type'])
+    travel_date = parse_date_param(request, 'travel_date')
+    if travel_date:
+        queryset = queryset.filter(travel_date=travel_date)
+    
+    count = queryset.count()
+    if not count:
+        return Response({'error': 'No applications match these filters'}, status=status.HTTP_404_NOT_FOUND)
+    if count > settings.VISA_ARCHIVE_MAX_APPLICATIONS:
+        raise ValidationError(
+            f"{count} applications match; narrow the filters to {settings.VISA_ARCHIVE_MAX_APPLICATIONS} or fewer."
+        )
+    return zip_response(document_archive_entries(queryset), f"visa_documents_{timezone.localdate():%Y%m%d}.zip")
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def visa_types_list(request):
@@ -356,6 +644,7 @@ class PaymentListView(generics.ListAPIView):
     """List all payments (All authenticated users can view based on their role)"""
     serializer_class = PaymentListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptionalCursorPagination
     
     def get_queryset(self):
         user = self.request.user
@@ -428,6 +717,7 @@ class UserPaymentHistoryView(generics.ListAPIView):
     """Get user's own payment history or parent admin's for accountants"""
     serializer_class = UserPaymentHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OptionalCursorPagination
     
     def get_queryset(self):
         user = self.request.user
@@ -435,69 +725,93 @@ class UserPaymentHistoryView(generics.ListAPIView):
         return get_payment_accessible_queryset(user, queryset)
 
 
+def parse_date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        # Well formed but not a real day, such as 2025-02-30
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: 'Use the YYYY-MM-DD format.'})
+    return parsed
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def payment_dashboard(request):
-    """Payment dashboard data (All authenticated users can access based on their role)"""
+    """
+    Payment dashboard data (All authenticated users can access based on their role)
+    Optional start_date/end_date (YYYY-MM-DD, inclusive) limit every figure to that range
+    """
     user = request.user
     
     queryset = Payment.objects.all()
     queryset = get_payment_accessible_queryset(user, queryset)
     
-    total_payments = queryset.count()
-    inprocess_payments = queryset.filter(status='inprocess').count()
-    completed_payments = queryset.filter(status='completed').count()
-    rejected_payments = queryset.filter(status='rejected').count()
-    
-    # Total amounts
-    total_amount = queryset.aggregate(total=Sum('payment_amount'))['total'] or 0
-    completed_amount = queryset.filter(status='completed').aggregate(
-        total=Sum('payment_amount')
-    )['total'] or 0
-    inprocess_amount = queryset.filter(status='inprocess').aggregate(
-        total=Sum('payment_amount')
-    )['total'] or 0
-    
-    # Payment mode breakdown
-    payment_mode_stats = {}
-    for choice in Payment.PAYMENT_MODE_CHOICES:
-        mode_count = queryset.filter(payment_mode=choice[0]).count()
-        mode_amount = queryset.filter(payment_mode=choice[0]).aggregate(
-            total=Sum('payment_amount')
-        )['total'] or 0
-        payment_mode_stats[choice[0]] = {
-            'label': choice[1],
-            'count': mode_count,
-            'amount': mode_amount
-        }
-    
-    # Recent payments (last 10)
-    recent_payments = queryset.select_related('paid_by', 'processed_by')[:10]
-    recent_payments_data = PaymentListSerializer(recent_payments, many=True).data
+    # Plain created_at ranges rather than __date lookups, so the index is used
+    start_date = parse_date_param(request, 'start_date')
+    if start_date:
+        queryset = queryset.filter(created_at__gte=start_of_day(start_date))
+    end_date = parse_date_param(request, 'end_date')
+    if end_date:
+        queryset = queryset.filter(created_at__lt=start_of_day(end_date + timedelta(days=1)))
     
-    # Monthly stats (current month)
+    # One grouped query over (status, payment_mode), with the current month folded in
     current_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_stats = queryset.filter(created_at__gte=current_month).aggregate(
+    this_month = Q(created_at__gte=current_month)
+    rows = queryset.order_by().values('status', 'payment_mode').annotate(
         count=Count('id'),
-        amount=Sum('payment_amount')
+        amount=Sum('payment_amount'),
+        month_count=Count('id', filter=this_month),
+        month_amount=Sum('payment_amount', filter=this_month),
     )
     
+    status_counts = {choice[0]: 0 for choice in Payment.STATUS_CHOICES}
+    status_amounts = {choice[0]: 0 for choice in Payment.STATUS_CHOICES}
+    payment_mode_stats = {
+        choice[0]: {'label': choice[1], 'count': 0, 'amount': 0} for choice in Payment.PAYMENT_MODE_CHOICES
+    }
+    total_payments, total_amount = 0, 0
+    monthly_count, monthly_amount = 0, 0
+    for row in rows:
+        amount = row['amount'] or 0
+        total_payments += row['count']
+        total_amount += amount
+        status_counts[row['status']] = status_counts.get(row['status'], 0) + row['count']
+        status_amounts[row['status']] = status_amounts.get(row['status'], 0) + amount
+        if row['payment_mode'] in payment_mode_stats:
+            payment_mode_stats[row['payment_mode']]['count'] += row['count']
+            payment_mode_stats[row['payment_mode']]['amount'] += amount
+        monthly_count += row['month_count']
+        monthly_amount += row['month_amount'] or 0
+    
+    # Recent payments (last 10)
+    recent_payments = queryset.select_related('paid_by', 'processed_by')[:10]
+    recent_payments_data = PaymentListSerializer(recent_payments, many=True).data
+    
     return Response({
         'total_payments': total_payments,
         'status_breakdown': {
-            'inprocess': inprocess_payments,
-            'completed': completed_payments,
-            'rejected': rejected_payments,
+            'inprocess': status_counts['inprocess'],
+            'completed': status_counts['completed'],
+            'rejected': status_counts['rejected'],
         },
         'amount_breakdown': {
             'total_amount': total_amount,
-            'completed_amount': completed_amount,
-            'inprocess_amount': inprocess_amount,
+            'completed_amount': status_amounts['completed'],
+            'inprocess_amount': status_amounts['inprocess'],
         },
         'payment_mode_breakdown': payment_mode_stats,
         'monthly_stats': {
-            'count': monthly_stats['count'] or 0,
-            'amount': monthly_stats['amount'] or 0,
+            'count': monthly_count,
+            'amount': monthly_amount,
         },
         'recent_payments': recent_payments_data,
     })
@@ -57,6 +57,7 @@ THIRD_PARTY_APPS = [
 ]
 
 LOCAL_APPS = [
+    'apps.common',
     'apps.users',
     'apps.packages',
     'apps.bookings',
@@ -112,6 +113,110 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared by all workers when REDIS_URL is set, otherwise per process
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'umrah-services',
+        }
+    }
+# Longest life of entries other workers invalidate, while the cache is per process (seconds)
+LOCAL_CACHE_TIMEOUT = 10
+
+# API key authentication cache (seconds); the shared tier is only used with REDIS_URL
+API_KEY_CACHE_TIMEOUT = 300
+API_KEY_LOCAL_CACHE_TIMEOUT = 10
+API_KEY_LAST_USED_FLUSH_INTERVAL = 60
+
+# Token bucket limits per API key, client IP and route (APIKey fields override)
+API_KEY_THROTTLE = {'burst': 60, 'per_minute': 120}
+# Secret-key form endpoints in apps.hajjumarhlead, per client IP and route
+PUBLIC_FORM_THROTTLE = {'burst': 10, 'per_minute': 20}
+
+# Public content served to partner websites (seconds)
+PUBLIC_CONTENT_VERSION_TIMEOUT = 3600
+PUBLIC_CONTENT_MAX_AGE = 120
+PUBLIC_BUNDLE_CACHE_TIMEOUT = 300
+# Prefix for media URLs in the bundle snapshot, which is built outside a request
+PUBLIC_MEDIA_BASE_URL = os.environ.get('PUBLIC_MEDIA_BASE_URL', 'https://crmweb.hajumrahservice.com')
+
+# Resized WebP/JPEG variants of public images, longest edge in pixels (see apps.common.images)
+IMAGE_VARIANT_SIZES = {'thumb': 320, 'medium': 800, 'large': 1600}
+IMAGE_VARIANT_QUALITY = {'webp': 80, 'jpeg': 82}
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANTS_ASYNC = True
+
+# Resumable chunked uploads (apps.common.uploads), assembled into storage on completion
+CHUNKED_UPLOAD_TEMP_DIR = Path(os.environ.get('CHUNKED_UPLOAD_TEMP_DIR', BASE_DIR / 'spool' / 'uploads'))
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+CHUNKED_UPLOAD_PURPOSES = {
+    'homepage_video': {
+        'upload_to': 'homepage_videos/',
+        'max_size': 500 * 1024 * 1024,
+        'content_types': ['video/mp4', 'video/webm', 'video/quicktime'],
+    },
+    'visa_document': {
+        'upload_to': 'visa_documents/',
+        'max_size': 25 * 1024 * 1024,
+        'content_types': ['application/pdf', 'image/jpeg', 'image/png', 'image/webp'],
+    },
+}
+# Callables run on each stored upload off the request thread (apps.common.scanning);
+# they raise ScanRejected to refuse a file
+CLAMD_ADDRESS = os.environ.get('CLAMD_ADDRESS', '')  # 'host:port' or a socket path
+CLAMD_TIMEOUT = 30
+UPLOAD_SCAN_HOOKS = ['apps.common.scanning.clamd_scan'] if CLAMD_ADDRESS else []
+# Visa document checks and normalization (apps.visa.documents)
+VISA_DOCUMENT_WORKERS = 2
+VISA_DOCUMENT_ASYNC = True
+# Longest edge in pixels images are downscaled to, by document type
+VISA_DOCUMENT_MAX_EDGE = {'photo': 1200, 'default': 2000}
+VISA_DOCUMENT_JPEG_QUALITY = 85
+VISA_DOCUMENT_PDF_DPI = 200
+VISA_DOCUMENT_MAX_PAGES = 10
+VISA_DOCUMENT_THUMBNAIL_EDGE = 320
+# Applications created by one bulk request, and the files sent with them
+VISA_BULK_MAX_APPLICANTS = 100
+VISA_BULK_MAX_DOCUMENTS = 3 * VISA_BULK_MAX_APPLICANTS
+# Applications or documents changed by one bulk status or verification request
+VISA_BULK_MAX_IDS = 500
+# Applications one streamed document archive may cover
+VISA_ARCHIVE_MAX_APPLICATIONS = 500
+# Signed media stream URLs name the exact file, so they can be cached for long
+MEDIA_STREAM_MAX_AGE = 86400
+
+# Queued contact submissions, written to ContactUs by drain_contact_queue
+CONTACT_SPOOL_DIR = Path(os.environ.get('CONTACT_SPOOL_DIR', BASE_DIR / 'spool'))
+CONTACT_SPOOL_FSYNC = True
+CONTACT_SPOOL_BATCH_SIZE = 500
+# Country code for contact phone numbers given without one (see normalize_phone)
+CONTACT_DEFAULT_COUNTRY_CODE = '91'
+# Cached per-user contact and API key totals for the submissions list (seconds)
+CONTACT_TOTALS_CACHE_TIMEOUT = 3600
+
+# Partner webhooks for new submissions, sent by dispatch_webhooks (apps.enquiries.webhooks)
+WEBHOOK_BATCH_SIZE = 50  # events per request
+WEBHOOK_CLAIM_SIZE = 1000  # deliveries leased per dispatch pass
+WEBHOOK_LEASE_SECONDS = 300
+WEBHOOK_WORKERS = 8  # endpoints posted to in parallel
+WEBHOOK_HTTP_POOLS = 50  # hosts with kept-alive connections
+WEBHOOK_TIMEOUT = {'connect': 3.0, 'read': 10.0}
+WEBHOOK_MAX_ATTEMPTS = 12
+WEBHOOK_BACKOFF_BASE = 30  # seconds before the first retry, doubling after each
+WEBHOOK_BACKOFF_MAX = 6 * 3600
+# Lets http:// and private addresses through, only for local stub receivers (tests, benchmark_webhooks)
+WEBHOOK_ALLOW_LOCAL_URLS = False
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.User'
 
@@ -150,6 +255,15 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Deduplicated media content (apps.common.storage); keep it on the same filesystem
+# as MEDIA_ROOT so stored files can be hard links, and out of what is served
+MEDIA_BLOB_ROOT = Path(os.environ.get('MEDIA_BLOB_ROOT', BASE_DIR / 'media_blobs'))
+
+STORAGES = {
+    'default': {'BACKEND': 'apps.common.storage.ContentAddressedStorage'},
+    # STATICFILES_STORAGE below is no longer read since Django 5.1; this is what was in effect
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
 
 # Static files storage for production
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
@@ -161,9 +275,11 @@ os.makedirs(FONT_DIR, exist_ok=True)
 os.makedirs(POSTER_ASSETS_DIR, exist_ok=True)
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
-# File upload settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+# File upload settings (the 5MB that was in effect; large files go through chunked uploads)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
+DATA_UPLOAD_MAX_MEMORY_SIZE = 5 * 1024 * 1024  # 5MB
+# Django's default of 100 would refuse a full group's documents before they are counted
+DATA_UPLOAD_MAX_NUMBER_FILES = VISA_BULK_MAX_DOCUMENTS + 10
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -323,7 +439,3 @@ LOGGING = {
 
 # Create logs directory if it doesn't exist
 os.makedirs(BASE_DIR / 'logs', exist_ok=True)
-
-# File Upload Settings
-FILE_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
-DATA_UPLOAD_MAX_MEMORY_SIZE = 5242880  # 5MB
\ No newline at end of file
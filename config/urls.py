@@ -43,6 +43,7 @@ urlpatterns = [
     path('api/posters-generate/', include('apps.poster_generator.urls')), 
     path('api/umrah/', include('apps.hajjumarhlead.urls')),
     path('api/crm/', include('apps.crm.urls')),
+    path('api/common/', include('apps.common.urls')),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]